@@ -0,0 +1,44 @@
+import time
+
+import penman
+from penman.graph import CONCEPT_ROLE
+
+from vulcan.data_handling.linguistic_objects.graphs.penman_converter import from_penman_graph
+
+
+def make_benchmark_graph(node_count):
+    """
+    :return: A penman graph with node_count nodes, in the style of a document-level AMR: a chain of sentences,
+        each with a few arguments, attributes and reentrancies to nodes of earlier sentences.
+    """
+    triples = []
+    for i in range(node_count):
+        triples.append((f"n{i}", CONCEPT_ROLE, f"concept-{i % 50}"))
+        if i > 0:
+            triples.append((f"n{(i - 1) // 3}", f":ARG{i % 3}", f"n{i}"))
+        if i >= 10 and i % 7 == 0:
+            triples.append((f"n{i}", ":ARG2", f"n{i - 10}"))
+        if i % 5 == 0:
+            triples.append((f"n{i}", ":quant", str(i)))
+    return penman.Graph(triples, top="n0")
+
+
+def benchmark_conversion(node_counts=(100, 200, 400, 800, 1600, 3200), repetitions=5):
+    """
+    Prints how long converting graphs of different sizes takes. The time per node should stay about the same.
+    """
+    for node_count in node_counts:
+        penman_graph = make_benchmark_graph(node_count)
+        start_time = time.perf_counter()
+        for _ in range(repetitions):
+            from_penman_graph(penman_graph)
+        duration = (time.perf_counter() - start_time) / repetitions
+        print(f"{node_count} nodes: {duration * 1000:.2f} ms per graph, {duration * 1e6 / node_count:.2f} µs per node")
+
+
+def main():
+    benchmark_conversion()
+
+
+if __name__ == "__main__":
+    main()
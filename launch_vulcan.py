@@ -1,3 +1,4 @@
+import os
 import pickle
 import json
 import sys
@@ -8,6 +9,9 @@ from vulcan.data_handling.linguistic_objects.trees.am_tree_as_dict import genera
 from vulcan.server.basic_layout import BasicLayout
 from vulcan.server.server import Server
 from vulcan.data_handling.data_corpus import from_dict_list
+from vulcan.data_handling.lazy_instance_list import DEFAULT_CONVERSION_CACHE_SIZE
+from vulcan.search.search_result_cache import DEFAULT_SEARCH_CACHE_MEMORY
+from vulcan.server.corpus_registry import DEFAULT_MAX_LOADED_SIZE
 from amconll import parse_amconll
 
 from vulcan.server_launcher import launch_server_from_file
@@ -16,7 +20,9 @@ from vulcan.server_launcher import launch_server_from_file
 def main():
     parser = ArgumentParser()
     parser.add_argument("pickle_filename", help="Path to the pickle file you want to visualize. You can specify"
-                                                "a JSON file instead if you use the --json flag.")
+                                                " a JSON file instead if you use the --json flag. You can also"
+                                                " specify a directory of pickle and JSON files, to visualize all of"
+                                                " them with one server.")
     parser.add_argument("-pf", "--propbank-frames", type=str,
                         action="store", dest="propbank_frames", default=None,
                         help="Path to a folder containing XML files with Propbank frames, "
@@ -37,7 +43,62 @@ def main():
     parser.add_argument("--show-node-names", action="store_true", dest="show_node_names", default=False,
                         help="A graph or tree node with name `n` and label `label` will be shown as"
                              " `n / label` (per default, only `label` is shown).")
+    parser.add_argument("--lazy", action="store_true", dest="lazy_conversion", default=False,
+                        help="Convert instances only when they are first shown or searched, instead of converting the"
+                             " whole corpus at startup. Speeds up the startup for large corpora.")
+    parser.add_argument("--cache-size", type=int, action="store", dest="conversion_cache_size",
+                        default=DEFAULT_CONVERSION_CACHE_SIZE,
+                        help="With --lazy, the number of converted instances per slice that are kept in memory"
+                             f" (default: {DEFAULT_CONVERSION_CACHE_SIZE}).")
+    parser.add_argument("--warm-up", action="store_true", dest="warm_up", default=False,
+                        help="With --lazy, convert the first instances in the background after startup.")
+    parser.add_argument("--workers", type=int, action="store", dest="workers", default=1,
+                        help="Number of processes that convert the corpus in parallel at startup (default: 1)."
+                             " Has no effect with --lazy.")
+    parser.add_argument("--cache", action="store_true", dest="use_cache", default=False,
+                        help="Store the converted corpus in a cache file next to the input file (with the added"
+                             " extension .vulcancache). Later launches for the same file and options load the"
+                             " converted corpus from there, skipping all parsing and conversion.")
+    parser.add_argument("--search-workers", type=int, action="store", dest="search_workers", default=1,
+                        help="Number of processes that search the corpus in parallel (default: 1). Helps with slow"
+                             " searches on large corpora, such as regular expressions. Requires a system that"
+                             " supports fork (i.e. not Windows).")
+    parser.add_argument("--search-cache-size", type=int, action="store", dest="search_cache_size",
+                        default=DEFAULT_SEARCH_CACHE_MEMORY // (1024 * 1024),
+                        help="Memory in MB for caching search results, which makes repeated searches (also by other"
+                             f" users) instant (default: {DEFAULT_SEARCH_CACHE_MEMORY // (1024 * 1024)}). Use 0 to"
+                             " disable the cache.")
+    parser.add_argument("--processes", type=int, action="store", dest="processes", default=1,
+                        help="Number of server processes (default: 1). Use more to serve many users at once, e.g. so"
+                             " that one user's search does not slow down everyone else. The corpus is loaded only"
+                             " once and shared by all processes. Clients must then connect via websockets, which"
+                             " some proxies block. Requires a system that supports fork (i.e. not Windows). Cannot be"
+                             " combined with --watch or with a directory of corpora, since each process would then"
+                             " load its own copy of the corpora.")
+    parser.add_argument("--max-loaded-size", type=int, action="store", dest="max_loaded_size",
+                        default=DEFAULT_MAX_LOADED_SIZE // (1024 * 1024),
+                        help="When visualizing a directory, corpora are loaded when they are first opened. Once the"
+                             " input files of the loaded corpora add up to more than this many MB, corpora that"
+                             " nobody has open are unloaded again, least recently used first"
+                             f" (default: {DEFAULT_MAX_LOADED_SIZE // (1024 * 1024)}).")
+    parser.add_argument("--watch", action="store_true", dest="watch", default=False,
+                        help="Reload the corpus whenever the input file changes (e.g. when a training job adds new"
+                             " predictions). Only new and changed instances are converted again, and everyone stays"
+                             " at their current instance and search.")
+    parser.add_argument("--profile-startup", action="store_true", dest="profile_startup", default=False,
+                        help="Print how long each phase of loading the corpus took (reading the file, converting the"
+                             " instances of each slice, etc.), how much memory it took, and which instances were the"
+                             " slowest to convert, before starting the server.")
+    parser.add_argument("--profile-stats", type=str, action="store", dest="profile_stats", default=None,
+                        help="Profile loading the corpus with cProfile, and write the statistics to this file (for"
+                             " use with pstats, e.g. python -m pstats <file>). Implies --profile-startup.")
     args = parser.parse_args()
+    if args.processes > 1 and args.watch:
+        parser.error("--processes cannot be combined with --watch, since each process would reload its own copy of"
+                     " the corpus.")
+    if args.processes > 1 and os.path.isdir(args.pickle_filename):
+        parser.error("--processes cannot be combined with a directory of corpora, since each process would load its"
+                     " own copy of the corpora.")
 
     if args.propbank_frames is not None:
         propbank_path = args.propbank_frames + "/"
@@ -46,7 +107,15 @@ def main():
 
     launch_server_from_file(args.pickle_filename, port=args.port, address=args.address, is_json_file=args.is_json_file,
                             show_node_names=args.show_node_names, propbank_path=propbank_path,
-                            show_wikipedia_articles=args.show_wikipedia_articles)
+                            show_wikipedia_articles=args.show_wikipedia_articles,
+                            lazy_conversion=args.lazy_conversion, conversion_cache_size=args.conversion_cache_size,
+                            warm_up=args.warm_up, workers=args.workers, use_cache=args.use_cache,
+                            search_workers=args.search_workers,
+                            search_cache_memory=args.search_cache_size * 1024 * 1024,
+                            processes=args.processes, max_loaded_size=args.max_loaded_size * 1024 * 1024,
+                            watch=args.watch,
+                            profile_startup=args.profile_startup or args.profile_stats is not None,
+                            profile_stats_path=args.profile_stats)
 
 
 if __name__ == '__main__':
@@ -1,4 +1,15 @@
-const sio = io();
+// Websockets first: a server with several processes only accepts websockets. If they are not available (e.g.
+//  blocked by a proxy), fall back to HTTP long-polling.
+// When the server shows a directory of corpora, each one is under /corpus/<name>/.
+const corpus_path_match = window.location.pathname.match(/\/corpus\/([^\/]+)/);
+const sio = io({transports: ["websocket"],
+                query: corpus_path_match ? {corpus: decodeURIComponent(corpus_path_match[1])} : {}});
+sio.on("connect_error", (error) => {
+    if (error.message.startsWith("Unknown corpus")) {
+        alert(error.message);
+    }
+    sio.io.opts.transports = ["polling", "websocket"];
+});
 // sio.eio.pingTimeout = 120000; // 2 minutes
 // sio.eio.pingInterval = 20000;  // 20 seconds
 
@@ -14,6 +25,15 @@ const canvas_name_to_node_name_to_node_dict = {}
 
 let current_corpus_position = 0
 let corpus_length = 0
+// the id of the search whose results we are showing, and whether the server is still searching for more matches
+let current_search_job_id = null
+let search_in_progress = false
+// instances are prefetched this far ahead of and behind the current position
+const PREFETCH_RADIUS = 3
+// instance_id -> set_instance payload, for the layout with current_layout_id
+let prefetched_instances = new Map()
+let requested_prefetches = new Set()
+let current_layout_id = null
 let saved_layout = null
 
 const window_width  = window.innerWidth || document.documentElement.clientWidth ||
@@ -138,14 +158,14 @@ function create_canvas(width_percent, height_percent, name="", only_horizontal_z
 d3.select("#previousButton")
     .on("click", function() {
         if (set_corpus_position(current_corpus_position - 1)) {
-            sio.emit("instance_requested", current_corpus_position);
+            request_instance(current_corpus_position);
         }
     });
 
 d3.select("#nextButton")
     .on("click", function() {
         if (set_corpus_position(current_corpus_position + 1)) {
-            sio.emit("instance_requested", current_corpus_position);
+            request_instance(current_corpus_position);
         } else {
             // console.log("no more instances");
             // console.log(corpus_length)
@@ -171,11 +191,88 @@ sio.on('disconnect', () => {
   console.log('disconnected');
 });
 
+sio.on('corpus_loading', (data) => {
+    // the server is loading the corpus for us; set_layout follows once it is loaded
+    d3.select("#corpusPositionText").text("Loading corpus " + data.corpus + "...")
+})
+
 sio.on('set_show_node_names', (data) => {
     add_node_name_to_node_label = data["show_node_names"]
 })
 
+function request_instance(instance_id) {
+    if (prefetched_instances.has(instance_id)) {
+        show_instance(prefetched_instances.get(instance_id))
+        sio.emit("instance_shown", instance_id)  // the server keeps track of our position, e.g. for reloading
+    } else {
+        sio.emit("instance_requested", instance_id)
+    }
+}
+
+sio.on("set_instance", (data) => {
+    if (data["instance_id"] !== current_corpus_position) {
+        return  // the user navigated on before this instance arrived
+    }
+    if (data["layout_id"] !== current_layout_id) {
+        // a new layout (e.g. a new search result); instances prefetched for the old one are useless now
+        forget_prefetched_instances()
+        current_layout_id = data["layout_id"]
+    }
+    show_instance(data)
+})
+
+sio.on("instances_prefetched", (data) => {
+    data.forEach(instance_data => {
+        if (instance_data["layout_id"] === current_layout_id) {
+            prefetched_instances.set(instance_data["instance_id"], instance_data)
+        }
+        requested_prefetches.delete(instance_data["instance_id"])
+    })
+})
+
+function forget_prefetched_instances() {
+    prefetched_instances.clear()
+    requested_prefetches.clear()
+}
+
+function prefetch_neighbours(instance_id) {
+    let to_request = []
+    for (let i = instance_id - PREFETCH_RADIUS; i <= instance_id + PREFETCH_RADIUS; i++) {
+        if (i >= 0 && i < corpus_length && i !== instance_id
+            && !prefetched_instances.has(i) && !requested_prefetches.has(i)) {
+            to_request.push(i)
+            requested_prefetches.add(i)
+        }
+    }
+    // keep the prefetched instances around the current position only
+    for (let i of prefetched_instances.keys()) {
+        if (Math.abs(i - instance_id) > 2 * PREFETCH_RADIUS) {
+            prefetched_instances.delete(i)
+        }
+    }
+    if (to_request.length > 0) {
+        sio.emit("instance_prefetch_requested", to_request)
+    }
+}
+
+function show_instance(data) {
+    data["slices"].forEach(slice_data => {
+        if (slice_data["type"] == "graph") {
+            set_graph(slice_data)
+        } else {
+            set_table(slice_data)
+        }
+    })
+    // linkers last, since they refer to the nodes of the slices
+    data["linkers"].forEach(set_linker)
+    prefetch_neighbours(data["instance_id"])
+}
+
 sio.on("set_graph", (data) => {
+    set_graph(data)
+})
+
+function set_graph(data) {
     let canvas = canvas_dict[data["canvas_name"]]
     remove_graphs_from_canvas(canvas)
     let label_alternatives = null
@@ -193,9 +290,13 @@ sio.on("set_graph", (data) => {
     let graph = new Graph(20, 20, data["graph"], canvas, true, 0,
         label_alternatives, highlights, mouseover_texts)
     graph.registerNodesGlobally(data["canvas_name"])
-})
+}
 
 sio.on("set_table", (data) => {
+    set_table(data)
+})
+
+function set_table(data) {
     let canvas = canvas_dict[data["canvas_name"]]
     remove_strings_from_canvas(canvas)
     let label_alternatives = null
@@ -214,13 +315,20 @@ sio.on("set_table", (data) => {
     let table = new Table(20, 5, data["table"], canvas, label_alternatives, highlights,
         dependency_tree)
     table.registerNodesGlobally(data["canvas_name"])
-})
+}
 
 var alignment_color_scale = d3.scaleLinear().range(['white','#0742ac']);  // just kinda experimenting
 
 sio.on("set_linker", (data) => {
+    set_linker(data)
+})
+
+function set_linker(data) {
     let canvas_name1 = data["name1"]
     let canvas_name2 = data["name2"]
+    if ("dense_scores" in data) {
+        data["scores"] = decode_dense_scores(data["dense_scores"])
+    }
     // get arbitrary score from the linker
     let nn1 = Object.keys(data["scores"])[0]
     let nn2 = Object.keys(data["scores"][nn1])[0]
@@ -255,7 +363,40 @@ sio.on("set_linker", (data) => {
                 dropdown)
         }
     }
-})
+}
+
+function decode_dense_scores(dense_scores) {
+    // see vulcan/data_handling/linker_encoding.py. Lists and tables of scores become (arrays of) Float32Array views on the
+    // received data, so the scores are not copied.
+    let values = new Float32Array(dense_scores["data"])
+    let keys1 = dense_scores["keys1"]
+    let keys2 = dense_scores["keys2"]
+    let score_shape = dense_scores["shape"].slice(2)
+    let score_size = score_shape.reduce((a, b) => a * b, 1)
+    let scores = {}
+    for (let i = 0; i < keys1.length; i++) {
+        let scores_here = {}
+        for (let j = 0; j < keys2.length; j++) {
+            let offset = (i * keys2.length + j) * score_size
+            if (isNaN(values[offset])) {
+                continue  // no score for this pair of nodes
+            }
+            if (score_shape.length == 0) {
+                scores_here[keys2[j]] = values[offset]
+            } else if (score_shape.length == 1) {
+                scores_here[keys2[j]] = values.subarray(offset, offset + score_size)
+            } else {
+                let table = []
+                for (let row = 0; row < score_shape[0]; row++) {
+                    table.push(values.subarray(offset + row * score_shape[1], offset + (row + 1) * score_shape[1]))
+                }
+                scores_here[keys2[j]] = table
+            }
+        }
+        scores[keys1[i]] = scores_here
+    }
+    return scores
+}
 
 function create_linker_dropdown(canvas_name1, canvas_name2, headcount, layercount) {
     let label = d3.select("div#headerId").append("text")
@@ -403,20 +544,85 @@ sio.on("set_corpus_length", (data) => {
     set_corpus_position(current_corpus_position)
 })
 
-sio.on("search_completed", (data) => {
+sio.on("search_started", (data) => {
+    forget_prefetched_instances()
+    current_layout_id = null
+    current_search_job_id = data.job_id
+    search_in_progress = true
+    corpus_length = 0
     set_corpus_position(0)
-    sio.emit("instance_requested", current_corpus_position);
 })
 
+sio.on("search_progress", (data) => {
+    if (data.job_id !== current_search_job_id) {
+        return  // message from a search that was cancelled
+    }
+    update_search_match_count(data.match_count)
+})
+
+sio.on("search_completed", (data) => {
+    if (data == null) {
+        // the search was cleared
+        forget_prefetched_instances()
+        current_layout_id = null
+        current_search_job_id = null
+        search_in_progress = false
+        set_corpus_position(0)
+        request_instance(current_corpus_position);
+        return
+    }
+    if (data.job_id !== current_search_job_id) {
+        return
+    }
+    search_in_progress = false
+    update_search_match_count(data.match_count)
+})
+
+function update_search_match_count(match_count) {
+    let had_matches = corpus_length > 0
+    corpus_length = match_count
+    if (!had_matches && corpus_length > 0) {
+        // show the first match as soon as we have it, while the search goes on
+        set_corpus_position(0)
+        request_instance(current_corpus_position);
+    } else {
+        // only update the numbers; the current instance stays as it is
+        update_corpus_position_text()
+    }
+}
+
+function update_corpus_position_text() {
+    let text = "/" + corpus_length
+    if (search_in_progress) {
+        text += " (searching...)"
+    }
+    d3.select("#corpusPositionText").text(text)
+}
+
 sio.on("refresh_to_position_zero", (data) => {
+    forget_prefetched_instances()
+    current_layout_id = null
     set_corpus_position(0)
-    sio.emit("instance_requested", current_corpus_position);
+    request_instance(current_corpus_position);
+})
+
+sio.on("corpus_reloaded", (data) => {
+    // the input file changed; we stay at the same instance (or near it) if possible
+    forget_prefetched_instances()
+    current_layout_id = null
+    corpus_length = data.corpus_length
+    set_corpus_position(data.position)
+    request_instance(current_corpus_position);
 })
 
 sio.on("set_search_filters", (data) => {
     SEARCH_PATTERNS = data
 })
 
+sio.on("search_error", (data) => {
+    alert("Invalid search: " + data)
+})
+
 sio.on("server_error", (data) => {
     alert("Error on the server side. If you experience issues, please try reloading the page.")
 })
@@ -433,7 +639,7 @@ function set_corpus_position(new_position) {
     if (new_position >= 0 && new_position < corpus_length) {
         current_corpus_position = new_position
         document.getElementById("corpusPositionInput").value = current_corpus_position + 1
-        d3.select("#corpusPositionText").text("/" + corpus_length)
+        update_corpus_position_text()
         reset()
         set_layout(saved_layout)
         return true
@@ -442,7 +648,7 @@ function set_corpus_position(new_position) {
             // TODO maybe show some message that the search was empty, or that the corpus is empty.
             reset()
             document.getElementById("corpusPositionInput").value = 0
-            d3.select("#corpusPositionText").text("/" + corpus_length)
+            update_corpus_position_text()
         }
         return false
     }
@@ -478,7 +684,7 @@ d3.select("#corpusPositionInput").on("keypress", function() {
     if (d3.event.keyCode == 13) {
         let new_position = parseInt(d3.select("#corpusPositionInput").property("value")) - 1
         if (set_corpus_position(new_position)) {
-            sio.emit("instance_requested", current_corpus_position)
+            request_instance(current_corpus_position)
         } else {
             d3.select("#corpusPositionText").text("/" + corpus_length + " Error: invalid position requested")
         }
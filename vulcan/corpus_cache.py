@@ -0,0 +1,92 @@
+import hashlib
+import os
+import pickle
+from typing import Optional
+
+import vulcan
+from vulcan.data_handling.data_corpus import DataCorpus
+
+CACHE_FILE_SUFFIX = ".vulcancache"
+
+# Increase this whenever the cache file layout changes, so that old cache files are ignored.
+CACHE_FORMAT_VERSION = 4
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_cache_path(input_path: str) -> str:
+    return input_path + CACHE_FILE_SUFFIX
+
+
+def compute_cache_key(input_path: str, propbank_path: Optional[str], show_wikipedia_articles: bool,
+                      lazy_conversion: bool, conversion_cache_size: int) -> dict:
+    """
+    The cache key contains everything that influences the converted corpus: the content of the input file, the
+    propbank frames and other options that add mouseover texts, the conversion options (the cached corpus keeps the
+    size of its conversion caches), and the Vulcan version.
+    """
+    return {
+        "cache_format_version": CACHE_FORMAT_VERSION,
+        "vulcan_version": vulcan.__version__,
+        "input_file_hash": hash_file(input_path),
+        "propbank_frames": get_propbank_frames_fingerprint(propbank_path) if propbank_path else None,
+        "show_wikipedia_articles": show_wikipedia_articles,
+        "lazy_conversion": lazy_conversion,
+        "conversion_cache_size": conversion_cache_size if lazy_conversion else None,
+    }
+
+
+def get_propbank_frames_fingerprint(propbank_path: str) -> str:
+    """
+    :return: A hash of the names, modification times and sizes of the frame files in propbank_path (see
+        create_frame_to_definition_dict), so that the same frames in another directory give the same cache key, and
+        changed frames a different one. Hashing the content of the few thousand files would take much longer.
+    """
+    file_stats = []
+    for filename in sorted(os.listdir(propbank_path)):
+        if filename.endswith(".xml"):
+            stat = os.stat(os.path.join(propbank_path, filename))
+            file_stats.append((filename, stat.st_mtime_ns, stat.st_size))
+    return hashlib.sha256(repr(file_stats).encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def load_cached_corpus(cache_path: str, cache_key: dict) -> Optional[DataCorpus]:
+    """
+    :return: The cached DataCorpus, or None if there is no cache file or it was created for a different cache key.
+    """
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            # the key is stored first, so we don't have to read the whole corpus if the key does not match
+            if pickle.load(f) != cache_key:
+                print(f"Corpus cache {cache_path} is outdated and will be rebuilt.")
+                return None
+            data_corpus = pickle.load(f)
+    except Exception as e:
+        print(f"WARNING: could not read corpus cache {cache_path} ({e}). It will be rebuilt.")
+        return None
+    print(f"Loaded converted corpus from cache {cache_path}.")
+    return data_corpus
+
+
+def write_cached_corpus(cache_path: str, cache_key: dict, data_corpus: DataCorpus):
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump(cache_key, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data_corpus, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)  # atomic, so a crash never leaves a broken cache file behind
+        print(f"Wrote converted corpus to cache {cache_path}.")
+    except Exception as e:
+        print(f"WARNING: could not write corpus cache {cache_path} ({e}).")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,202 @@
+"""
+Reloading a corpus after its input file changed (e.g. when a training job adds new predictions), converting only the
+instances that actually changed.
+
+The reloader remembers a digest of the input of each corpus instance (all per-instance fields of all entries, see
+PER_INSTANCE_KEYS). On reload, only the instances whose digest changed, and the new ones, are converted (by running
+from_dict_list on just those instances); all other instances are taken over from the previous layout. This works as
+long as the entries themselves (names, formats, which fields they have, ...) stay the same; otherwise, and for lazily
+converted corpora (where nothing is converted ahead of time anyway), the whole corpus is loaded again.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from vulcan.data_handling.data_corpus import DataCorpus, from_dict_list
+from vulcan.data_handling.indexed_corpus_store import PER_INSTANCE_KEYS, is_indexed_corpus_file
+from vulcan.data_handling.lazy_instance_list import DEFAULT_CONVERSION_CACHE_SIZE
+from vulcan.file_loader import create_layout_from_filepath, load_input_file, get_corpus_version
+from vulcan.server.basic_layout import BasicLayout
+from vulcan.server.metrics import CORPUS_LOAD_DURATION
+from vulcan.startup_profile import profile_phase
+
+INSTANCE_DIGEST_SIZE = 16
+
+
+class CorpusReloader:
+    """
+    Loads a corpus from a file, and reloads it when the file changes. Takes the same options as
+    create_layout_from_filepath.
+    """
+
+    def __init__(self, input_path: str, is_json_file: bool = False, propbank_path: str = None,
+                 show_wikipedia_articles: bool = False, lazy_conversion: bool = False,
+                 conversion_cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE, warm_up: bool = False,
+                 workers: int = 1, use_cache: bool = False):
+        self.input_path = input_path
+        self.is_json_file = is_json_file
+        self.propbank_path = propbank_path
+        self.show_wikipedia_articles = show_wikipedia_articles
+        self.lazy_conversion = lazy_conversion
+        self.conversion_cache_size = conversion_cache_size
+        self.warm_up = warm_up
+        self.workers = workers
+        self.use_cache = use_cache
+        self.layout: Optional[BasicLayout] = None
+        self._file_stat = None
+        # with incremental reloading, the entries without their per-instance lists, and the digest of each instance
+        self._entry_headers: Optional[List[Dict[str, Any]]] = None
+        self._instance_digests: Optional[List[bytes]] = None
+
+    def load(self) -> BasicLayout:
+        """
+        Loads the whole corpus (possibly from the corpus cache, see create_layout_from_filepath).
+        """
+        self._file_stat = self.get_file_stat()
+        input_dicts = None
+        if self._can_reload_incrementally():
+            # the corpus and the digests must be made from the same content of the file, so we read it only once
+            with profile_phase("read input file"):
+                input_dicts = load_input_file(self.input_path, self.is_json_file)
+        self.layout = create_layout_from_filepath(self.input_path, self.is_json_file, self.propbank_path,
+                                                  self.show_wikipedia_articles,
+                                                  lazy_conversion=self.lazy_conversion,
+                                                  conversion_cache_size=self.conversion_cache_size,
+                                                  warm_up=self.warm_up, workers=self.workers,
+                                                  use_cache=self.use_cache, input_dicts=input_dicts)
+        if input_dicts is not None:
+            self._entry_headers = get_entry_headers(input_dicts)
+            self._instance_digests = compute_instance_digests(input_dicts)
+            if self.get_file_stat() != self._file_stat:
+                # the file changed while we loaded it, so the corpus cache may already hold a newer version than
+                #  input_dicts. The next reload (which the change triggers) loads the whole corpus again.
+                self._instance_digests = None
+        return self.layout
+
+    def has_changed(self) -> bool:
+        """
+        :return: Whether the input file was modified since it was last loaded.
+        """
+        return self.get_file_stat() != self._file_stat
+
+    def reload(self) -> Tuple[BasicLayout, Optional[List[int]]]:
+        """
+        Loads the current version of the input file.
+        :return: The new layout, and the (sorted) indices of the instances that changed or are new. The indices are
+            None if the whole corpus was loaded again, since its entries changed (then all instances may have
+            changed).
+        """
+        if not self._can_reload_incrementally() or self._instance_digests is None:
+            return self.load(), None
+        start_time = time.perf_counter()
+        # if reloading fails (e.g. since the file is still being written), we only try again after the next change
+        self._file_stat = self.get_file_stat()
+        corpus_version = get_corpus_version(self.input_path, self.propbank_path, self.show_wikipedia_articles)
+        input_dicts = load_input_file(self.input_path, self.is_json_file)
+        entry_headers = get_entry_headers(input_dicts)
+        instance_digests = compute_instance_digests(input_dicts)
+        if entry_headers != self._entry_headers or instance_digests is None:
+            print("The entries of the corpus changed, reloading the whole corpus.")
+            data_corpus = self._convert(input_dicts)
+            self.layout = BasicLayout(data_corpus.slices.values(), data_corpus.linkers, data_corpus.size,
+                                      corpus_version)
+            self._entry_headers = entry_headers
+            self._instance_digests = instance_digests
+            CORPUS_LOAD_DURATION.observe(time.perf_counter() - start_time, "input_file")
+            return self.layout, None
+
+        changed_indices = [i for i, digest in enumerate(instance_digests)
+                           if i >= len(self._instance_digests) or digest != self._instance_digests[i]]
+        print(f"{len(changed_indices)} of {len(instance_digests)} instances changed, converting those.")
+        changed_corpus = self._convert(restrict_to_instances(input_dicts, changed_indices)) \
+            if len(changed_indices) > 0 else None
+        self.layout = merge_changed_instances(self.layout, changed_corpus, changed_indices, len(instance_digests),
+                                              corpus_version)
+        self._entry_headers = entry_headers
+        self._instance_digests = instance_digests
+        CORPUS_LOAD_DURATION.observe(time.perf_counter() - start_time, "incremental_reload")
+        return self.layout, changed_indices
+
+    def _convert(self, input_dicts: List[Dict]) -> DataCorpus:
+        return from_dict_list(input_dicts, propbank_frames_path=self.propbank_path,
+                              show_wikipedia=self.show_wikipedia_articles, workers=self.workers)
+
+    def _can_reload_incrementally(self) -> bool:
+        # indexed corpus files are always converted lazily
+        return not self.lazy_conversion and not is_indexed_corpus_file(self.input_path)
+
+    def get_file_stat(self) -> Optional[Tuple[int, int]]:
+        """
+        :return: Modification time and size of the input file, or None if it does not exist.
+        """
+        try:
+            stat = os.stat(self.input_path)
+        except OSError:
+            return None  # e.g. while the file is being replaced
+        return stat.st_mtime_ns, stat.st_size
+
+
+def get_entry_headers(input_dicts: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    :return: The entries without their per-instance lists, but with the names of the per-instance fields they have.
+    """
+    return [dict({key: value for key, value in entry.items() if key not in PER_INSTANCE_KEYS},
+                 per_instance_keys=[key for key in PER_INSTANCE_KEYS if key in entry])
+            for entry in input_dicts]
+
+
+def compute_instance_digests(input_dicts: List[Dict]) -> Optional[List[bytes]]:
+    """
+    :return: For each corpus instance, a digest of all its per-instance fields. None if the per-instance lists do not
+        all have the same length (then we cannot tell which instances changed).
+    """
+    lists = [entry[key] for entry in input_dicts for key in PER_INSTANCE_KEYS if key in entry]
+    if len(lists) == 0 or any(len(lst) != len(lists[0]) for lst in lists):
+        return None
+    return [hashlib.blake2b(pickle.dumps([lst[i] for lst in lists], protocol=pickle.HIGHEST_PROTOCOL),
+                            digest_size=INSTANCE_DIGEST_SIZE).digest()
+            for i in range(len(lists[0]))]
+
+
+def restrict_to_instances(input_dicts: List[Dict], indices: Sequence[int]) -> List[Dict]:
+    """
+    :return: Copies of the entries that contain only the given instances.
+    """
+    return [dict(entry, **{key: [entry[key][i] for i in indices] for key in PER_INSTANCE_KEYS if key in entry})
+            for entry in input_dicts]
+
+
+def merge_changed_instances(old_layout: BasicLayout, changed_corpus: Optional[DataCorpus],
+                            changed_indices: List[int], corpus_size: int, corpus_version: str = None) -> BasicLayout:
+    """
+    :param changed_corpus: The converted changed instances, in the order of changed_indices (None if there are none).
+    :return: A new layout with the instances of changed_corpus at changed_indices, and the instances of old_layout
+        everywhere else.
+    """
+    positions = {index: position for position, index in enumerate(changed_indices)}
+
+    def merge(old_list, new_list):
+        if old_list is None:
+            return None
+        return [new_list[positions[i]] if i in positions else old_list[i] for i in range(corpus_size)]
+
+    data_corpus = DataCorpus()
+    data_corpus.size = corpus_size
+    for row in old_layout.layout:
+        for old_slice in row:
+            new_slice = changed_corpus.slices[old_slice.name] if changed_corpus is not None else None
+
+            def merge_field(field):
+                return merge(getattr(old_slice, field), getattr(new_slice, field) if new_slice is not None else None)
+
+            data_corpus.add_slice(old_slice.name, merge_field("instances"), old_slice.visualization_type,
+                                  merge_field("label_alternatives"), merge_field("highlights"),
+                                  merge_field("mouseover_texts"), merge_field("dependency_trees"))
+    for linker_index, old_linker in enumerate(old_layout.linkers):
+        new_scores = changed_corpus.linkers[linker_index]["scores"] if changed_corpus is not None else None
+        data_corpus.add_linker({"name1": old_linker["name1"], "name2": old_linker["name2"],
+                                "scores": merge(old_linker["scores"], new_scores)})
+    return BasicLayout(data_corpus.slices.values(), data_corpus.linkers, data_corpus.size, corpus_version)
@@ -1,23 +1,17 @@
 from typing import List, Dict, Tuple, Any
-import copy
+import functools
 import textwrap
 
-from vulcan.data_handling.format_names import FORMAT_NAME_GRAPH, FORMAT_NAME_GRAPH_STRING, FORMAT_NAME_STRING, \
-    FORMAT_NAME_TOKEN, FORMAT_NAME_TOKENIZED_STRING, FORMAT_NAME_NLTK_TREE, FORMAT_NAME_NLTK_TREE_STRING, \
-    FORMAT_NAME_AMTREE, FORMAT_NAME_AMTREE_STRING, FORMAT_NAME_STRING_TABLE, FORMAT_NAME_OBJECT_TABLE
-from vulcan.data_handling.instance_readers.amr_graph_instance_reader import AMRGraphInstanceReader, \
-    AMRGraphStringInstanceReader
-from vulcan.data_handling.instance_readers.amtree_instance_reader import AMTreeInstanceReader, \
-    AMTreeStringInstanceReader
-from vulcan.data_handling.instance_readers.nltk_instance_reader import NLTKTreeInstanceReader, \
-    NLTKTreeStringInstanceReader
-from vulcan.data_handling.instance_readers.string_instance_reader import StringInstanceReader, TokenInstanceReader, \
-    TokenizedStringInstanceReader
-from vulcan.data_handling.instance_readers.table_readers import StringTableInstanceReader, ObjectTableInstanceReader
+from vulcan.data_handling.format_names import FORMAT_NAME_GRAPH, FORMAT_NAME_GRAPH_STRING
+from vulcan.data_handling.instance_readers.instance_reader_registry import get_instance_reader_by_name, convert_label
+from vulcan.data_handling.lazy_instance_list import LazyInstanceList, DEFAULT_CONVERSION_CACHE_SIZE
+from vulcan.data_handling.linker_encoding import make_wire_linker_scores
 from vulcan.data_handling.visualization_type import VisualizationType
 from collections import OrderedDict
-from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import for_each_node_top_down
+from collections.abc import Sequence
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import for_each_node_top_down, GraphNode
 from vulcan.data_handling.linguistic_objects.graphs.propbank_frame_reader import create_frame_to_definition_dict
+from vulcan.startup_profile import profile_phase
 import wikipedia
 
 
@@ -43,13 +37,26 @@ class DataCorpus:
                                         mouseover_texts, dependency_trees)
 
     def add_linker(self, linker):
+        """
+        Add a linker entry (with 'name1', 'name2' and 'scores') to the corpus. Its scores are converted to the form
+        in which they are sent to the client by normalize_linkers, once all slices are known.
+        """
         self.linkers.append(linker)
 
 
 def from_dict_list(data: List[Dict], propbank_frames_path: str = None,
-                   show_wikipedia: bool = False) -> DataCorpus:
+                   show_wikipedia: bool = False, lazy_conversion: bool = False,
+                   conversion_cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE,
+                   warm_up: bool = False, workers: int = 1) -> DataCorpus:
     """
     Create a DataCorpus object from a dictionary.
+    :param lazy_conversion: If true, instances (and their label alternatives and mouseover texts) are only converted
+        when they are first accessed, and only the most recently used conversions are kept in memory. Otherwise, the
+        whole corpus is converted here.
+    :param conversion_cache_size: With lazy_conversion, the number of converted instances kept in memory per slice.
+    :param warm_up: With lazy_conversion, start converting the first instances of each slice in the background.
+    :param workers: Without lazy_conversion, the number of processes that convert the instances of each slice in
+        parallel.
     """
     propbank_frames_dict = load_propbank_if_applicable(propbank_frames_path)
 
@@ -59,18 +66,31 @@ def from_dict_list(data: List[Dict], propbank_frames_path: str = None,
         entry_type = entry.get('type', 'data')  # default to data
 
         if entry_type == 'data':
-            load_data_entry(data_corpus, entry, propbank_frames_dict, show_wikipedia)
+            load_data_entry(data_corpus, entry, propbank_frames_dict, show_wikipedia,
+                            conversion_cache_size if lazy_conversion else None, workers)
 
         elif entry_type == 'linker':
             load_linker_entry(data_corpus, entry)
 
         else:
             raise ValueError(f"Error when creating DataCorpus from dict list: unknown entry type '{entry_type}'")
+    normalize_linkers(data_corpus, conversion_cache_size if lazy_conversion else None)
+    if lazy_conversion and warm_up:
+        start_warm_up(data_corpus)
     return data_corpus
 
 
+def start_warm_up(data_corpus: DataCorpus):
+    """
+    Starts converting the first instances of all lazily converted slices in the background.
+    """
+    for corpus_slice in data_corpus.slices.values():
+        if isinstance(corpus_slice.instances, LazyInstanceList):
+            corpus_slice.instances.start_warm_up()
+
+
 def load_linker_entry(data_corpus, entry):
-    # TODO: some sanity check that the linker refers to only existing names (but we may not have seen them yet, so check later?)
+    # the names are checked in normalize_linkers, since the slices may come after the linker
     data_corpus.add_linker(entry)
     if data_corpus.size:
         if data_corpus.size != len(entry['scores']):
@@ -85,21 +105,61 @@ def load_linker_entry(data_corpus, entry):
               f" {data_corpus.size} instances")
 
 
-def load_data_entry(data_corpus, entry, propbank_frames_dict, show_wikipedia):
+def normalize_linkers(data_corpus: DataCorpus, conversion_cache_size: int = None):
+    """
+    Replaces the scores of all linkers by their wire-ready form (see make_wire_linker_scores), so that sending an
+    instance to a client does not need to convert them again. Must be called after all slices are added.
+    :param conversion_cache_size: If not None, the scores are converted lazily, keeping this many conversions in
+        memory (see LazyInstanceList).
+    """
+    for i, linker in enumerate(data_corpus.linkers):
+        for name in [linker['name1'], linker['name2']]:
+            if name not in data_corpus.slices:
+                print(f"WARNING: linker \"{linker['name1']}\"--\"{linker['name2']}\" refers to \"{name}\", but"
+                      f" there is no data entry with that name.")
+        convert = functools.partial(make_wire_linker_scores,
+                                    name1_is_string=is_string_slice(data_corpus, linker['name1']),
+                                    name2_is_string=is_string_slice(data_corpus, linker['name2']))
+        if conversion_cache_size is None:
+            with profile_phase("convert linker scores", f"{linker['name1']}--{linker['name2']}",
+                           len(linker['scores'])) as phase:
+                scores = list(map(phase.time_each(convert), linker['scores']))
+        else:
+            scores = LazyInstanceList(linker['scores'], convert, conversion_cache_size)
+        data_corpus.linkers[i] = {'name1': linker['name1'], 'name2': linker['name2'], 'scores': scores}
+
+
+def is_string_slice(data_corpus: DataCorpus, name: str) -> bool:
+    corpus_slice = data_corpus.slices.get(name)
+    return corpus_slice is not None and corpus_slice.visualization_type == VisualizationType.STRING
+
+
+def load_data_entry(data_corpus, entry, propbank_frames_dict, show_wikipedia, conversion_cache_size=None,
+                    workers=1):
+    """
+    :param conversion_cache_size: If not None, the slice converts its instances lazily, keeping this many conversions
+        in memory (see LazyInstanceList).
+    :param workers: Number of processes for converting the instances (if not converted lazily).
+    """
     name = process_name(entry)
-    input_format, instance_reader, instances = process_instances(data_corpus, entry, name)
-    label_alternatives = process_label_alternatives(data_corpus, entry, name)
+    input_format, instance_reader, instances = process_instances(data_corpus, entry, name, conversion_cache_size,
+                                                                 workers)
+    label_alternatives = process_label_alternatives(data_corpus, entry, name, conversion_cache_size)
     dependency_trees = process_dependency_trees(data_corpus, entry, name)
     highlights = process_highlights(data_corpus, entry, name)
-    mouseover_texts = process_mouseover_texts(input_format, instances, propbank_frames_dict, show_wikipedia)
+    mouseover_texts = process_mouseover_texts(input_format, instances, propbank_frames_dict, show_wikipedia,
+                                              conversion_cache_size, name)
     data_corpus.add_slice(name, instances, instance_reader.get_visualization_type(), label_alternatives,
                           highlights, mouseover_texts, dependency_trees)
 
 
+@functools.lru_cache(maxsize=None)
 def load_propbank_if_applicable(propbank_frames_path):
+    # cached, so that all corpora of a server share one (read-only) copy of the frames
     if propbank_frames_path:
         print(f"Loading propbank frames from XML files in {propbank_frames_path}. This may take a minute or two...")
-        propbank_frames_dict = create_frame_to_definition_dict(propbank_frames_path)
+        with profile_phase("load propbank frames"):
+            propbank_frames_dict = create_frame_to_definition_dict(propbank_frames_path)
     else:
         propbank_frames_dict = None
     return propbank_frames_dict
@@ -113,7 +173,7 @@ def process_name(entry):
     return name
 
 
-def process_instances(data_corpus, entry, name):
+def process_instances(data_corpus, entry, name, conversion_cache_size=None, workers=1):
     instances = entry['instances']
     if not instances:
         raise ValueError('Error when creating DataCorpus from dict list: "instances" entry is required for'
@@ -129,14 +189,32 @@ def process_instances(data_corpus, entry, name):
         print(f"Retreived DataCorpus size from 'data' entry {name}: {data_corpus.size} instances")
     input_format = entry.get('format', 'string')
     instance_reader = get_instance_reader_by_name(input_format)
-    instances = instance_reader.convert_instances(instances)
+    if conversion_cache_size is None:
+        with profile_phase("convert instances", name, len(instances)) as phase:
+            if workers > 1:
+                # the instances are converted in other processes, so we cannot time them individually
+                instances = instance_reader.convert_instances(instances, workers)
+            else:
+                instances = list(map(phase.time_each(instance_reader.convert_single_instance), instances))
+    else:
+        instances = LazyInstanceList(instances, instance_reader.convert_single_instance, conversion_cache_size)
     return input_format, instance_reader, instances
 
 
-def process_mouseover_texts(input_format, instances, propbank_frames_dict, show_wikipedia):
+def process_mouseover_texts(input_format, instances, propbank_frames_dict, show_wikipedia,
+                            conversion_cache_size=None, name=None):
     mouseover_texts = None
-    if input_format in [FORMAT_NAME_GRAPH, FORMAT_NAME_GRAPH_STRING]:
-        mouseover_texts = get_mouseover_texts(instances, propbank_frames_dict, show_wikipedia)
+    if input_format in [FORMAT_NAME_GRAPH, FORMAT_NAME_GRAPH_STRING] \
+            and (propbank_frames_dict is not None or show_wikipedia):
+        if conversion_cache_size is None:
+            with profile_phase("look up mouseover texts", name, len(instances)):
+                mouseover_texts = get_mouseover_texts(instances, propbank_frames_dict, show_wikipedia)
+        else:
+            mouseover_texts = LazyInstanceList(instances,
+                                               functools.partial(get_mouseover_texts_for_graph,
+                                                                 propbank_frames_dict=propbank_frames_dict,
+                                                                 do_wiki_lookup=show_wikipedia),
+                                               conversion_cache_size)
     return mouseover_texts
 
 
@@ -152,8 +230,8 @@ def process_highlights(data_corpus, entry, name):
     return highlights
 
 
-def process_label_alternatives(data_corpus, entry, name):
-    label_alternatives = read_label_alternatives(entry)
+def process_label_alternatives(data_corpus, entry, name, conversion_cache_size=None):
+    label_alternatives = read_label_alternatives(entry, conversion_cache_size)
     # data_corpus.size is now always defined here
     if label_alternatives is not None and data_corpus.size != len(label_alternatives):
         print(f"WARNING: number of label alternative entries for {name} ({len(label_alternatives)})"
@@ -174,38 +252,43 @@ def process_dependency_trees(data_corpus, entry, name):
     return dependency_trees
 
 
-def read_label_alternatives(corpus_entry):
+def read_label_alternatives(corpus_entry, conversion_cache_size=None):
     """
     Creates a copy of the 'label_alternatives' entry in corpus_entry, where each label alternative has been
     processed by the appropriate InstanceReader.
     :param corpus_entry: An input corpus entry of type 'data'.
+    :param conversion_cache_size: If not None, the label alternatives are converted lazily instead (see
+        LazyInstanceList).
     :return: That created copy
     """
     if 'label_alternatives' in corpus_entry:
         label_alternatives = corpus_entry['label_alternatives']
         check_is_list(label_alternatives)
-        ret = []
-        for label_alternative_instance in label_alternatives:
-            check_is_dict(label_alternative_instance)
-            ret_instance = {}
-            for node_name, node_label_alternatives in label_alternative_instance.items():
-                ret_node = []
-                check_is_list(node_label_alternatives)
-                for node_label_alternative in node_label_alternatives:
-                    check_is_dict(node_label_alternative)
-
-                    ret_alt = copy.deepcopy(node_label_alternative)
-                    instance_reader = get_instance_reader_by_name(ret_alt['format'])
-                    ret_alt['label'] = instance_reader.convert_single_instance(ret_alt['label'])
-                    ret_alt['format'] = instance_reader.get_visualization_type()
-                    ret_node.append(ret_alt)
-                ret_instance[node_name] = ret_node
-            ret.append(ret_instance)
-        return ret
+        if conversion_cache_size is not None:
+            return LazyInstanceList(label_alternatives, read_label_alternatives_for_instance, conversion_cache_size)
+        with profile_phase("convert label alternatives", corpus_entry.get('name'), len(label_alternatives)) as phase:
+            return list(map(phase.time_each(read_label_alternatives_for_instance), label_alternatives))
     else:
         return None
 
 
+def read_label_alternatives_for_instance(label_alternative_instance):
+    check_is_dict(label_alternative_instance)
+    ret_instance = {}
+    for node_name, node_label_alternatives in label_alternative_instance.items():
+        ret_node = []
+        check_is_list(node_label_alternatives)
+        for node_label_alternative in node_label_alternatives:
+            check_is_dict(node_label_alternative)
+
+            # the converted label may be shared with other label alternatives (see convert_label)
+            ret_alt = dict(node_label_alternative)
+            ret_alt['format'], ret_alt['label'] = convert_label(ret_alt['format'], ret_alt['label'])
+            ret_node.append(ret_alt)
+        ret_instance[node_name] = ret_node
+    return ret_instance
+
+
 def read_dependency_trees(corpus_entry):
     if 'dependency_trees' in corpus_entry:
         dependency_trees = corpus_entry['dependency_trees']
@@ -222,48 +305,53 @@ def check_is_dict(object):
 
 
 def check_is_list(object):
-    if not isinstance(object, list):
+    # read-only sequences such as the columns of an IndexedCorpusStore work just as well as lists
+    if not isinstance(object, Sequence) or isinstance(object, str):
         raise ValueError(f"Error: object must be a list, "
                          f"but was {type(object)}")
 
 
-def get_mouseover_texts(graphs: List[Dict], propbank_frames_dict=None, do_wiki_lookup: bool = True):
+def get_mouseover_texts(graphs: List[GraphNode], propbank_frames_dict=None, do_wiki_lookup: bool = True):
     if propbank_frames_dict is None and not do_wiki_lookup:
         return None
     ret = []
     if do_wiki_lookup:
         print("Loading wikipedia summaries. This can take a while!")
     for i, graph_as_dict in enumerate(graphs):
-        mouseover_texts_here = dict()
-        if propbank_frames_dict is not None:
-            for_each_node_top_down(graph_as_dict,
-                                   lambda node: add_propbank_frame_to_mouseover_if_applicable(node,
-                                                                                              mouseover_texts_here,
-                                                                                              propbank_frames_dict))
-        if do_wiki_lookup:
-            if i % 20 == 0:
-                print(f"Looking up wikipedia summaries for graph {i} of {len(graphs)} (printing every 20 graphs).")
-            for_each_node_top_down(graph_as_dict,
-                                   lambda node: add_wiki_lookup_to_mouseover_if_applicable(node, mouseover_texts_here))
-        ret.append(mouseover_texts_here)
+        if do_wiki_lookup and i % 20 == 0:
+            print(f"Looking up wikipedia summaries for graph {i} of {len(graphs)} (printing every 20 graphs).")
+        ret.append(get_mouseover_texts_for_graph(graph_as_dict, propbank_frames_dict, do_wiki_lookup))
     return ret
 
 
-def add_propbank_frame_to_mouseover_if_applicable(node: Dict, mouseover_texts_here: Dict, propbank_frames_dict):
-    node_label = node["node_label"]
-    node_name = node["node_name"]
+def get_mouseover_texts_for_graph(graph_as_dict: GraphNode, propbank_frames_dict=None, do_wiki_lookup: bool = True):
+    mouseover_texts_here = dict()
+    if propbank_frames_dict is not None:
+        for_each_node_top_down(graph_as_dict,
+                               lambda node: add_propbank_frame_to_mouseover_if_applicable(node,
+                                                                                          mouseover_texts_here,
+                                                                                          propbank_frames_dict))
+    if do_wiki_lookup:
+        for_each_node_top_down(graph_as_dict,
+                               lambda node: add_wiki_lookup_to_mouseover_if_applicable(node, mouseover_texts_here))
+    return mouseover_texts_here
+
+
+def add_propbank_frame_to_mouseover_if_applicable(node: GraphNode, mouseover_texts_here: Dict, propbank_frames_dict):
+    node_label = node.node_label
+    node_name = node.node_name
     if node_label in propbank_frames_dict:
         mouseover_texts_here[node_name] = propbank_frames_dict[node_label]
 
 
-def add_wiki_lookup_to_mouseover_if_applicable(node: Dict, mouseover_texts_here: Dict):
+def add_wiki_lookup_to_mouseover_if_applicable(node: GraphNode, mouseover_texts_here: Dict):
     # c.f. https://stackoverflow.com/questions/4460921/extract-the-first-paragraph-from-a-wikipedia-article-python
-    node_label = node["node_label"]
-    node_name = node["node_name"]
+    node_label = node.node_label
+    node_name = node.node_name
     # actually adding to the child node if this is a wiki edge
-    node_name = node["node_name"]
-    # print(node["incoming_edge"])
-    if node["incoming_edge"] == "wiki":
+    node_name = node.node_name
+    # print(node.incoming_edge)
+    if node.incoming_edge == "wiki":
         try:
             wiki_summary = wikipedia.summary(node_label, sentences=2)
             # print(wiki_summary)
@@ -292,35 +380,3 @@ class CorpusSlice:
         # else:
         #     print("no mouseover_texts found in corpus slice ", name)
         self.dependency_trees = dependency_trees
-
-
-def get_instance_reader_by_name(reader_name):
-    """
-
-    :param reader_name:
-    :return:
-    """
-    # TODO this has a duplicate in ObjectTableInstanceReader to avoid circular imports.
-    #  There should be a better solution!
-    if reader_name == FORMAT_NAME_STRING:
-        return StringInstanceReader()
-    elif reader_name == FORMAT_NAME_TOKEN:
-        return TokenInstanceReader()
-    elif reader_name == FORMAT_NAME_TOKENIZED_STRING:
-        return TokenizedStringInstanceReader()
-    elif reader_name == FORMAT_NAME_NLTK_TREE:
-        return NLTKTreeInstanceReader()
-    elif reader_name == FORMAT_NAME_NLTK_TREE_STRING:
-        return NLTKTreeStringInstanceReader()
-    elif reader_name == FORMAT_NAME_GRAPH:
-        return AMRGraphInstanceReader()
-    elif reader_name == FORMAT_NAME_GRAPH_STRING:
-        return AMRGraphStringInstanceReader()
-    elif reader_name == FORMAT_NAME_AMTREE:
-        return AMTreeInstanceReader()
-    elif reader_name == FORMAT_NAME_AMTREE_STRING:
-        return AMTreeStringInstanceReader()
-    elif reader_name == FORMAT_NAME_STRING_TABLE:
-        return StringTableInstanceReader()
-    elif reader_name == FORMAT_NAME_OBJECT_TABLE:
-        return ObjectTableInstanceReader()
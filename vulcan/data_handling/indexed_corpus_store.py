@@ -0,0 +1,174 @@
+"""
+This defines an indexed on-disk format for Vulcan input files, for corpora that are too large to load into memory.
+
+The file contains the same information as the usual list of entry dicts (see vulcan.pickle_builder), but stored per
+corpus instance: record i holds, for each entry name, the i-th element of each of that entry's per-instance lists
+(instances, label alternatives, highlights, dependency trees, linker scores). Each record is pickled separately, and
+an index of record offsets at the end of the file allows reading any single record through mmap, without reading
+the rest of the file.
+
+Layout: MAGIC, record 0, ..., record n-1, pickled header, 8-byte offset of the header.
+"""
+
+import mmap
+import pickle
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, Dict, List
+
+MAGIC = b"VULCIDX1"
+FOOTER_FORMAT = "<Q"
+FOOTER_SIZE = struct.calcsize(FOOTER_FORMAT)
+
+# The keys of an entry dict that hold one element per corpus instance. Everything else in an entry dict (type, name,
+#  format, ...) is stored once in the header.
+PER_INSTANCE_KEYS = ["instances", "label_alternatives", "highlights", "dependency_trees", "scores"]
+
+# Elements of records that do not have a field, e.g. instances without label alternatives when only some instances
+#  have them. These are the same values the PickleBuilder uses to fill such gaps.
+MISSING_FIELD_DEFAULTS = {"label_alternatives": {}, "highlights": None, "dependency_trees": [], "scores": {}}
+
+# Number of recently read records kept in memory. Requesting an instance reads the same record once per slice and
+#  linker, so this only needs to cover a few instances.
+RECORD_CACHE_SIZE = 8
+
+
+def is_indexed_corpus_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class IndexedCorpusWriter:
+    """
+    Writes an indexed corpus file record by record, so the corpus never needs to be in memory as a whole.
+    """
+
+    def __init__(self, path: str, entry_headers: List[Dict[str, Any]]):
+        """
+        :param path: The file to write.
+        :param entry_headers: One dict per entry, like the entry dicts of the usual input format but without the
+            per-instance lists (PER_INSTANCE_KEYS). Must contain 'name'.
+        """
+        self.entry_headers = entry_headers
+        self.offsets = array("Q")
+        # for each entry name and per-instance field, the number of records up to the last one containing that field
+        self.field_lengths = {header["name"]: {} for header in entry_headers}
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+
+    def write_record(self, record: Dict[str, Dict[str, Any]]):
+        """
+        :param record: Maps entry names to dicts that map per-instance keys (see PER_INSTANCE_KEYS) to the element
+            for this instance. Fields that an entry does not have (e.g. no label alternatives) are simply left out;
+            when reading, they are filled with MISSING_FIELD_DEFAULTS.
+        """
+        for name, fields in record.items():
+            for key in fields:
+                self.field_lengths[name][key] = len(self.offsets) + 1
+        self.offsets.append(self._file.tell())
+        pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        header_offset = self._file.tell()
+        self.offsets.append(header_offset)  # end of the last record
+        header = {
+            "entries": self.entry_headers,
+            "field_lengths": self.field_lengths,
+            "offsets": self.offsets.tobytes(),
+        }
+        pickle.dump(header, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(struct.pack(FOOTER_FORMAT, header_offset))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class IndexedCorpusStore:
+    """
+    Read access to an indexed corpus file through mmap. Only the header (entry dicts and record offsets) is held in
+    memory; records are read on demand.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Error: {path} is not an indexed Vulcan corpus file.")
+        header_offset = struct.unpack(FOOTER_FORMAT, self._mmap[-FOOTER_SIZE:])[0]
+        header = pickle.loads(self._mmap[header_offset:-FOOTER_SIZE])
+        self.entry_headers = header["entries"]
+        self.field_lengths = header["field_lengths"]
+        self.offsets = array("Q")
+        self.offsets.frombytes(header["offsets"])
+        self._record_cache = OrderedDict()
+        # records are read from several threads, e.g. when warming up lazily converted slices
+        self._record_cache_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_record(self, index: int) -> Dict[str, Dict[str, Any]]:
+        with self._record_cache_lock:
+            record = self._record_cache.get(index)
+            if record is not None:
+                self._record_cache.move_to_end(index)
+                return record
+        record = pickle.loads(self._mmap[self.offsets[index]:self.offsets[index + 1]])
+        with self._record_cache_lock:
+            self._record_cache[index] = record
+            while len(self._record_cache) > RECORD_CACHE_SIZE:
+                self._record_cache.popitem(last=False)
+        return record
+
+    def get_entry_dicts(self) -> List[Dict[str, Any]]:
+        """
+        :return: The entries in the usual input format (see vulcan.data_handling.data_corpus.from_dict_list), except
+            that the per-instance lists are IndexedColumns that read from this store on demand.
+        """
+        ret = []
+        for header in self.entry_headers:
+            entry = dict(header)
+            for key, length in self.field_lengths[header["name"]].items():
+                entry[key] = IndexedColumn(self, header["name"], key, length)
+            ret.append(entry)
+        return ret
+
+    def __getstate__(self):
+        # the mmap can't be pickled, but can be reopened from the path
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+
+class IndexedColumn(Sequence):
+    """
+    A read-only list view of one per-instance field of one entry in an IndexedCorpusStore, e.g. the instances of
+    the entry 'Predicted graph'.
+    """
+
+    def __init__(self, store: IndexedCorpusStore, entry_name: str, key: str, length: int):
+        self.store = store
+        self.entry_name = entry_name
+        self.key = key
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"IndexedColumn index {index} out of range")
+        return self.store.get_record(index)[self.entry_name].get(self.key, MISSING_FIELD_DEFAULTS.get(self.key))
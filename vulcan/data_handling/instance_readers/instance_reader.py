@@ -1,4 +1,5 @@
 from vulcan.data_handling.visualization_type import VisualizationType
+from vulcan.parallel import can_fork, map_in_forked_processes
 
 
 class InstanceReader:
@@ -6,9 +7,31 @@ class InstanceReader:
     def convert_single_instance(self, instance):
         raise NotImplementedError()
 
-    def convert_instances(self, instances):
+    def convert_instances(self, instances, workers: int = 1):
+        """
+        :param instances: The instances to convert.
+        :param workers: If larger than 1, the instances are split into this many chunks, which are converted in
+            parallel by forked worker processes (see map_in_forked_processes; multiprocessing pools deadlock once the
+            server has monkey-patched the standard library with eventlet). The result is in the same order as the
+            input either way.
+        """
+        if workers > 1 and len(instances) > 1:
+            if can_fork():
+                return self._convert_instances_in_parallel(instances, workers)
+            print("WARNING: converting in parallel is not supported on this system, using a single process.")
         return [self.convert_single_instance(instance) for instance in instances]
 
+    def _convert_instances_in_parallel(self, instances, workers: int):
+        chunk_size = -(-len(instances) // workers)  # ceiling division
+        chunks = [instances[i:i + chunk_size] for i in range(0, len(instances), chunk_size)]
+        ret = []
+        for converted_chunk in map_in_forked_processes(self._convert_chunk, chunks):
+            ret.extend(converted_chunk)
+        return ret
+
+    def _convert_chunk(self, chunk):
+        return [self.convert_single_instance(instance) for instance in chunk]
+
     def get_visualization_type(self) -> VisualizationType:
         raise NotImplementedError()
 
@@ -0,0 +1,77 @@
+import functools
+
+from vulcan.data_handling.format_names import FORMAT_NAME_STRING, FORMAT_NAME_TOKEN, FORMAT_NAME_TOKENIZED_STRING, \
+    FORMAT_NAME_NLTK_TREE, FORMAT_NAME_NLTK_TREE_STRING, FORMAT_NAME_GRAPH, FORMAT_NAME_GRAPH_STRING, \
+    FORMAT_NAME_AMTREE, FORMAT_NAME_AMTREE_STRING, FORMAT_NAME_STRING_TABLE, FORMAT_NAME_OBJECT_TABLE
+from vulcan.data_handling.instance_readers.amr_graph_instance_reader import AMRGraphInstanceReader, \
+    AMRGraphStringInstanceReader
+from vulcan.data_handling.instance_readers.amtree_instance_reader import AMTreeInstanceReader, \
+    AMTreeStringInstanceReader
+from vulcan.data_handling.instance_readers.instance_reader import InstanceReader
+from vulcan.data_handling.instance_readers.nltk_instance_reader import NLTKTreeInstanceReader, \
+    NLTKTreeStringInstanceReader
+from vulcan.data_handling.instance_readers.string_instance_reader import StringInstanceReader, TokenInstanceReader, \
+    TokenizedStringInstanceReader
+from vulcan.data_handling.instance_readers.table_readers import StringTableInstanceReader, ObjectTableInstanceReader
+
+# Maximum number of converted labels that convert_label keeps. Label alternatives repeat a lot (e.g. the same few
+#  thousand supertags in the output of an AM parser), so this covers the distinct labels of most corpora, while
+#  bounding the memory for corpora where they do not repeat. The cache is shared by all corpora, and is also used when
+#  instances are converted lazily.
+LABEL_CONVERSION_CACHE_SIZE = 20000
+
+# The instance readers have no state, so one of each is enough.
+_INSTANCE_READERS_BY_NAME = {
+    FORMAT_NAME_STRING: StringInstanceReader(),
+    FORMAT_NAME_TOKEN: TokenInstanceReader(),
+    FORMAT_NAME_TOKENIZED_STRING: TokenizedStringInstanceReader(),
+    FORMAT_NAME_NLTK_TREE: NLTKTreeInstanceReader(),
+    FORMAT_NAME_NLTK_TREE_STRING: NLTKTreeStringInstanceReader(),
+    FORMAT_NAME_GRAPH: AMRGraphInstanceReader(),
+    FORMAT_NAME_GRAPH_STRING: AMRGraphStringInstanceReader(),
+    FORMAT_NAME_AMTREE: AMTreeInstanceReader(),
+    FORMAT_NAME_AMTREE_STRING: AMTreeStringInstanceReader(),
+    FORMAT_NAME_STRING_TABLE: StringTableInstanceReader(),
+    FORMAT_NAME_OBJECT_TABLE: ObjectTableInstanceReader(),
+}
+
+
+def get_instance_reader_by_name(reader_name) -> InstanceReader:
+    """
+    :param reader_name: One of the format names in format_names.py.
+    :return: The instance reader for that format (None if there is none).
+    """
+    return _INSTANCE_READERS_BY_NAME.get(reader_name)
+
+
+def convert_label(format_name, label):
+    """
+    Converts a single label, e.g. of a label alternative or a cell of an object table, with the instance reader for
+    format_name. Conversions of hashable labels (e.g. strings) are cached, and the same converted object is returned
+    for all equal labels, so it must not be modified.
+    :return: The visualization type of the label and the converted label.
+    """
+    try:
+        hash(label)
+    except TypeError:
+        return _convert_label(format_name, label)
+    return _convert_label_cached(format_name, label)
+
+
+def clear_label_conversion_cache():
+    """
+    Drops all cached label conversions, e.g. when a corpus is unloaded, so that the cache does not keep its labels
+    in memory. Corpora that are still loaded keep their converted labels.
+    """
+    _convert_label_cached.cache_clear()
+
+
+def _convert_label(format_name, label):
+    instance_reader = get_instance_reader_by_name(format_name)
+    return instance_reader.get_visualization_type(), instance_reader.convert_single_instance(label)
+
+
+# typed, since e.g. the tokens 1 and 1.0 are equal, but not the same label
+@functools.lru_cache(maxsize=LABEL_CONVERSION_CACHE_SIZE, typed=True)
+def _convert_label_cached(format_name, label):
+    return _convert_label(format_name, label)
@@ -1,16 +1,4 @@
-from vulcan.data_handling.format_names import FORMAT_NAME_STRING, FORMAT_NAME_TOKEN, FORMAT_NAME_TOKENIZED_STRING, \
-    FORMAT_NAME_NLTK_TREE, FORMAT_NAME_NLTK_TREE_STRING, FORMAT_NAME_GRAPH, FORMAT_NAME_GRAPH_STRING, \
-    FORMAT_NAME_AMTREE, FORMAT_NAME_AMTREE_STRING, FORMAT_NAME_STRING_TABLE, FORMAT_NAME_OBJECT_TABLE
-
-from vulcan.data_handling.instance_readers.amr_graph_instance_reader import AMRGraphInstanceReader, \
-    AMRGraphStringInstanceReader
-from vulcan.data_handling.instance_readers.amtree_instance_reader import AMTreeInstanceReader, \
-    AMTreeStringInstanceReader
 from vulcan.data_handling.instance_readers.instance_reader import InstanceReader
-from vulcan.data_handling.instance_readers.nltk_instance_reader import NLTKTreeInstanceReader, \
-    NLTKTreeStringInstanceReader
-from vulcan.data_handling.instance_readers.string_instance_reader import StringInstanceReader, TokenInstanceReader, \
-    TokenizedStringInstanceReader
 from vulcan.data_handling.visualization_type import VisualizationType
 
 
@@ -40,37 +28,6 @@ class ObjectTableInstanceReader(InstanceReader):
 
 
 def _convert_object(format_name, obj):
-    instance_reader = get_instance_reader_by_name(format_name)
-    return instance_reader.get_visualization_type(), instance_reader.convert_single_instance(obj)
-
-
-def get_instance_reader_by_name(reader_name):
-    """
-
-    :param reader_name:
-    :return:
-    """
-    # TODO this is a duplicate of the function in  data_corpus to avoid circular imports.
-    #  There should be a better solution!
-    if reader_name == FORMAT_NAME_STRING:
-        return StringInstanceReader()
-    elif reader_name == FORMAT_NAME_TOKEN:
-        return TokenInstanceReader()
-    elif reader_name == FORMAT_NAME_TOKENIZED_STRING:
-        return TokenizedStringInstanceReader()
-    elif reader_name == FORMAT_NAME_NLTK_TREE:
-        return NLTKTreeInstanceReader()
-    elif reader_name == FORMAT_NAME_NLTK_TREE_STRING:
-        return NLTKTreeStringInstanceReader()
-    elif reader_name == FORMAT_NAME_GRAPH:
-        return AMRGraphInstanceReader()
-    elif reader_name == FORMAT_NAME_GRAPH_STRING:
-        return AMRGraphStringInstanceReader()
-    elif reader_name == FORMAT_NAME_AMTREE:
-        return AMTreeInstanceReader()
-    elif reader_name == FORMAT_NAME_AMTREE_STRING:
-        return AMTreeStringInstanceReader()
-    elif reader_name == FORMAT_NAME_STRING_TABLE:
-        return StringTableInstanceReader()
-    elif reader_name == FORMAT_NAME_OBJECT_TABLE:
-        return ObjectTableInstanceReader()
\ No newline at end of file
+    # imported here, since the registry imports this module
+    from vulcan.data_handling.instance_readers.instance_reader_registry import convert_label
+    return convert_label(format_name, obj)
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, Callable
+
+DEFAULT_CONVERSION_CACHE_SIZE = 1000
+
+
+class LazyInstanceList(Sequence):
+    """
+    A read-only list that converts the entries of an underlying list only when they are accessed. Converted entries
+    are kept in a bounded LRU cache, so memory use does not grow with the corpus size.
+
+    If the source is itself a LazyInstanceList, each cache entry remembers the source object it was converted from,
+    and is only used if the source still returns that same object: if the source had to convert an entry again,
+    anything derived from the old conversion (e.g. mouseover texts keyed by node names) is recomputed as well.
+    """
+
+    def __init__(self, source: Sequence, convert: Callable[[Any], Any],
+                 cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE):
+        """
+        :param source: The list of unconverted entries.
+        :param convert: Function that converts a single entry of source.
+        :param cache_size: Maximum number of converted entries to keep in memory.
+        """
+        self.source = source
+        self.convert = convert
+        self.cache_size = cache_size
+        # reading from other sources can be expensive (e.g. from disk), so we only do it when converting
+        self._tracks_source_entries = isinstance(source, LazyInstanceList)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"LazyInstanceList index {index} out of range")
+        source_entry = self.source[index] if self._tracks_source_entries else None
+        with self._lock:
+            cached = self._cache.get(index)
+            if cached is not None and cached[0] is source_entry:
+                self._cache.move_to_end(index)
+                return cached[1]
+        converted = self.convert(source_entry if self._tracks_source_entries else self.source[index])
+        with self._lock:
+            self._cache[index] = (source_entry, converted)
+            self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return converted
+
+    def start_warm_up(self) -> threading.Thread:
+        """
+        Starts converting entries from the beginning of the list in a background thread, until the cache is full.
+        :return: The started (daemon) thread.
+        """
+        thread = threading.Thread(target=self._warm_up, daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self):
+        for i in range(min(self.cache_size, len(self))):
+            self[i]
+            time.sleep(0)  # yield to other (green) threads, e.g. the server
+
+    def __getstate__(self):
+        # the cache and the lock are not needed (or picklable) when e.g. writing the corpus to disk
+        return {"source": self.source, "convert": self.convert, "cache_size": self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["source"], state["convert"], state["cache_size"])
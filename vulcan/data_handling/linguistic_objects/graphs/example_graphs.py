@@ -1,16 +1,16 @@
 import penman
 from graph_as_dict import create_root, add_child, add_reentrancy_as_child
-from penman_converter import StaticAliasCounter
+from penman_converter import from_penman_graph
 
 
 def make_penman_example_as_dict():
     penman_graph = penman.decode("(l / like-01 :ARG0 (g / giraffe) :ARG1 (c / car :mod (f / fast)))")
-    return StaticAliasCounter.from_penman_graph(penman_graph)
+    return from_penman_graph(penman_graph)
 
 
 def make_penman_example_with_reentrancy_as_dict():
     penman_graph = penman.decode("(l / want-01 :ARG0 (g / giraffe) :ARG1 (d / drive-01 :ARG0 g :ARG1 (c / car :mod (f / fast))))")
-    return StaticAliasCounter.from_penman_graph(penman_graph)
+    return from_penman_graph(penman_graph)
 
 
 def make_example_graph_as_dict():
@@ -4,10 +4,16 @@ in that they link to other nodes in the tree. Each node has a node_name that is
 (but not in the tree: reentrancy-nodes share the node name with the "actual" node they link to). All
 non-reentrancy nodes have a node label. Every node in the tree has an incoming edge (traversing an edge
 in inverse direction is encoded with the "-of" notation as in AMR). Each node further has a list of all
-its child nodes. This way, a graph is represented using only dicts, lists and strings, which can all
-be sent as-is to javascript on the client side via socket-IO.
+its child nodes.
+
+On the server, the nodes are GraphNode objects, which take much less memory than dicts. They can still be read like
+the dicts they stand for (node["node_label"]), though code that visits many nodes should use the attributes
+(node.node_label). Before a graph is sent to the client, it is turned into dicts, lists and strings with
+make_sendable, which can all be sent as-is to javascript on the client side via socket-IO.
 """
 
+import sys
+
 
 ROOT_EDGE_LABEL = "ROOT"
 NODE_NAME_KEY = "node_name"
@@ -16,6 +22,73 @@ LABEL_TYPE_KEY = "label_type"
 INCOMING_EDGE_KEY = "incoming_edge"
 IS_REENTRANCY_KEY = "is_reentrancy"
 CHILD_NODES_KEY = "child_nodes"
+ALIGNED_INDEX_KEY = "aligned_index"
+
+# The child nodes of a node without children. Most nodes are leaves, and they share this instead of each having an
+#  empty list (see add_child).
+NO_CHILD_NODES = ()
+
+
+class GraphNode:
+    """
+    A node of a graph-as-dict, see above. The dict for the node (see to_dict) has the keys of the attributes, except
+    for label_type in reentrancy nodes, and aligned_index if it is None (it is only set in AM trees).
+    """
+
+    __slots__ = (NODE_NAME_KEY, NODE_LABEL_KEY, LABEL_TYPE_KEY, INCOMING_EDGE_KEY, IS_REENTRANCY_KEY,
+                 CHILD_NODES_KEY, ALIGNED_INDEX_KEY)
+
+    def __init__(self, node_name, node_label, label_type, incoming_edge, is_reentrancy, child_nodes=NO_CHILD_NODES,
+                 aligned_index=None):
+        self.node_name = node_name
+        self.node_label = node_label
+        self.label_type = label_type
+        self.incoming_edge = incoming_edge
+        self.is_reentrancy = is_reentrancy
+        self.child_nodes = child_nodes
+        self.aligned_index = aligned_index
+
+    def __getitem__(self, key):
+        if not self._has_key(key):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in GraphNode.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return self._has_key(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if self._has_key(key) else default
+
+    def _has_key(self, key):
+        if key == LABEL_TYPE_KEY:
+            return not self.is_reentrancy
+        if key == ALIGNED_INDEX_KEY:
+            return self.aligned_index is not None
+        return key in GraphNode.__slots__
+
+    def to_dict(self):
+        """
+        :return: The graph below this node, as nested dicts (with their keys in the same order as always).
+        """
+        ret = dict()
+        ret[NODE_NAME_KEY] = self.node_name
+        ret[NODE_LABEL_KEY] = make_sendable(self.node_label)
+        if not self.is_reentrancy:
+            ret[LABEL_TYPE_KEY] = self.label_type
+        ret[INCOMING_EDGE_KEY] = self.incoming_edge
+        ret[IS_REENTRANCY_KEY] = self.is_reentrancy
+        ret[CHILD_NODES_KEY] = [child.to_dict() for child in self.child_nodes]
+        if self.aligned_index is not None:
+            ret[ALIGNED_INDEX_KEY] = self.aligned_index
+        return ret
+
+    def __repr__(self):
+        return repr(self.to_dict())
 
 
 def create_root(node_name, node_label, label_type="STRING"):
@@ -23,15 +96,13 @@ def create_root(node_name, node_label, label_type="STRING"):
 
 
 def create_node(node_name, node_label, incoming_edge_label, is_reentrancy=False, label_type="STRING"):
-    ret = dict()
-    ret["node_name"] = node_name
-    ret["node_label"] = node_label
-    if not is_reentrancy:
-        ret["label_type"] = label_type
-    ret["incoming_edge"] = incoming_edge_label
-    ret["is_reentrancy"] = is_reentrancy
-    ret["child_nodes"] = []
-    return ret
+    # names and labels repeat a lot across a corpus (e.g. ARG0, or want-01), so we keep only one copy of each
+    return GraphNode(_intern(node_name), _intern(node_label), None if is_reentrancy else label_type,
+                     _intern(incoming_edge_label), is_reentrancy)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
 
 
 def create_reentrancy(node_name, incoming_edge_label):
@@ -40,24 +111,55 @@ def create_reentrancy(node_name, incoming_edge_label):
 
 def add_child(parent_node_as_dict, child_node_name, child_node_label, edge_label, child_label_type="STRING"):
     child = create_node(child_node_name, child_node_label, edge_label, label_type=child_label_type)
-    parent_node_as_dict["child_nodes"].append(child)
+    _append_child(parent_node_as_dict, child)
     return child
 
 
 def add_reentrancy_as_child(parent_node_as_dict, child_node_name, edge_label):
     child = create_reentrancy(child_node_name, edge_label)
-    parent_node_as_dict["child_nodes"].append(child)
+    _append_child(parent_node_as_dict, child)
     return child
 
 
+def _append_child(parent, child):
+    if parent.child_nodes is NO_CHILD_NODES:
+        parent.child_nodes = [child]
+    else:
+        parent.child_nodes.append(child)
+
+
+def copy_graph(graph_as_dict):
+    """
+    Copies the nodes of the graph, but not their labels (which are usually immutable strings). Much faster than
+    copy.deepcopy.
+    """
+    node = graph_as_dict
+    child_nodes = [copy_graph(child) for child in node.child_nodes] if node.child_nodes else NO_CHILD_NODES
+    return GraphNode(node.node_name, node.node_label, node.label_type, node.incoming_edge, node.is_reentrancy,
+                     child_nodes, node.aligned_index)
+
+
+def make_sendable(obj):
+    """
+    :return: obj with every GraphNode in it (also in lists, tuples and dicts, e.g. in the cells of a table or in label
+        alternatives) replaced by its dict, see GraphNode.to_dict. If obj contains no GraphNode, obj itself.
+    """
+    if isinstance(obj, GraphNode):
+        return obj.to_dict()
+    if isinstance(obj, (list, tuple)):
+        items = [make_sendable(item) for item in obj]
+        return obj if all(item is old_item for item, old_item in zip(items, obj)) else items
+    if isinstance(obj, dict):
+        items = {key: make_sendable(value) for key, value in obj.items()}
+        return obj if all(items[key] is value for key, value in obj.items()) else items
+    return obj
+
+
 def for_each_node_top_down(graph_as_dict, node_consumer):
     node_consumer(graph_as_dict)
-    for child in graph_as_dict["child_nodes"]:
+    for child in graph_as_dict.child_nodes:
         for_each_node_top_down(child, node_consumer)
 
 
 def edge_label_has_inverse_direction(edge_label: str):
     return edge_label.endswith("-of")
-
-
-
@@ -1,60 +1,100 @@
+from collections import defaultdict, deque
+
 import penman
+from penman.graph import CONCEPT_ROLE, Instance, Edge, Attribute
 import vulcan.data_handling.linguistic_objects.graphs.graph_as_dict as graph_as_dict
 
 MADEUP_NODENAME_BASE = "alias"
 
 
-class StaticAliasCounter:
-    alias_count = 0
-
-
 def from_penman_graph(penman_graph):
     """
 
     :param penman_graph:
-    :return: A "graph-as-dict" equivalent to the input.
+    :return: A "graph-as-dict" equivalent to the input. Attribute nodes, which have no names in the penman graph,
+        get names made from their parent and edge label (see create_alias), so the result depends only on
+        penman_graph.
     """
-    top_node = get_root_node(penman_graph)
-    agenda = Agenda(top_node)
+    graph_index = PenmanGraphIndex(penman_graph)
+    top_node = get_root_node(graph_index)
+    agenda = Agenda(top_node, graph_index.variables)
     while not agenda.is_empty():
         node = agenda.pop_next()
-        explore_outgoing_edges(node, penman_graph, agenda)
-        explore_incoming_edges(node, penman_graph, agenda)
-        process_attribute_edges(node, penman_graph, agenda)
+        explore_outgoing_edges(node, graph_index, agenda)
+        explore_incoming_edges(node, graph_index, agenda)
+        process_attribute_edges(node, graph_index, agenda)
 
     return agenda.get_result()
 
 
-def get_root_node(penman_graph):
-    top_node = lookup_penman_node(penman_graph, penman_graph.top)
+class PenmanGraphIndex:
+    """
+    The instances, edges and attributes of a penman graph, indexed by node name. Looking them up in the penman graph
+    itself goes through all its triples every time, which makes converting large graphs quadratic. The lists keep the
+    order of the triples in the penman graph, so the converted graph is the same either way.
+    """
+
+    def __init__(self, penman_graph):
+        self.top = penman_graph.top
+        self.variables = penman_graph.variables()
+        # the first instance for each node name
+        self.instances_by_node_name = {}
+        self.edges_by_source = defaultdict(list)
+        self.edges_by_target = defaultdict(list)
+        self.attributes_by_source = defaultdict(list)
+        for triple in penman_graph.triples:
+            source, role, target = triple
+            if role == CONCEPT_ROLE:
+                self.instances_by_node_name.setdefault(source, Instance(*triple))
+            elif target in self.variables:
+                edge = Edge(*triple)
+                self.edges_by_source[source].append(edge)
+                self.edges_by_target[target].append(edge)
+            else:
+                self.attributes_by_source[source].append(Attribute(*triple))
+
+    def edges(self, source=None, target=None):
+        """
+        Like penman.Graph.edges, for either a source or a target.
+        """
+        if source is not None:
+            return self.edges_by_source.get(source, [])
+        return self.edges_by_target.get(target, [])
+
+    def attributes(self, source):
+        return self.attributes_by_source.get(source, [])
+
+
+def get_root_node(graph_index):
+    top_node = lookup_penman_node(graph_index, graph_index.top)
     return top_node
 
 
-def explore_outgoing_edges(node, penman_graph, agenda):
-    for edge in penman_graph.edges(source=node.source):
+def explore_outgoing_edges(node, graph_index, agenda):
+    for edge in graph_index.edges(source=node.source):
         if not agenda.has_seen_edge(edge):
             agenda.log_edge(edge)
             edge_label_reformatted = reformat_edge_label(edge)
             parent_node_name = edge.source
             child_node_name = edge.target
-            explore_child(child_node_name, parent_node_name, edge_label_reformatted, penman_graph, agenda)
+            explore_child(child_node_name, parent_node_name, edge_label_reformatted, graph_index, agenda)
 
 
-def explore_incoming_edges(node, penman_graph, agenda):
-    for edge in penman_graph.edges(target=node.source):
+def explore_incoming_edges(node, graph_index, agenda):
+    for edge in graph_index.edges(target=node.source):
         if not agenda.has_seen_edge(edge):
             agenda.log_edge(edge)
             edge_label_reformatted = reformat_edge_label(edge) + "-of"
             parent_node_name = edge.target
             child_node_name = edge.source
-            explore_child(child_node_name, parent_node_name, edge_label_reformatted, penman_graph, agenda)
+            explore_child(child_node_name, parent_node_name, edge_label_reformatted, graph_index, agenda)
 
 
-def explore_child(child_node_name, parent_node_name, edge_label_reformatted, penman_graph, agenda):
+def explore_child(child_node_name, parent_node_name, edge_label_reformatted, graph_index, agenda):
     if agenda.has_seen_node(child_node_name):
         create_reentrancy_node(parent_node_name, child_node_name, edge_label_reformatted, agenda)
     else:
-        create_node_and_add_to_agenda(parent_node_name, child_node_name, edge_label_reformatted, penman_graph, agenda)
+        create_node_and_add_to_agenda(parent_node_name, child_node_name, edge_label_reformatted, graph_index, agenda)
 
 
 def create_reentrancy_node(parent_node_name, child_node_name, edge_label_reformatted, agenda):
@@ -62,8 +102,8 @@ def create_reentrancy_node(parent_node_name, child_node_name, edge_label_reforma
                                           child_node_name, edge_label_reformatted)
 
 
-def create_node_and_add_to_agenda(parent_node_name, child_node_name, edge_label_reformatted, penman_graph, agenda):
-    child_instance_penman = lookup_penman_node(penman_graph, child_node_name)
+def create_node_and_add_to_agenda(parent_node_name, child_node_name, edge_label_reformatted, graph_index, agenda):
+    child_instance_penman = lookup_penman_node(graph_index, child_node_name)
     parent_as_dict = agenda.get_graph_as_dict_for_node_name(parent_node_name)
     child_as_dict = create_child_and_add_to_graph(child_instance_penman.target, parent_as_dict, child_node_name,
                                                   edge_label_reformatted)
@@ -76,49 +116,62 @@ def create_child_and_add_to_graph(node_label, parent_as_dict, child_node_name, e
     return child_as_dict
 
 
-def process_attribute_edges(node, penman_graph, agenda):
-    for edge in penman_graph.attributes(source=node.source):
+def process_attribute_edges(node, graph_index, agenda):
+    for edge in graph_index.attributes(source=node.source):
         if not agenda.has_seen_edge(edge):
             agenda.log_edge(edge)
             edge_label_reformatted = reformat_edge_label(edge)
-            child_nodename = create_alias()
+            child_nodename = create_alias(edge.source, edge_label_reformatted, agenda)
             parent_as_dict = agenda.get_graph_as_dict_for_node_name(edge.source)
             graph_as_dict.add_child(parent_as_dict, child_nodename, edge.target, edge_label_reformatted)
             # don't need to worry about encountering the node name again here, or about exploring below the attribute
 
 
-def create_alias():
-    StaticAliasCounter.alias_count += 1
-    return MADEUP_NODENAME_BASE + str(StaticAliasCounter.alias_count)
+def create_alias(parent_node_name, edge_label_reformatted, agenda):
+    """
+    :return: A name for an attribute node, e.g. alias_f_quant for the quant attribute of node f. If a node of the graph
+        already has that name (e.g. for a second quant attribute of f), a number is added: alias_f_quant_2.
+    """
+    base_name = f"{MADEUP_NODENAME_BASE}_{parent_node_name}_{edge_label_reformatted}"
+    alias = base_name
+    suffix = 2
+    while alias in agenda.taken_node_names:
+        alias = f"{base_name}_{suffix}"
+        suffix += 1
+    agenda.taken_node_names.add(alias)
+    return alias
 
 
 def reformat_edge_label(edge):
     return edge.role[1:]
 
 
-def lookup_penman_node(penman_graph, node_name):
-    return [n for n in penman_graph.instances() if n.source == node_name][0]
+def lookup_penman_node(graph_index, node_name):
+    return graph_index.instances_by_node_name[node_name]
 
 
 class Agenda:
 
-    def __init__(self, top_node):
+    def __init__(self, top_node, variables):
         """
         Initializes the agenda with the root of the penman graph.
         :param top_node:
+        :param variables: The node names of the penman graph, which attribute nodes must not use.
         """
         self.top_node_name = top_node.source
         self.node_name2graph_as_dict = dict()
         self.node_name2graph_as_dict[self.top_node_name] = graph_as_dict.create_root(self.top_node_name, top_node.target)
-        self.nodes_to_explore = [top_node]
-        self.seen_node_names = []
-        self.seen_edges = []
+        self.nodes_to_explore = deque([top_node])
+        self.seen_node_names = set()
+        self.seen_edges = set()
+        # the node names of the graph, and the ones made up for attribute nodes so far
+        self.taken_node_names = set(variables)
 
     def is_empty(self):
         return len(self.nodes_to_explore) <= 0
 
     def pop_next(self):
-        return self.nodes_to_explore.pop(0)
+        return self.nodes_to_explore.popleft()
 
     def get_result(self):
         return self.node_name2graph_as_dict[self.top_node_name]
@@ -130,7 +183,7 @@ class Agenda:
         return node_name in self.seen_node_names
 
     def log_node(self, node_as_dict, node_instance_penman, node_name):
-        self.seen_node_names.append(node_name)
+        self.seen_node_names.add(node_name)
         self.node_name2graph_as_dict[node_name] = node_as_dict
         self.nodes_to_explore.append(node_instance_penman)
 
@@ -138,7 +191,7 @@ class Agenda:
         return edge in self.seen_edges
 
     def log_edge(self, edge):
-        self.seen_edges.append(edge)
+        self.seen_edges.add(edge)
 
 
 if __name__ == "__main__":
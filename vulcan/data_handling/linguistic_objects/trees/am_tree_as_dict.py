@@ -1,67 +1,89 @@
+import functools
 import io
 import re
 import random
 
 from amconll import AMSentence, parse_amconll, Entry
 
-from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import add_child, create_root, ROOT_EDGE_LABEL
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import add_child, create_root, copy_graph, \
+    ROOT_EDGE_LABEL
 from vulcan.data_handling.linguistic_objects.graphs.penman_converter import from_penman_graph
 from penman import decode
 
-ADDRESS_SEPARATOR = "."
 SOURCE_PATTERN = re.compile(r"(?P<source><[a-zA-Z0-9]+>)")
 
+# Maximum number of converted supertag fragments that are kept for reuse (see convert_node_label). Fragments repeat a
+#  lot across a corpus, so a few thousand cover most tokens.
+FRAGMENT_MEMO_SIZE = 4096
+
 
 def from_amtree(amtree: AMSentence):
+    return from_amtree_with_alignments(amtree)[0]
+
+
+def from_amtree_with_alignments(amtree: AMSentence):
+    """
+    Converts an AM tree, and computes its alignments (as alignments_from_amtree) on the way.
+    :return: The AM tree as a graph-as-dict, with graphs as node labels, and the alignments.
+    """
+    root_id, root_entry, children_by_head = _index_amtree(amtree)
+    alignments = {}
+    return _from_amtree_entry(root_entry, root_id, children_by_head, None, alignments), alignments
+
+
+def _index_amtree(amtree: AMSentence):
+    """
+    :return: The ID and entry of the root, and for each head ID the (ID, entry) of its children, in sentence order.
+        IDs in AMSentence are 1-based.
+    """
     root_entry = None
     root_id = None
+    children_by_head = {}
     for i, entry in enumerate(amtree.words):
-        if entry.label == ROOT_EDGE_LABEL:
+        if root_entry is None and entry.label == ROOT_EDGE_LABEL:
             root_entry = entry
-            root_id = i + 1  # IDs in AMSentence are 1-based
-            break
+            root_id = i + 1
+        children_by_head.setdefault(entry.head, []).append((i + 1, entry))
     if root_entry is None:
         print(amtree)
         raise Exception("No root entry found in AMSentence")
-    address = ""
-    all_addresses = []
-    return _from_amtree_entry(root_entry, root_id, amtree, address, None, all_addresses)
+    return root_id, root_entry, children_by_head
 
 
-def _from_amtree_entry(entry, entry_id, amtree, address, parent_in_result, all_addresses):
+def _from_amtree_entry(entry, entry_id, children_by_head, parent_in_result, alignments):
     """
-    recursively builds the amtree below the given entry bottom up.
-    Building the addresses is no longer necessary, but keeping it for now in case it becomes useful later.
-    :param entry:
-    :param entry_id:
-    :param amtree:
-    :param address:
-    :param parent_in_result:
-    :param all_addresses:
-    :return:
+    recursively builds the amtree below the given entry top down, and adds the alignments of its nodes to alignments.
     """
-    all_addresses.append(address)
-    node_label = get_graph_string_from_node_label(entry.fragment, entry)
-    try:
-        node_label = from_penman_graph(decode(node_label))
-    except Exception as e:
-        print("Error while decoding node label: " + node_label)
-        node_label = from_penman_graph(decode("(e / ERROR)"))
+    node_label = convert_node_label(get_graph_string_from_node_label(entry.fragment, entry))
     if parent_in_result is None:
         result = create_root(str(entry_id), node_label, label_type="GRAPH")
     else:
         result = add_child(parent_in_result, str(entry_id), node_label, entry.label, child_label_type="GRAPH")
-    result["aligned_index"] = entry_id - 1  # IDs in AMSentence are 1-based
-    children_in_amtree = []
-    for i, potential_child in enumerate(amtree):
-        if potential_child.head == entry_id:
-            children_in_amtree.append((i + 1, potential_child))
-    for i, (child_id, child) in enumerate(children_in_amtree):
-        child_address = address + ADDRESS_SEPARATOR + str(i)
-        _from_amtree_entry(child, child_id, amtree, child_address, result, all_addresses)
+    result.aligned_index = entry_id - 1  # IDs in AMSentence are 1-based
+    alignments[result.node_name] = {result.aligned_index: 1}
+    for child_id, child in children_by_head.get(entry_id, []):
+        _from_amtree_entry(child, child_id, children_by_head, result, alignments)
     return result
 
 
+def convert_node_label(graph_string):
+    """
+    :return: The graph-as-dict for the graph string of an AM tree node (see get_graph_string_from_node_label). A
+        copy of the one made the last time the same graph string came up, if it is still in the memo.
+    """
+    return copy_graph(_convert_node_label_for_memo(graph_string))
+
+
+@functools.lru_cache(maxsize=FRAGMENT_MEMO_SIZE)
+def _convert_node_label_for_memo(graph_string):
+    # the result must not be modified, since it is shared by all calls with the same graph string
+    try:
+        return from_penman_graph(decode(graph_string))
+    except Exception as e:
+        print("Error while decoding node label: " + graph_string)
+        return from_penman_graph(decode("(e / ERROR)"))
+
+
 def from_string(string):
     return from_amtree(next(iter(parse_amconll(io.StringIO(string+"\n\n")))))
 
@@ -76,21 +98,21 @@ def get_graph_string_from_node_label(fragment, amconll_entry: Entry):
 def alignments_from_amtree(amtree: AMSentence):
     """
     dict maps address in am tree to index in sentence to score. Score is 1 for aligned node/token pairs, and not
-    given (therefore assumed 0) for all others. This can be simplified now that am trees use
-      indices from sentence as node names. But the current implementation is simple enough to keep it like this.
+    given (therefore assumed 0) for all others. Since am trees use indices from the sentence as node names, this does
+    not need to convert the tree (use from_amtree_with_alignments to get both).
     :param amtree:
     :return:
     """
-    amtree_as_dict = from_amtree(amtree)
+    root_id, root_entry, children_by_head = _index_amtree(amtree)
     ret = {}
-    _set_alignments_recursively(amtree_as_dict, ret)
+    _set_alignments_recursively(root_id, children_by_head, ret)
     return ret
 
 
-def _set_alignments_recursively(amtree_as_dict, alignment_dict):
-    alignment_dict[amtree_as_dict["node_name"]] = {amtree_as_dict["aligned_index"]: 1}  # random.uniform(0.0, 1.0)}
-    for child in amtree_as_dict["child_nodes"]:
-        _set_alignments_recursively(child, alignment_dict)
+def _set_alignments_recursively(entry_id, children_by_head, alignment_dict):
+    alignment_dict[str(entry_id)] = {entry_id - 1: 1}  # random.uniform(0.0, 1.0)}
+    for child_id, child in children_by_head.get(entry_id, []):
+        _set_alignments_recursively(child_id, children_by_head, alignment_dict)
 
 
 def generate_random_label_alternatives(amtree: AMSentence):
@@ -0,0 +1,91 @@
+import math
+import sys
+from array import array
+from typing import Any, Dict, List, Optional
+
+from vulcan.data_handling.linguistic_objects.table import cell_coordinates_to_cell_name
+
+# Linkers with fewer scores than this are sent as plain JSON, where the encoding would not save much.
+DENSE_LINKER_MIN_SIZE = 256
+
+
+def make_wire_linker_scores(scores: Dict[Any, Dict[Any, Any]], name1_is_string: bool,
+                            name2_is_string: bool) -> Dict[str, Any]:
+    """
+    Converts the scores of a linker for one instance into the form in which they are sent to the client.
+    :param name1_is_string: Whether the first slice of the linker is a string slice. The client shows strings as
+        tables with a single row, so token indices are mapped to the names of the cells in that row.
+    :param name2_is_string: Same for the second slice.
+    :return: {"dense_scores": ...} (see encode_linker_scores_densely) if the scores can be encoded densely, and
+        {"scores": ...} with the (possibly remapped) nested dicts otherwise.
+    """
+    if name1_is_string:
+        scores = {cell_coordinates_to_cell_name(0, k): v for k, v in scores.items()}
+    if name2_is_string:
+        scores = {k: {cell_coordinates_to_cell_name(0, k2): v for k2, v in d.items()} for k, d in scores.items()}
+    dense_scores = encode_linker_scores_densely(scores)
+    if dense_scores is not None:
+        return {"dense_scores": dense_scores}
+    return {"scores": scores}
+
+
+def encode_linker_scores_densely(scores: Dict[Any, Dict[Any, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Encodes the scores of a linker for one instance as a dense float32 array, which is much smaller than the nested
+    dicts of Python floats in JSON (e.g. for attention scores with many layers and heads). The array is sent to the
+    client as binary data.
+
+    :param scores: Maps node names of the first slice to dicts that map node names of the second slice to scores.
+        Each score is a number, a list of numbers (e.g. one per layer) or a table of numbers (e.g. per layer and head),
+        and all scores must have the same shape.
+    :return: A dict with the node names of the first and second slice ("keys1", "keys2"), the array shape ("shape":
+        [len(keys1), len(keys2)] followed by the shape of a single score) and the little-endian float32 array in row
+        major order ("data", as bytes). Pairs of nodes without a score are NaN. Returns None if the scores do not have
+        a uniform numeric shape, or if there are too few of them to be worth it.
+    """
+    keys1 = list(scores.keys())
+    keys2 = []
+    key2_positions = {}
+    for inner_scores in scores.values():
+        for key2 in inner_scores:
+            if key2 not in key2_positions:
+                key2_positions[key2] = len(keys2)
+                keys2.append(key2)
+    if len(keys2) == 0:
+        return None
+    score_shape = _get_shape(next(iter(next(inner for inner in scores.values() if len(inner) > 0).values())))
+    if score_shape is None:
+        return None
+    score_size = math.prod(score_shape)
+    if len(keys1) * len(keys2) * score_size < DENSE_LINKER_MIN_SIZE:
+        return None
+
+    data = array("f", [math.nan]) * (len(keys1) * len(keys2) * score_size)
+    for i, inner_scores in enumerate(scores.values()):
+        for key2, score in inner_scores.items():
+            if _get_shape(score) != score_shape:
+                return None
+            offset = (i * len(keys2) + key2_positions[key2]) * score_size
+            data[offset:offset + score_size] = array("f", _flatten(score))
+    if sys.byteorder == "big":
+        data.byteswap()
+    return {"keys1": keys1, "keys2": keys2, "shape": [len(keys1), len(keys2)] + score_shape, "data": data.tobytes()}
+
+
+def _get_shape(score: Any) -> Optional[List[int]]:
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        return []
+    if isinstance(score, list) and len(score) > 0:
+        inner_shape = _get_shape(score[0])
+        if inner_shape is None or len(inner_shape) > 1:
+            return None  # the client only supports numbers, lists and tables
+        if any(_get_shape(entry) != inner_shape for entry in score[1:]):
+            return None
+        return [len(score)] + inner_shape
+    return None
+
+
+def _flatten(score: Any) -> List[float]:
+    if isinstance(score, list):
+        return [value for entry in score for value in _flatten(entry)]
+    return [score]
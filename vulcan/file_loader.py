@@ -1,24 +1,83 @@
+import hashlib
 import json
+import os
 import pickle
+import time
 
-from vulcan.data_handling.data_corpus import from_dict_list
+from vulcan.corpus_cache import get_cache_path, compute_cache_key, load_cached_corpus, write_cached_corpus
+from vulcan.data_handling.data_corpus import from_dict_list, start_warm_up
+from vulcan.data_handling.indexed_corpus_store import IndexedCorpusStore, is_indexed_corpus_file
+from vulcan.data_handling.lazy_instance_list import DEFAULT_CONVERSION_CACHE_SIZE
+import vulcan
 from vulcan.server.basic_layout import BasicLayout
+from vulcan.server.metrics import CORPUS_LOAD_DURATION
+from vulcan.startup_profile import profile_phase
 
 
 def create_layout_from_filepath(input_path: str, is_json_file: bool = False, propbank_path: str = None,
-                                show_wikipedia_articles: bool = False):
-    input_dicts = load_input_file(input_path, is_json_file)
+                                show_wikipedia_articles: bool = False, lazy_conversion: bool = False,
+                                conversion_cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE, warm_up: bool = False,
+                                workers: int = 1, use_cache: bool = False, input_dicts=None):
+    """
+    :param use_cache: If true, the converted corpus is stored in a cache file next to the input file (see
+        vulcan.corpus_cache), and later calls for the same input file and options load it from there instead.
+    :param input_dicts: The content of the input file (see load_input_file), if the caller already read it. Then the
+        file is not read again.
+    """
+    start_time = time.perf_counter()
+    if is_indexed_corpus_file(input_path):
+        # the whole point of this format is to not have the corpus in memory, so we always convert lazily
+        lazy_conversion = True
+    data_corpus = None
+    if use_cache:
+        cache_path = get_cache_path(input_path)
+        cache_key = compute_cache_key(input_path, propbank_path, show_wikipedia_articles, lazy_conversion,
+                                      conversion_cache_size)
+        with profile_phase("load corpus cache"):
+            data_corpus = load_cached_corpus(cache_path, cache_key)
+        if data_corpus is not None and lazy_conversion and warm_up:
+            start_warm_up(data_corpus)
 
-    data_corpus = from_dict_list(input_dicts, propbank_frames_path=propbank_path,
-                                 show_wikipedia=show_wikipedia_articles)
+    source = "cache"
+    if data_corpus is None:
+        source = "input_file"
+        if input_dicts is None:
+            with profile_phase("read input file"):
+                input_dicts = load_input_file(input_path, is_json_file)
 
-    layout = BasicLayout(data_corpus.slices.values(), data_corpus.linkers, data_corpus.size)
+        data_corpus = from_dict_list(input_dicts, propbank_frames_path=propbank_path,
+                                     show_wikipedia=show_wikipedia_articles, lazy_conversion=lazy_conversion,
+                                     conversion_cache_size=conversion_cache_size, warm_up=warm_up,
+                                     workers=workers)
+        if use_cache:
+            with profile_phase("write corpus cache"):
+                write_cached_corpus(cache_path, cache_key, data_corpus)
+
+    with profile_phase("build layout"):
+        layout = BasicLayout(data_corpus.slices.values(), data_corpus.linkers, data_corpus.size,
+                             get_corpus_version(input_path, propbank_path, show_wikipedia_articles))
+    CORPUS_LOAD_DURATION.observe(time.perf_counter() - start_time, source)
 
     return layout
 
 
+def get_corpus_version(input_path: str, propbank_path: str = None, show_wikipedia_articles: bool = False) -> str:
+    """
+    :return: A version string for the corpus loaded from input_path (see BasicLayout.corpus_version), based on the
+        modification time and size of the file and the options that change the converted corpus. Unlike a hash of the
+        file content, this is cheap to compute for large files.
+    """
+    stat = os.stat(input_path)
+    version_data = repr((os.path.abspath(input_path), stat.st_mtime_ns, stat.st_size,
+                         os.path.abspath(propbank_path) if propbank_path else None, show_wikipedia_articles,
+                         vulcan.__version__))
+    return hashlib.sha256(version_data.encode("utf-8")).hexdigest()[:16]
+
+
 def load_input_file(input_path, is_json_file):
-    if is_json_file:
+    if is_indexed_corpus_file(input_path):
+        input_dicts = IndexedCorpusStore(input_path).get_entry_dicts()
+    elif is_json_file:
         with open(input_path, "r") as f:
             input_dicts = json.load(f)
     else:
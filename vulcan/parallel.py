@@ -0,0 +1,81 @@
+"""
+Running work in forked child processes, e.g. converting (see InstanceReader.convert_instances) or searching (see
+vulcan.search.search) parts of a corpus in parallel.
+"""
+
+import os
+import pickle
+import traceback
+from typing import Any, Callable, List, Sequence
+
+
+def can_fork() -> bool:
+    return hasattr(os, "fork")
+
+
+def map_in_forked_processes(function: Callable[[Any], Any], inputs: Sequence[Any]) -> List[Any]:
+    """
+    Calls function on each input, each in its own forked child process, and returns the results in the order of the
+    inputs. The children share the memory of the parent at the time of forking (e.g. the corpus to search), so only
+    the results are pickled and sent back through a pipe. This works the same inside the eventlet server (and in any
+    process that imported it, since that monkey-patches the standard library), where multiprocessing pools deadlock;
+    while waiting for the results, other green threads can run.
+    :param function: Function to call in the children. Its results must be picklable. Unlike with multiprocessing,
+        the function itself does not need to be picklable.
+    """
+    children = []
+    try:
+        for inp in inputs:
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                _run_in_child(function, inp, write_fd)  # never returns
+            os.close(write_fd)
+            children.append([pid, read_fd])
+        results = []
+        for child in children:
+            read_fd, child[1] = child[1], None  # _read_all closes it
+            data = _read_all(read_fd)
+            status, value = pickle.loads(data)
+            if status == "error":
+                raise RuntimeError(f"Error in worker process:\n{value}")
+            results.append(value)
+        return results
+    finally:
+        for pid, read_fd in children:
+            if read_fd is not None:
+                os.close(read_fd)
+            os.waitpid(pid, 0)
+
+
+def _run_in_child(function: Callable[[Any], Any], inp: Any, write_fd: int):
+    exit_code = 0
+    try:
+        try:
+            result = ("ok", function(inp))
+        except BaseException:
+            result = ("error", traceback.format_exc())
+            exit_code = 1
+        # the built-in open is not affected by eventlet's monkey patching, so this never yields to the (inherited)
+        #  server loop
+        with open(write_fd, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        exit_code = 1
+    finally:
+        # skip all cleanup of the parent's state that we inherited (atexit handlers, buffered output, ...)
+        os._exit(exit_code)
+
+
+def _read_all(read_fd: int) -> bytes:
+    chunks = []
+    try:
+        while True:
+            chunk = os.read(read_fd, 1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+    return b"".join(chunks)
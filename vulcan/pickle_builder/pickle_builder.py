@@ -4,6 +4,7 @@ from typing import Dict, Any, Tuple, List, Union
 
 from vulcan.data_handling.format_names import FORMAT_NAME_STRING, FORMAT_NAME_TOKENIZED_STRING, FORMAT_NAME_TOKEN, \
     FORMAT_NAME_OBJECT_TABLE, FORMAT_NAME_STRING_TABLE
+from vulcan.data_handling.indexed_corpus_store import IndexedCorpusWriter, PER_INSTANCE_KEYS
 
 
 class PickleBuilder:
@@ -69,7 +70,7 @@ class PickleBuilder:
         :return: None
         """
         if run_checks:
-            names_match_data_structure = set(name_to_instance.keys()) == set(self.data.keys())
+            names_match_data_structure = set(name_to_instance.keys()) == set(self._get_data_names())
             assert names_match_data_structure
             assert self._instance_counts_are_in_sync()
         for name, instance in name_to_instance.items():
@@ -99,8 +100,11 @@ class PickleBuilder:
             assert not addition_will_break_sync
         self._add_instance_to_data(name, instance)
 
+    def _get_data_names(self):
+        return [name for name, d in self.data.items() if d['type'] == 'data']
+
     def _get_all_instance_counts(self):
-        return [len(d['instances']) for d in self.data.values()]
+        return [len(self.data[name]['instances']) for name in self._get_data_names()]
 
     def _instance_counts_are_in_sync(self):
         return len(set(self._get_all_instance_counts())) == 1
@@ -167,12 +171,13 @@ class PickleBuilder:
         if 'label_alternatives' not in self.data[structure_name]:
             self.data[structure_name]['label_alternatives'] = []
         while len(self.data[structure_name]['label_alternatives']) < len(self.data[structure_name]['instances']):
-            self.data[structure_name]['label_alternatives'].append([])
-        self.data[structure_name]['label_alternatives'][-1].append([{"label": lbl,
-                                                                     "format": f,
-                                                                     "score": s} for lbl, f, s in zip(alternative_labels,
-                                                                                                      label_formats,
-                                                                                                      label_scores)])
+            self.data[structure_name]['label_alternatives'].append({})
+        self.data[structure_name]['label_alternatives'][-1][element_name] = [{"label": lbl,
+                                                                              "format": f,
+                                                                              "score": s}
+                                                                             for lbl, f, s in zip(alternative_labels,
+                                                                                                  label_formats,
+                                                                                                  label_scores)]
 
     def add_linker_score(self, linker_name: str, element_name_1: str, element_name_2: str,
                          score: Union[float, List[float], List[List[float]]],
@@ -227,6 +232,99 @@ class PickleBuilder:
         with open(json_path, 'w') as f:
             json.dump(data_for_pickle, f)
 
+    def write_indexed(self, indexed_path: str):
+        """
+        Writes the data in Vulcan's indexed format (see vulcan.data_handling.indexed_corpus_store). The server reads
+        files in this format instance by instance on demand, so it can visualize corpora that do not fit into memory.
+        :param indexed_path: Path to the file that will be created.
+        """
+        data_for_pickle = self._make_data_for_pickle()
+        entry_headers = [{key: value for key, value in entry.items() if key not in PER_INSTANCE_KEYS}
+                         for entry in data_for_pickle]
+        instance_count = max(len(entry.get('instances', entry.get('scores', []))) for entry in data_for_pickle)
+        with IndexedCorpusWriter(indexed_path, entry_headers) as writer:
+            for i in range(instance_count):
+                writer.write_record({entry['name']: {key: entry[key][i] for key in PER_INSTANCE_KEYS
+                                                     if key in entry and i < len(entry[key])}
+                                     for entry in data_for_pickle})
+
+
+class StreamingPickleBuilder(PickleBuilder):
+    """
+    A PickleBuilder that writes the corpus to disk while it is being built, instead of keeping all of it in memory
+    until the end. Use this for corpora too large to be built in memory, e.g. model predictions with attention
+    scores for large datasets.
+
+    The output is written in Vulcan's indexed format (see PickleBuilder.write_indexed). Instances are added exactly as
+    with the PickleBuilder, and the same synchronization checks apply. An instance is written to disk as soon as all
+    structures have moved on to the next instance (since dependency trees, label alternatives and linker scores are
+    always added to the last added instance, the earlier ones can no longer change), so at most two instances are
+    kept in memory. Call close() when done, or use the builder in a with-statement.
+    """
+
+    def __init__(self, indexed_path: str, name_to_format: Dict[str, str],
+                 linkers: List[Tuple[str, str, str]] = None):
+        """
+        :param indexed_path: Path to the file that will be created.
+        :param name_to_format: See PickleBuilder.
+        :param linkers: See PickleBuilder.
+        """
+        super().__init__(name_to_format, linkers)
+        self.indexed_path = indexed_path
+        self.written_instance_count = 0
+        entry_headers = [{key: value for key, value in dict(data, name=name).items() if key not in PER_INSTANCE_KEYS}
+                         for name, data in self.data.items()]
+        self._writer = IndexedCorpusWriter(indexed_path, entry_headers)
+
+    def _add_instance_to_data(self, name: str, instance: Any):
+        super()._add_instance_to_data(name, instance)
+        self._write_finished_instances()
+
+    def _write_finished_instances(self, write_all: bool = False):
+        # The lists in self.data only contain the instances that were not written yet. They all start at the same
+        #  instance, so popping the first element of each list keeps them aligned.
+        min_instances_to_keep = 0 if write_all else 1
+        while min(self._get_all_instance_counts()) > min_instances_to_keep:
+            record = {}
+            for name, data in self.data.items():
+                record[name] = {key: data[key].pop(0) for key in PER_INSTANCE_KEYS
+                                if key in data and len(data[key]) > 0}
+            self._writer.write_record(record)
+            self.written_instance_count += 1
+
+    def close(self, run_checks: bool = True):
+        """
+        Writes the remaining instances and finishes the file.
+        :param run_checks: If true, checks that all structures have the same number of instances.
+        """
+        if run_checks:
+            assert self._instance_counts_are_in_sync()
+        self._write_finished_instances(write_all=True)
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(run_checks=exc_type is None)
+
+    # The data is written to indexed_path while it is being built, so the write methods of the PickleBuilder, which
+    #  write all data at once, cannot be used.
+
+    def write(self, pickle_path: str):
+        _raise_write_not_supported()
+
+    def write_as_json(self, json_path: str):
+        _raise_write_not_supported()
+
+    def write_indexed(self, indexed_path: str):
+        _raise_write_not_supported()
+
+
+def _raise_write_not_supported():
+    raise TypeError("A StreamingPickleBuilder writes its data while it is being built, to the file given to its"
+                    " constructor; call close() when done instead of the write methods.")
+
 
 def main():
     """
@@ -1,8 +1,8 @@
-from typing import List, Dict, Tuple
+from typing import List, Tuple
 
-from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import edge_label_has_inverse_direction, \
-    CHILD_NODES_KEY, INCOMING_EDGE_KEY
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import edge_label_has_inverse_direction, GraphNode
 from vulcan.search.graph_nodes.outer_graph_node_layer import InnerGraphNodeLayer
+from vulcan.search.inner_search_layer import prepare_int_argument
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
 
@@ -11,16 +11,19 @@ class HasAtLeastXOutgoingEdges(InnerGraphNodeLayer):
     This checks if the cell content equals the given string (modulo casing and outer whitespace).
     """
 
-    def apply(self, obj: Tuple[Dict, Dict], user_arguments: List[str]):
+    def prepare_arguments(self, user_arguments: List[str]) -> int:
+        return prepare_int_argument(user_arguments)
+
+    def apply(self, obj: Tuple[GraphNode, GraphNode], user_arguments: int):
         if obj is None:
             return False
         node = obj[0]
-        num_edges_required = int(user_arguments[0].strip())
+        num_edges_required = user_arguments
         num_outgoing_edges_found = 0
-        if edge_label_has_inverse_direction(node[INCOMING_EDGE_KEY]):
+        if edge_label_has_inverse_direction(node.incoming_edge):
             num_outgoing_edges_found += 1
-        for child in node[CHILD_NODES_KEY]:
-            if not edge_label_has_inverse_direction(child[INCOMING_EDGE_KEY]):
+        for child in node.child_nodes:
+            if not edge_label_has_inverse_direction(child.incoming_edge):
                 num_outgoing_edges_found += 1
         return num_outgoing_edges_found >= num_edges_required
 
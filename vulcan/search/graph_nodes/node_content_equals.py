@@ -1,6 +1,8 @@
-from typing import List, Dict, Tuple
+from typing import List, Tuple
 
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import GraphNode
 from vulcan.search.graph_nodes.outer_graph_node_layer import InnerGraphNodeLayer
+from vulcan.search.inner_search_layer import prepare_string_argument
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
 
@@ -9,19 +11,30 @@ class NodeContentEquals(InnerGraphNodeLayer):
     This checks if the cell content equals the given string (modulo casing and outer whitespace).
     """
 
-    def apply(self, obj: Tuple[Dict, Dict], user_arguments: List[str]):
+    def prepare_arguments(self, user_arguments: List[str]) -> str:
+        return prepare_string_argument(user_arguments)
+
+    def apply(self, obj: Tuple[GraphNode, GraphNode], user_arguments: str):
         if obj is None:
             return False
         if obj[0] is None:
             print("Warning: null node in search")
             print(obj)
-        if obj[0]["node_label"] is None:
+        if obj[0].node_label is None:
             # then we have an unlabeled node, or a reentrancy. either way, we don't want to match it
             return False
-        if user_arguments[0] is None:
-            print("Warning: user argument")
-            print(user_arguments)
-        return obj[0]["node_label"].strip().lower() == user_arguments[0].strip().lower()
+        return obj[0].node_label.strip().lower() == user_arguments
+
+    def get_index_term(self, obj: Tuple[GraphNode, GraphNode]):
+        node_label = obj[0].node_label
+        if not isinstance(node_label, str):
+            # unlabeled nodes and reentrancies never match (and neither do non-string labels, such as the graph
+            #  labels in AM trees)
+            return None
+        return node_label.strip().lower()
+
+    def get_query_term(self, user_arguments: str):
+        return user_arguments
 
     def get_description(self) -> str:
         return "This checks if a node is labeled with the given string (modulo casing and outer whitespace)."
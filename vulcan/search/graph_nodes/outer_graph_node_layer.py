@@ -1,9 +1,9 @@
 from abc import ABC
-from typing import List, Any, Dict, Tuple
+from typing import List, Any, Tuple
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
-from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import for_each_node_top_down
+from vulcan.search.outer_search_layer import OuterSearchLayer, apply_to_elements
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import for_each_node_top_down, GraphNode
 
 
 class OuterGraphNodeLayer(OuterSearchLayer):
@@ -16,25 +16,19 @@ class OuterGraphNodeLayer(OuterSearchLayer):
     def get_id(self) -> str:
         return "OuterGraphNodeLayer"
 
-    def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: Dict):
-        matching_node_names = []
-        for_each_node_top_down(obj, lambda node: self._apply_to_node(node, obj, inner_search_layers,
-                                                                     user_arguments, matching_node_names))
-        if len(matching_node_names) > 0:
-            return matching_node_names
-        else:
-            return None
+    def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: GraphNode):
+        return apply_to_elements(self.get_elements(obj), inner_search_layers, user_arguments)
 
-    def _apply_to_node(self, node, graph, inner_search_layers, user_arguments, matching_node_names: List[str]):
-        if all(inner_search_layer.apply((node, graph), user_args)
-               for inner_search_layer, user_args in zip(inner_search_layers, user_arguments)):
-            matching_node_names.append(node["node_name"])
+    def get_elements(self, obj: GraphNode):
+        elements = []
+        for_each_node_top_down(obj, lambda node: elements.append(((node, obj), node.node_name)))
+        return elements
 
 
 class InnerGraphNodeLayer(InnerSearchLayer, ABC):
 
-    def apply(self, obj: Tuple[Dict, Dict], user_arguments: List[str]):
+    def apply(self, obj: Tuple[GraphNode, GraphNode], user_arguments: List[str]):
         """
-        obj is a pair of (node, graph), both of the "graph_as_dict" dictionary format.
+        obj is a pair of (node, graph), both GraphNodes (see graph_as_dict).
         """
         raise NotImplementedError()
@@ -1,4 +1,13 @@
-from typing import List, Any
+import re
+from typing import List, Any, Optional, Pattern
+
+
+class SearchArgumentError(ValueError):
+    """
+    Raised when the arguments that the user put into the search bar are not valid for a search layer, e.g. a regular
+    expression that does not compile. The message is shown to the user.
+    """
+    pass
 
 
 class InnerSearchLayer:
@@ -22,13 +31,79 @@ class InnerSearchLayer:
         """
         raise NotImplementedError()
 
-    def apply(self, obj: Any, user_arguments: List[str], **kwargs):
+    def prepare_arguments(self, user_arguments: List[str]) -> Any:
         """
-        :param obj: the object to check. This can be a macro-object like a graph, or a micro-object like a node,
-        depending on the outer search layer.
+        Called once per search, before apply is called on any object. Parses and validates the user arguments, such
+        that apply does not need to do this again for every object (e.g. compiling a regular expression).
+        Per default, the user arguments are used as they are.
         :param user_arguments: The arguments that the user put into the search bar. These arguments correspond
         to the gaps in the label returned by get_label().
+        :return: The prepared arguments, which are passed to apply and get_query_term.
+        :raises SearchArgumentError: if the user arguments are not valid for this search layer.
+        """
+        return user_arguments
+
+    def apply(self, obj: Any, user_arguments: Any, **kwargs):
+        """
+        :param obj: the object to check. This can be a macro-object like a graph, or a micro-object like a node,
+        depending on the outer search layer.
+        :param user_arguments: The arguments that the user put into the search bar, as returned by prepare_arguments.
         :param kwargs: Whatever information this search layer is provided with. Defined by the outer search layer.
         :return: True if the object matches the search criteria, False otherwise.
         """
         raise NotImplementedError()
+
+    def get_index_term(self, obj: Any) -> Optional[str]:
+        """
+        Search layers that check for equality with a user argument can be answered with a search index (see
+        vulcan.search.search_index) instead of checking every object. Such layers implement this and get_query_term,
+        such that apply(obj, user_arguments) is true exactly if get_index_term(obj) == get_query_term(user_arguments).
+        :param obj: the object to check, as in apply().
+        :return: The term under which obj is stored in the search index. None if the object can never match, or if
+        this layer does not support search indices (default).
+        """
+        return None
+
+    def get_query_term(self, user_arguments: Any) -> Optional[str]:
+        """
+        See get_index_term.
+        :param user_arguments: The prepared arguments, as in apply().
+        :return: The term to look up in the search index. None if this layer does not support search indices (default).
+        """
+        return None
+
+
+def prepare_string_argument(user_arguments: List[str]) -> str:
+    """
+    :return: The first user argument, lowercased and without outer whitespace, for case-insensitive comparisons.
+    """
+    argument = _get_first_argument(user_arguments)
+    return argument.strip().lower()
+
+
+def prepare_regex_argument(user_arguments: List[str]) -> Pattern:
+    """
+    :return: The first user argument, compiled as a regular expression.
+    """
+    argument = _get_first_argument(user_arguments)
+    try:
+        return re.compile(argument)
+    except re.error as e:
+        raise SearchArgumentError(f"'{argument}' is not a valid regular expression: {e}")
+
+
+def prepare_int_argument(user_arguments: List[str]) -> int:
+    """
+    :return: The first user argument, parsed as an integer.
+    """
+    argument = _get_first_argument(user_arguments)
+    try:
+        return int(argument.strip())
+    except ValueError:
+        raise SearchArgumentError(f"'{argument}' is not a whole number.")
+
+
+def _get_first_argument(user_arguments: List[str]) -> str:
+    if user_arguments is None or len(user_arguments) == 0 or not isinstance(user_arguments[0], str):
+        raise SearchArgumentError("Please fill out all fields of the search filter.")
+    return user_arguments[0]
@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, List, Optional, Iterable, Tuple
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
 
@@ -21,13 +21,40 @@ class OuterSearchLayer:
         """
         raise NotImplementedError()
 
-    def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: Any):
+    def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[Any], obj: Any):
         """
         :param inner_search_layers: All the inner search layers that must match here.
-        :param user_arguments: The arguments that the user put into the search bar. These arguments correspond
-        to the gaps in the label returned by each InnerSearchLayer's get_label().
+        :param user_arguments: For each inner search layer, the arguments that the user put into the search bar, as
+        returned by the layer's prepare_arguments().
         :param obj: The object to check.
         :return: A (possibly empty) set of highlighted node names if the object matches the search criteria,
          None otherwise.
         """
         raise NotImplementedError()
+
+    def get_elements(self, obj: Any) -> Optional[Iterable[Tuple[Any, Any]]]:
+        """
+        :param obj: The object to check.
+        :return: If this layer checks the elements of the object (e.g. nodes or tokens) individually, the elements in
+         the form that is passed to the inner search layers, each paired with the name that is highlighted if the
+         element matches. None if this layer checks the object as a whole. Search indices are built from these
+         elements (see vulcan.search.search_index).
+        """
+        return None
+
+
+def apply_to_elements(elements: Iterable[Tuple[Any, Any]], inner_search_layers: List[InnerSearchLayer],
+                      user_arguments: List[Any]):
+    """
+    Implementation of OuterSearchLayer.apply for layers that check the elements of an object individually.
+    :return: The names of all elements that match all inner search layers, or None if there are none.
+    """
+    ret = []
+    for element, element_name in elements:
+        if all(inner_search_layer.apply(element, user_args)
+               for inner_search_layer, user_args in zip(inner_search_layers, user_arguments)):
+            ret.append(element_name)
+    if len(ret) > 0:
+        return ret
+    else:
+        return None
@@ -0,0 +1,5 @@
+from vulcan.parallel import can_fork, map_in_forked_processes
+
+# Searching a chunk in a separate process only pays off if the chunk is large enough to outweigh the cost of forking
+#  and of sending the results back.
+MIN_INSTANCES_PER_SEARCH_WORKER = 200
@@ -1,10 +1,12 @@
-from typing import List, Optional, Any, Dict, Tuple, Union
+from typing import List, Optional, Any, Dict, Tuple, Union, Sequence, Iterator
 
-from vulcan.data_handling.data_corpus import CorpusSlice
 from vulcan.search.graph_nodes.node_content_equals import NodeContentEquals
 from vulcan.search.graph_nodes.outer_graph_node_layer import OuterGraphNodeLayer
 from vulcan.search.inner_search_layer import InnerSearchLayer
 from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.parallel_search import MIN_INSTANCES_PER_SEARCH_WORKER, can_fork, map_in_forked_processes
+from vulcan.search.search_index import SearchIndex, intersect_postings
+from vulcan.search.search_result import SearchMatches, SearchResultLayout
 from vulcan.search.search_registry import OUTER_SEARCH_LAYERS, INNER_SEARCH_LAYERS, VISUALIZATION_TYPE_TO_OUTER_SEARCH_LAYERS, \
     OUTER_TO_INNER_SEARCH_LAYERS
 from vulcan.search.table.column_count_at_least import ColumnCountAtLeast
@@ -14,6 +16,9 @@ from vulcan.search.table_cells.cell_content_matches import CellContentMatches
 from vulcan.search.table_cells.outer_table_cells_layer import OuterTableCellsLayer
 from vulcan.server.basic_layout import BasicLayout
 
+# The number of instances that the search checks (per worker) before it reports progress, see search_layout_in_batches.
+SEARCH_BATCH_SIZE = 500
+
 
 class SearchFilter:
     def __init__(self, corpus_slice_name: str,
@@ -28,12 +33,119 @@ class SearchFilter:
 
 
 def perform_search_on_layout(layout: BasicLayout,
-                             filters: List[SearchFilter]) -> 'BasicLayout':
+                             filters: List[SearchFilter],
+                             workers: int = 1) -> SearchResultLayout:
+    """
+    :param workers: If larger than 1, instances that have to be checked one by one (i.e. that cannot be found through
+     a search index) are split into chunks that are searched in this many processes in parallel.
+    :raises SearchArgumentError: if a filter has invalid user arguments (e.g. a regular expression that does not
+     compile).
+    """
+    search_result = create_search_result_layout(layout, filters)
+    for matching_indices, node_names in search_layout_in_batches(layout, filters, workers=workers, batch_size=None):
+        search_result.add_matches(matching_indices, node_names)
+    return search_result
+
+
+def search_layout_in_batches(layout: BasicLayout,
+                             filters: List[SearchFilter],
+                             workers: int = 1,
+                             batch_size: Optional[int] = SEARCH_BATCH_SIZE,
+                             only_indices: Sequence[int] = None) -> Iterator[Tuple[List[int], List[List]]]:
+    """
+    Searches the layout step by step, such that a caller can report progress (or stop early, or handle other requests)
+    in between.
+    The user arguments are validated right away when this function is called. Search indices that do not exist yet
+    are built while iterating over the result, batch_size instances at a time; the batches yielded in between are
+    empty. Then the instances are checked.
+    :param workers: As in perform_search_on_layout. Each batch is split among the workers.
+    :param batch_size: The number of instances to check (or to add to a search index) per batch and worker. If None,
+     everything is done in a single batch.
+    :param only_indices: If given, only these instances are searched (e.g. the ones that changed when reloading the
+     corpus). Search indices are not used then, since building them would take longer than checking a few instances.
+    :return: An iterator over the matches in each batch, in the form (matching_indices, node_names) as expected
+     by SearchResultLayout.add_matches. The batches are in corpus order.
+    :raises SearchArgumentError: if a filter has invalid user arguments.
+    """
+    prepared_arguments = prepare_search_arguments(filters)
     lists_to_search: List[List[any]] = [_get_list_to_search(layout, f.corpus_slice_name) for f in filters]
-    matching_indices, highlight_dicts = _search_lists(lists_to_search, filters)
-    slices = _get_sub_slices_from_indices(layout, matching_indices, highlight_dicts)
-    linkers = _get_sub_linkers_from_indices(layout, matching_indices)
-    return BasicLayout(slices, linkers, len(matching_indices))
+    return _search_layout_in_batches(layout, filters, prepared_arguments, lists_to_search, workers, batch_size,
+                                     only_indices)
+
+
+def _search_layout_in_batches(layout: BasicLayout,
+                              filters: List[SearchFilter],
+                              prepared_arguments: List[List[Any]],
+                              lists_to_search: List[List[any]],
+                              workers: int,
+                              batch_size: Optional[int],
+                              only_indices: Optional[Sequence[int]]) -> Iterator[Tuple[List[int], List[List]]]:
+    if only_indices is None:
+        search_indices = yield from _build_search_indices(layout, filters, prepared_arguments, batch_size)
+        index_results = [_get_index_result(search_indices, f, arguments)
+                         for f, arguments in zip(filters, prepared_arguments)]
+        candidate_indices = _get_candidate_indices(lists_to_search, index_results)
+    else:
+        index_results = [None] * len(filters)
+        corpus_size = len(_get_candidate_indices(lists_to_search, index_results))  # all instances
+        candidate_indices = sorted(index for index in set(only_indices) if index < corpus_size)
+    if batch_size is None:
+        batch_size = max(len(candidate_indices), 1)
+    else:
+        batch_size *= max(workers, 1)
+    for start in range(0, len(candidate_indices), batch_size):
+        yield _search_lists(lists_to_search, filters, prepared_arguments, index_results, workers,
+                            candidate_indices[start:start + batch_size])
+
+
+def create_search_result_layout(layout: BasicLayout, filters: List[SearchFilter],
+                                matches: SearchMatches = None) -> SearchResultLayout:
+    """
+    :param filters: The filters of the search, in the order in which they were searched. Their colors are used to
+     highlight the matches.
+    :param matches: The matches of an earlier search with the same filters (see get_search_cache_key), e.g. with other
+     colors. Per default, the search result starts without any matches; add them with SearchResultLayout.add_matches.
+    :return: A search result for the given layout.
+    """
+    if matches is None:
+        matches = SearchMatches()
+    return SearchResultLayout(layout, matches, [(f.corpus_slice_name, f.color) for f in filters])
+
+
+def get_search_cache_key(filters: List[SearchFilter]) -> Tuple[Tuple, List[SearchFilter]]:
+    """
+    Brings the filters into a canonical form, such that searches that differ only in the colors, in the order of
+    the filters or inner search layers, or in ways that the inner search layers ignore (e.g. casing, see
+    InnerSearchLayer.prepare_arguments) are recognized as the same search.
+    :return: A pair (key, sorted_filters). key is hashable, and equal for searches that have the same matches.
+     sorted_filters are the filters in canonical order; searching them in this order gives matches that can be
+     shared between all searches with the same key.
+    :raises SearchArgumentError: if a filter has invalid user arguments.
+    """
+    filter_keys = []
+    for search_filter, arguments in zip(filters, prepare_search_arguments(filters)):
+        inner_keys = sorted(((name, _make_hashable(args))
+                             for name, args in zip(search_filter.inner_search_layer_names, arguments)), key=repr)
+        filter_keys.append((search_filter.corpus_slice_name, search_filter.outer_search_layer_name, tuple(inner_keys)))
+    order = sorted(range(len(filters)), key=lambda i: repr(filter_keys[i]))
+    return tuple(filter_keys[i] for i in order), [filters[i] for i in order]
+
+
+def _make_hashable(obj: Any) -> Any:
+    if isinstance(obj, (list, tuple)):
+        return tuple(_make_hashable(o) for o in obj)
+    return obj
+
+
+def prepare_search_arguments(filters: List[SearchFilter]) -> List[List[Any]]:
+    """
+    Prepares the user arguments of all filters once for the whole search (see InnerSearchLayer.prepare_arguments).
+    :return: For each filter, the prepared arguments of each of its inner search layers.
+    :raises SearchArgumentError: if a filter has invalid user arguments.
+    """
+    return [[get_inner_search_layer(name).prepare_arguments(user_arguments)
+             for name, user_arguments in zip(f.inner_search_layer_names, f.inner_search_layer_arguments)]
+            for f in filters]
 
 
 def _get_list_to_search(layout: BasicLayout, corpus_slice_name: str) -> List[any]:
@@ -47,65 +159,78 @@ def _get_list_to_search(layout: BasicLayout, corpus_slice_name: str) -> List[any
     raise Exception("Corpus slice not found: " + corpus_slice_name)
 
 
-def _get_sub_slices_from_indices(layout: BasicLayout, matching_indices: List[int],
-                                 highlight_dicts: List[Dict[Tuple, Any]]) -> List[CorpusSlice]:
-    sub_slices = []
-    for row in layout.layout:
-        for corpus_slice in row:
-            new_instances = _filter_part_of_slice(corpus_slice.instances, matching_indices)
-            new_label_alternatives = _filter_part_of_slice(corpus_slice.label_alternatives, matching_indices)
-            new_highlights = _filter_part_of_slice(corpus_slice.highlights, matching_indices)
-            new_highlights = _update_highlights(new_highlights, highlight_dicts, corpus_slice.name)
-            new_mouseover_texts = _filter_part_of_slice(corpus_slice.mouseover_texts, matching_indices)
-            new_dependency_trees = _filter_part_of_slice(corpus_slice.dependency_trees, matching_indices)
-
-            new_slice = CorpusSlice(corpus_slice.name, new_instances,
-                                    corpus_slice.visualization_type,
-                                    label_alternatives=new_label_alternatives,
-                                    highlights=new_highlights,
-                                    mouseover_texts=new_mouseover_texts,
-                                    dependency_trees=new_dependency_trees)
-            sub_slices.append(new_slice)
-    return sub_slices
-
-
-def _update_highlights(old_highlights: Optional[List[Dict[Any, Union[str, List[str]]]]],
-                       search_highlight_dicts: List[Dict[Tuple[str, Any], Union[str, List[str]]]],
-                       slice_name: str):
-    # update the search highlights with the old (base) highlights
-    if old_highlights is not None:
-        for old_highlight, search_highlight_dict in zip(old_highlights, search_highlight_dicts):  # iterate over corpus
-            for key, value in old_highlight.items():  # iterate over all highlights for this corpus entry
-                _add_highlight_color(search_highlight_dict, key, slice_name, value)
-
-    # now turn the updated search highlights into the standard highlights format for this corpus slice
-    ret = []
-    for search_highlight_dict in search_highlight_dicts:  # iterate over corpus
-        dict_here = {}
-        for key, value in search_highlight_dict.items():  # iterate over all highlights for this corpus entry
-            # print(key, value, slice_name)
-            if key[0] == slice_name:  # only keep the ones that apply to this corpus slice
-                dict_here[key[1]] = value
-        ret.append(dict_here)
-    return ret
-
-
-def _get_sub_linkers_from_indices(layout: BasicLayout, matching_indices: List[int]) -> List[dict]:
-    sub_linkers = []
-    for linker_index, linker in enumerate(layout.linkers):
-        new_scores = _filter_part_of_slice(linker["scores"], matching_indices)
-        new_linker = {"name1": linker["name1"],
-                      "name2": linker["name2"],
-                      "scores": new_scores}
-        sub_linkers.append(new_linker)
-    return sub_linkers
+def _get_index_keys(search_filter: SearchFilter, prepared_arguments: List[Any]) -> List[Tuple[str, str, str]]:
+    """
+    :return: The keys (slice name, outer search layer name, inner search layer name) of the search indices that the
+     filter can use, for the inner search layers that support search indices (see InnerSearchLayer.get_index_term).
+    """
+    outer_search_layer = get_outer_search_layer(search_filter.outer_search_layer_name)
+    if not _outer_search_layer_has_elements(outer_search_layer):
+        return []
+    return [(search_filter.corpus_slice_name, search_filter.outer_search_layer_name, inner_search_layer_name)
+            for inner_search_layer_name, user_arguments in zip(search_filter.inner_search_layer_names,
+                                                                prepared_arguments)
+            if get_inner_search_layer(inner_search_layer_name).get_query_term(user_arguments) is not None]
+
+
+def _build_search_indices(layout: BasicLayout, filters: List[SearchFilter], prepared_arguments: List[List[Any]],
+                          batch_size: Optional[int]) -> Iterator[Tuple[List[int], List[List]]]:
+    """
+    Builds the search indices that the filters can use and that the layout does not have yet, batch_size instances
+    at a time (all at once if batch_size is None), and yields an empty batch after each step. An index is only added
+    to the layout once it is complete, so that other searches never use an incomplete index.
+    :return: (as the value of the generator) All search indices the filters can use, by key.
+    """
+    search_indices = {}
+    for search_filter, arguments in zip(filters, prepared_arguments):
+        for key in _get_index_keys(search_filter, arguments):
+            if key in search_indices:
+                continue
+            search_index = layout.search_indices.get(key)
+            if search_index is None:
+                corpus_slice_name, outer_search_layer_name, inner_search_layer_name = key
+                objects = _get_list_to_search(layout, corpus_slice_name)
+                search_index = SearchIndex(objects, get_outer_search_layer(outer_search_layer_name),
+                                           get_inner_search_layer(inner_search_layer_name), build=False)
+                step = batch_size if batch_size is not None else max(len(objects), 1)
+                for start in range(0, len(objects), step):
+                    search_index.add_objects(start, min(start + step, len(objects)))
+                    if batch_size is not None:
+                        yield [], []
+                # another search may have built the same index in the meantime
+                search_index = layout.search_indices.setdefault(key, search_index)
+            search_indices[key] = search_index
+    return search_indices
+
+
+def _get_index_result(search_indices: Dict[Tuple[str, str, str], SearchIndex], search_filter: SearchFilter,
+                      prepared_arguments: List[Any]) -> Optional[Tuple[Dict[int, List], bool]]:
+    """
+    Looks up the filter's inner search layers that support search indices (see InnerSearchLayer.get_index_term) in
+    search_indices (see _build_search_indices).
+    :return: None if no inner search layer of the filter supports search indices. Otherwise a pair (postings,
+     is_exact). postings maps the indices of all instances that can match the filter to the names of the matching
+     elements. If is_exact, all inner search layers were looked up, and postings is the final result for this filter;
+     otherwise, the instances in postings still need to be checked against the remaining inner search layers.
+    """
+    outer_search_layer = get_outer_search_layer(search_filter.outer_search_layer_name)
+    if not _outer_search_layer_has_elements(outer_search_layer):
+        return None
+    postings_list = []
+    for inner_search_layer_name, user_arguments in zip(search_filter.inner_search_layer_names, prepared_arguments):
+        query_term = get_inner_search_layer(inner_search_layer_name).get_query_term(user_arguments)
+        if query_term is not None:
+            key = (search_filter.corpus_slice_name, search_filter.outer_search_layer_name, inner_search_layer_name)
+            postings_list.append(search_indices[key].lookup(query_term))
+    if len(postings_list) == 0:
+        return None
+    is_exact = len(postings_list) == len(search_filter.inner_search_layer_names)
+    return intersect_postings(postings_list), is_exact
 
 
-def _filter_part_of_slice(part_of_slice: Optional[List[Any]], matching_indices: List[int]) -> Optional[List[Any]]:
-    if part_of_slice is not None:
-        return [part_of_slice[i] for i in matching_indices]
-    else:
-        return None
+def _outer_search_layer_has_elements(outer_search_layer: OuterSearchLayer) -> bool:
+    # only outer search layers that check elements individually override get_elements
+    return type(outer_search_layer).get_elements is not OuterSearchLayer.get_elements
 
 
 def _get_linker_name(linker, linker_index):
@@ -113,68 +238,88 @@ def _get_linker_name(linker, linker_index):
 
 
 def _search_lists(lists_to_search: List[List[any]],
-                  filters: List[SearchFilter]) -> Tuple[List[int], List[Dict]]:
+                  filters: List[SearchFilter],
+                  prepared_arguments: List[List[Any]],
+                  index_results: List[Optional[Tuple[Dict[int, List], bool]]] = None,
+                  workers: int = 1,
+                  candidate_indices: Sequence[int] = None) -> Tuple[List[int], List[List]]:
+    """
+    :param prepared_arguments: The result of prepare_search_arguments(filters).
+    :param index_results: For each filter, the result of _get_index_result (or None to check the filter on every
+     instance). Only instances that occur in all index results are checked, and filters with exact index results
+     are not checked again at all.
+    :param workers: The maximum number of processes to check the instances in.
+    :param candidate_indices: The instances to check (they must all occur in the index results). Per default, all
+     instances that occur in all index results.
+    """
+    if index_results is None:
+        index_results = [None] * len(filters)
+    if candidate_indices is None:
+        candidate_indices = _get_candidate_indices(lists_to_search, index_results)
+    needs_checking = any(index_result is None or not index_result[1] for index_result in index_results)
+    workers = min(workers, len(candidate_indices) // MIN_INSTANCES_PER_SEARCH_WORKER)
+    if not needs_checking or workers <= 1 or not can_fork():
+        return _search_candidates(lists_to_search, filters, prepared_arguments, index_results, candidate_indices)
+
+    chunk_size = -(-len(candidate_indices) // workers)  # round up
+    chunks = [candidate_indices[i:i + chunk_size] for i in range(0, len(candidate_indices), chunk_size)]
+    chunk_results = map_in_forked_processes(lambda chunk: _search_candidates(lists_to_search, filters,
+                                                                             prepared_arguments, index_results,
+                                                                             chunk),
+                                            chunks)
+    matching_indices = []
+    node_names = []
+    for matching_indices_here, node_names_here in chunk_results:
+        matching_indices.extend(matching_indices_here)
+        node_names.extend(node_names_here)
+    return matching_indices, node_names
+
+
+def _search_candidates(lists_to_search: List[List[any]],
+                       filters: List[SearchFilter],
+                       prepared_arguments: List[List[Any]],
+                       index_results: List[Optional[Tuple[Dict[int, List], bool]]],
+                       candidate_indices: Sequence[int]) -> Tuple[List[int], List[List]]:
+    """
+    :return: The indices of the matching instances, and for each match, the names of the nodes (or tokens, cells,
+     ...) that each filter found in it. Node names can be ints, tuples of ints or strings, or any other object really.
+    """
     outer_search_layers: List[OuterSearchLayer] = [get_outer_search_layer(f.outer_search_layer_name) for f in filters]
     inner_search_layers_list: List[List[InnerSearchLayer]] = [[get_inner_search_layer(name)
                                                           for name in f.inner_search_layer_names]
                                                             for f in filters]
     matching_indices = []
-    highlight_dicts = []
-    for index, items in enumerate(zip(*lists_to_search)):
+    node_names = []
+    for index in candidate_indices:
         success = True
-        highlighting_here = {}
-        for outer_search_layer, inner_search_layers, search_filter, item in \
-                zip(outer_search_layers, inner_search_layers_list, filters, items):
-            node_names_here = outer_search_layer.apply(inner_search_layers, search_filter.inner_search_layer_arguments,
-                                                       item)
+        node_names_here_by_filter = []
+        for outer_search_layer, inner_search_layers, search_filter, arguments, list_to_search, index_result in \
+                zip(outer_search_layers, inner_search_layers_list, filters, prepared_arguments, lists_to_search,
+                    index_results):
+            if index_result is not None and index_result[1]:
+                node_names_here = index_result[0].get(index)
+            else:
+                node_names_here = outer_search_layer.apply(inner_search_layers, arguments, list_to_search[index])
             if node_names_here is None:
                 # print(f"Search returned false for: {outer_search_layer.get_label()},"
                 #       f" {[l.get_label() for l in inner_search_layers]}, {inner_search_layer_arguments}, {item}")
                 success = False
                 break
             else:
-                for nn in node_names_here:
-                    _add_highlight_color(highlighting_here, nn, search_filter.corpus_slice_name, search_filter.color)
+                node_names_here_by_filter.append(list(node_names_here))
         if success:
             matching_indices.append(index)
-            highlight_dicts.append(highlighting_here)
-    # highlight_dicts maps node names (can be ints, tuples of ints or strings, or any other object really) to colors.
-    # Colors can be a single string, or a list of strings, or a table (list of lists) of strings.
-    return matching_indices, highlight_dicts
-
-
-def _add_highlight_color(highlight_dict: Dict[Tuple[str, Any], Union[str, List[str]]],
-                         node_name: Any,
-                         slice_name: str,
-                         color: Union[str, List[str]]):
-    key = (slice_name, node_name)
-    if key in highlight_dict:
-        if isinstance(highlight_dict[key], str):
-            if isinstance(color, str):
-                highlight_dict[key] = [highlight_dict[key], color]
-            elif isinstance(color, list):
-                if len(color) > 0 and isinstance(color[0], list):
-                    print("Warning: Search highlighting is incompatible with highlight colors in table form."
-                          "Highlighting will be ignored for this node.")
-                else:
-                    highlight_dict[key] = [highlight_dict[key]] + color
-            else:
-                raise Exception("Unknown type when adding highlight color")
-        elif isinstance(highlight_dict[key], list):
-            if isinstance(color, str):
-                highlight_dict[key].append(color)
-            elif isinstance(color, list):
-                if len(color) > 0 and isinstance(color[0], list):
-                    print("Warning: Search highlighting is incompatible with highlight colors in table form."
-                          "Highlighting will be ignored for this node.")
-                else:
-                    highlight_dict[key] += color
-            else:
-                raise Exception("Unknown type when adding highlight color")
-        else:
-            raise Exception("Unknown type when adding highlight color")
-    else:
-        highlight_dict[key] = color
+            node_names.append(node_names_here_by_filter)
+    return matching_indices, node_names
+
+
+def _get_candidate_indices(lists_to_search: List[List[any]],
+                           index_results: List[Optional[Tuple[Dict[int, List], bool]]]) -> Sequence[int]:
+    corpus_size = min(len(list_to_search) for list_to_search in lists_to_search) if len(lists_to_search) > 0 else 0
+    candidate_sets = [set(index_result[0].keys()) for index_result in index_results if index_result is not None]
+    if len(candidate_sets) == 0:
+        return range(corpus_size)
+    return sorted(index for index in set.intersection(*candidate_sets) if index < corpus_size)
 
 
 def get_outer_search_layer(name: str) -> OuterSearchLayer:
@@ -0,0 +1,89 @@
+from typing import Any, Dict, List, Sequence
+
+from vulcan.search.inner_search_layer import InnerSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer
+
+# Rough memory use of the parts of a SearchIndex, in bytes: of a term (its entry and its postings dict), of an object
+#  in the postings of a term (the index and the list of element names), and of an element name in that list. The
+#  terms and element names themselves are shared with the corpus.
+ESTIMATED_BYTES_PER_TERM = 180
+ESTIMATED_BYTES_PER_POSTING = 120
+ESTIMATED_BYTES_PER_ELEMENT_NAME = 8
+
+class SearchIndex:
+    """
+    An inverted index over one searchable list (e.g. the graphs of one corpus slice), for one combination of an outer
+    and an inner search layer. For each index term (see InnerSearchLayer.get_index_term), it stores the indices of the
+    objects in the list that have elements with this term, and the names of those elements. This way, searching for
+    e.g. a node label is a single lookup instead of a traversal of every graph in the corpus.
+
+    The indices of a corpus are kept with its layout until the layout is dropped (see BasicLayout.search_indices), and
+    are not limited by the size of the search result cache. Since there is at most one index for each combination of a
+    corpus slice and search layers, their size is bounded by a small multiple of the size of the corpus.
+    """
+
+    def __init__(self, objects: Sequence[Any], outer_search_layer: OuterSearchLayer,
+                 inner_search_layer: InnerSearchLayer, build: bool = True):
+        """
+        :param build: If False, the index starts out empty, and is built step by step with add_objects (e.g. to
+            handle other requests in between).
+        """
+        self.objects = objects
+        self.outer_search_layer = outer_search_layer
+        self.inner_search_layer = inner_search_layer
+        # term -> object index -> names of the matching elements, in the order the outer search layer returns them
+        self.postings: Dict[str, Dict[int, List[Any]]] = {}
+        self._estimated_memory = 0
+        if build:
+            self.add_objects(0, len(objects))
+
+    def add_objects(self, start: int, stop: int):
+        """
+        Adds the objects with indices start to stop - 1 to the index. Objects must be added in order.
+        """
+        for index in range(start, stop):
+            for element, element_name in self.outer_search_layer.get_elements(self.objects[index]):
+                term = self.inner_search_layer.get_index_term(element)
+                if term is not None:
+                    self._add_posting(term, index, element_name)
+
+    def _add_posting(self, term: str, index: int, element_name: Any):
+        postings = self.postings.get(term)
+        if postings is None:
+            postings = self.postings[term] = {}
+            self._estimated_memory += ESTIMATED_BYTES_PER_TERM
+        element_names = postings.get(index)
+        if element_names is None:
+            element_names = postings[index] = []
+            self._estimated_memory += ESTIMATED_BYTES_PER_POSTING
+        element_names.append(element_name)
+        self._estimated_memory += ESTIMATED_BYTES_PER_ELEMENT_NAME
+
+    def estimate_memory(self) -> int:
+        """
+        :return: A rough estimate of the memory used by this index, in bytes.
+        """
+        return self._estimated_memory
+
+    def lookup(self, term: str) -> Dict[int, List[Any]]:
+        """
+        :return: Maps the indices of all objects with a matching element to the names of those elements.
+        """
+        return self.postings.get(term, {})
+
+
+def intersect_postings(postings_list: List[Dict[int, List[Any]]]) -> Dict[int, List[Any]]:
+    """
+    Combines the results of several lookups that must all match the same element.
+    :return: Maps each object index that occurs in all postings to the element names that occur in all postings
+     (in the order of the first postings), leaving out objects without such elements.
+    """
+    ret = {}
+    first, others = postings_list[0], postings_list[1:]
+    for index, element_names in first.items():
+        if all(index in postings for postings in others):
+            other_name_sets = [set(postings[index]) for postings in others]
+            names_here = [name for name in element_names if all(name in names for names in other_name_sets)]
+            if len(names_here) > 0:
+                ret[index] = names_here
+    return ret
@@ -0,0 +1,208 @@
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from vulcan.data_handling.data_corpus import CorpusSlice
+from vulcan.server.basic_layout import BasicLayout
+
+
+# Rough memory use of one highlighted node name in SearchMatches (the name itself and the list entry), in bytes.
+ESTIMATED_BYTES_PER_NODE_NAME = 80
+
+
+class SearchMatches:
+    """
+    The result of a search: the indices of the matching instances in the searched layout, and for each match the
+    names of the nodes (tokens, cells, ...) that each search filter found. Only matches where some filter found
+    nodes store them. This does not depend on the colors of the filters, so it can be shared by all searches with
+    the same filters.
+    """
+
+    def __init__(self):
+        self.indices = array("q")
+        # position in the search result -> for each search filter, the list of node names it found
+        self.node_names_by_position: Dict[int, List[List[Any]]] = {}
+        self.node_name_count = 0
+
+    def add(self, matching_indices: List[int], node_names: List[List[List[Any]]]):
+        for index, node_names_here in zip(matching_indices, node_names):
+            count_here = sum(len(names) for names in node_names_here)
+            if count_here > 0:
+                self.node_names_by_position[len(self.indices)] = node_names_here
+                self.node_name_count += count_here
+            self.indices.append(index)
+
+    def estimate_memory(self) -> int:
+        """
+        :return: A rough estimate of the memory used by these matches, in bytes.
+        """
+        return self.indices.itemsize * len(self.indices) + ESTIMATED_BYTES_PER_NODE_NAME * self.node_name_count
+
+    def __len__(self):
+        return len(self.indices)
+
+
+def update_search_matches(old_matches: SearchMatches, changed_indices: Sequence[int], corpus_size: int,
+                          new_matching_indices: List[int], new_node_names: List[List[List[Any]]]) -> SearchMatches:
+    """
+    Updates the matches of a search after some instances of the searched corpus changed (see
+    vulcan.corpus_reload), without searching the unchanged instances again.
+    :param changed_indices: The instances that changed or are new. The old matches among them are dropped.
+    :param corpus_size: The size of the changed corpus. Old matches beyond it are dropped.
+    :param new_matching_indices: The result of the same search on just the changed instances, as for
+        SearchMatches.add.
+    """
+    changed_indices = set(changed_indices)
+    merged = [(index, old_matches.node_names_by_position.get(position, []))
+              for position, index in enumerate(old_matches.indices)
+              if index < corpus_size and index not in changed_indices]
+    merged.extend(zip(new_matching_indices, new_node_names))
+    merged.sort(key=lambda match: match[0])
+    matches = SearchMatches()
+    matches.add([index for index, _ in merged], [node_names for _, node_names in merged])
+    return matches
+
+
+class IndexView(Sequence):
+    """
+    A read-only list of the entries of a list that belong to the search matches, e.g. the matching graphs of a
+    corpus slice. Nothing is copied; the view grows along with the matches.
+    """
+
+    def __init__(self, source: Sequence, matches: SearchMatches):
+        self.source = source
+        self.matches = matches
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        return self.source[self.matches.indices[_check_position(position, len(self))]]
+
+
+class SearchHighlightView(Sequence):
+    """
+    Like IndexView, for the highlights of a corpus slice: combines the highlights of the matching instances (if any)
+    with the search highlights for this slice, when an instance is requested.
+    """
+
+    def __init__(self, source: Optional[Sequence], matches: SearchMatches, slice_name: str,
+                 filter_highlights: List[Tuple[str, Union[str, List[str]]]]):
+        """
+        :param source: The highlights of the searched corpus slice, or None if it has no highlights.
+        :param filter_highlights: For each search filter, the name of the slice it searches and its color.
+        """
+        self.source = source
+        self.matches = matches
+        self.slice_name = slice_name
+        self.filter_highlights = filter_highlights
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        position = _check_position(position, len(self))
+        highlights = {}
+        node_names_by_filter = self.matches.node_names_by_position.get(position, [])
+        for (slice_name, color), node_names in zip(self.filter_highlights, node_names_by_filter):
+            if slice_name == self.slice_name:
+                for node_name in node_names:
+                    # copy color lists, since add_highlight_color may extend them later
+                    add_highlight_color(highlights, node_name, slice_name,
+                                        list(color) if isinstance(color, list) else color)
+        if self.source is not None:
+            base_highlights = self.source[self.matches.indices[position]]
+            if base_highlights is not None:
+                for node_name, color in base_highlights.items():
+                    add_highlight_color(highlights, node_name, self.slice_name, color)
+        return {key[1]: color for key, color in highlights.items()}
+
+
+def _check_position(position: int, length: int) -> int:
+    if position < 0:
+        position += length
+    if not 0 <= position < length:
+        raise IndexError(f"Search result index {position} out of range")
+    return position
+
+
+class SearchResultLayout(BasicLayout):
+    """
+    The layout that a client sees after a search. All slices and linkers are views on the searched layout (see
+    IndexView), so a search result only costs memory for the matching indices and the search highlights, no matter
+    how large the corpus is.
+    """
+
+    def __init__(self, searched_layout: BasicLayout, matches: SearchMatches,
+                 filter_highlights: List[Tuple[str, Union[str, List[str]]]]):
+        """
+        :param filter_highlights: For each search filter (in the order of the node names in matches), the name of the
+            slice it searches and its color.
+        """
+        self.searched_layout = searched_layout
+        self.matches = matches
+        slices = [_make_slice_view(corpus_slice, matches, filter_highlights)
+                  for row in searched_layout.layout for corpus_slice in row]
+        linkers = [{"name1": linker["name1"],
+                    "name2": linker["name2"],
+                    "scores": IndexView(linker["scores"], matches)} for linker in searched_layout.linkers]
+        super().__init__(slices, linkers, len(matches))
+
+    def add_matches(self, matching_indices: List[int], node_names: List[List[List[Any]]]):
+        """
+        Adds further matches to the end of the search result (e.g. while the search is still running).
+        """
+        self.matches.add(matching_indices, node_names)
+        self.corpus_size = len(self.matches)
+
+
+def _make_slice_view(corpus_slice: CorpusSlice, matches: SearchMatches,
+                     filter_highlights: List[Tuple[str, Union[str, List[str]]]]) -> CorpusSlice:
+    def view_or_none(part_of_slice):
+        return IndexView(part_of_slice, matches) if part_of_slice is not None else None
+
+    return CorpusSlice(corpus_slice.name, IndexView(corpus_slice.instances, matches),
+                       corpus_slice.visualization_type,
+                       label_alternatives=view_or_none(corpus_slice.label_alternatives),
+                       highlights=SearchHighlightView(corpus_slice.highlights, matches, corpus_slice.name,
+                                                             filter_highlights),
+                       mouseover_texts=view_or_none(corpus_slice.mouseover_texts),
+                       dependency_trees=view_or_none(corpus_slice.dependency_trees))
+
+
+def add_highlight_color(highlight_dict: Dict[Tuple[str, Any], Union[str, List[str]]],
+                        node_name: Any,
+                        slice_name: str,
+                        color: Union[str, List[str]]):
+    key = (slice_name, node_name)
+    if key in highlight_dict:
+        if isinstance(highlight_dict[key], str):
+            if isinstance(color, str):
+                highlight_dict[key] = [highlight_dict[key], color]
+            elif isinstance(color, list):
+                if len(color) > 0 and isinstance(color[0], list):
+                    print("Warning: Search highlighting is incompatible with highlight colors in table form."
+                          "Highlighting will be ignored for this node.")
+                else:
+                    highlight_dict[key] = [highlight_dict[key]] + color
+            else:
+                raise Exception("Unknown type when adding highlight color")
+        elif isinstance(highlight_dict[key], list):
+            if isinstance(color, str):
+                highlight_dict[key].append(color)
+            elif isinstance(color, list):
+                if len(color) > 0 and isinstance(color[0], list):
+                    print("Warning: Search highlighting is incompatible with highlight colors in table form."
+                          "Highlighting will be ignored for this node.")
+                else:
+                    highlight_dict[key] += color
+            else:
+                raise Exception("Unknown type when adding highlight color")
+        else:
+            raise Exception("Unknown type when adding highlight color")
+    else:
+        highlight_dict[key] = color
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from vulcan.search.search_result import SearchMatches
+
+DEFAULT_SEARCH_CACHE_MEMORY = 256 * 1024 * 1024  # bytes
+# Rough memory use of a cache entry apart from the matches (the key and the bookkeeping), in bytes. This also bounds
+#  the number of cached searches without any matches.
+ESTIMATED_BYTES_PER_ENTRY = 1024
+
+
+class SearchResultCache:
+    """
+    LRU cache for the matches of completed searches, keyed by the canonical form of the search filters (see
+    vulcan.search.search.get_search_cache_key). Since the matches do not depend on the filter colors, everyone who
+    runs the same search shares one cache entry. The cache is bounded by the estimated memory of the cached matches
+    (see SearchMatches.estimate_memory).
+    """
+
+    def __init__(self, max_memory: int = DEFAULT_SEARCH_CACHE_MEMORY):
+        """
+        :param max_memory: The maximum total estimated memory of all cached matches, in bytes. Matches that are
+            larger than this on their own are not cached.
+        """
+        self.max_memory = max_memory
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[SearchMatches]:
+        matches = self._entries.get(key)
+        if matches is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return matches
+
+    def put(self, key: Hashable, matches: SearchMatches):
+        """
+        Stores the matches of a completed search. They must not be changed afterwards.
+        """
+        size = _get_entry_size(matches)
+        if size > self.max_memory:
+            return
+        if key in self._entries:
+            self.memory -= _get_entry_size(self._entries.pop(key))
+        self._entries[key] = matches
+        self.memory += size
+        while self.memory > self.max_memory:
+            _, evicted = self._entries.popitem(last=False)
+            self.memory -= _get_entry_size(evicted)
+
+    def clear(self):
+        """
+        Removes all entries, e.g. when the searched corpus changes. The hit and miss counts are kept.
+        """
+        self._entries.clear()
+        self.memory = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _get_entry_size(matches: SearchMatches) -> int:
+    return ESTIMATED_BYTES_PER_ENTRY + matches.estimate_memory()
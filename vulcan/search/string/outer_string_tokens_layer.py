@@ -2,7 +2,7 @@ from abc import ABC
 from typing import List, Any
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer, apply_to_elements
 
 
 class OuterStringTokensLayer(OuterSearchLayer):
@@ -17,24 +17,10 @@ class OuterStringTokensLayer(OuterSearchLayer):
         return "OuterStringTokensLayer"
 
     def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: List[str]):
-        # print(obj)
-        # TODO make different versions of this class for strings and tables
-        # for row in obj:
-        ret = []
-        for i, cell in enumerate(obj):  # in row:
-            result = True
-            for inner_search_layer, user_args in zip(inner_search_layers, user_arguments):
-                if inner_search_layer.apply(cell, user_args):
-                    pass
-                else:
-                    result = False
-                    print(cell, inner_search_layer.get_label(), user_args)
-            if result:
-                ret.append(i)
-        if len(ret) > 0:
-            return ret
-        else:
-            return None
+        return apply_to_elements(self.get_elements(obj), inner_search_layers, user_arguments)
+
+    def get_elements(self, obj: List[str]):
+        return [(token, i) for i, token in enumerate(obj)]
 
 
 class InnerTableCellsLayer(InnerSearchLayer, ABC):
@@ -1,5 +1,6 @@
 from typing import List
 
+from vulcan.search.inner_search_layer import prepare_string_argument
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
 
@@ -8,8 +9,17 @@ class TokenContentEquals(InnerTableCellsLayer):
     This checks if the cell content equals the given string (modulo casing and outer whitespace).
     """
 
-    def apply(self, obj: str, user_arguments: List[str]):
-        return obj is not None and obj.strip().lower() == user_arguments[0].strip().lower()
+    def prepare_arguments(self, user_arguments: List[str]) -> str:
+        return prepare_string_argument(user_arguments)
+
+    def apply(self, obj: str, user_arguments: str):
+        return obj is not None and obj.strip().lower() == user_arguments
+
+    def get_index_term(self, obj: str):
+        return obj.strip().lower() if isinstance(obj, str) else None
+
+    def get_query_term(self, user_arguments: str):
+        return user_arguments
 
     def get_description(self) -> str:
         return "This checks if the token equals the given string (modulo casing and outer whitespace)."
@@ -1,6 +1,6 @@
-import re
-from typing import List
+from typing import List, Pattern
 
+from vulcan.search.inner_search_layer import prepare_regex_argument
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
 
@@ -9,8 +9,11 @@ class TokenContentMatches(InnerTableCellsLayer):
     This checks if the cell content equals the given string (modulo casing and outer whitespace).
     """
 
-    def apply(self, obj: str, user_arguments: List[str]):
-        return obj is not None and re.compile(user_arguments[0]).match(obj)
+    def prepare_arguments(self, user_arguments: List[str]) -> Pattern:
+        return prepare_regex_argument(user_arguments)
+
+    def apply(self, obj: str, user_arguments: Pattern):
+        return obj is not None and user_arguments.match(obj)
 
     def get_description(self) -> str:
         return "This checks if the token contains a match for the given regular expression."
@@ -1,5 +1,6 @@
 from typing import List
 
+from vulcan.search.inner_search_layer import prepare_string_argument
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 from vulcan.data_handling.visualization_type import VisualizationType
 
@@ -9,12 +10,24 @@ class CellContentEquals(InnerTableCellsLayer):
     This checks if the cell content equals the given string (modulo casing and outer whitespace).
     """
 
-    def apply(self, obj: str, user_arguments: List[str]):
+    def prepare_arguments(self, user_arguments: List[str]) -> str:
+        return prepare_string_argument(user_arguments)
+
+    def apply(self, obj: str, user_arguments: str):
         if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == VisualizationType.STRING:
             obj = obj[1]
         else:
             return False
-        return obj is not None and isinstance(obj, str) and obj.strip().lower() == user_arguments[0].strip().lower()
+        return obj is not None and isinstance(obj, str) and obj.strip().lower() == user_arguments
+
+    def get_index_term(self, obj: str):
+        if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == VisualizationType.STRING \
+                and isinstance(obj[1], str):
+            return obj[1].strip().lower()
+        return None
+
+    def get_query_term(self, user_arguments: str):
+        return user_arguments
 
     def get_description(self) -> str:
         return "This checks if the cell content equals the given string (modulo casing and outer whitespace)."
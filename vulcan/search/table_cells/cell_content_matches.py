@@ -1,7 +1,8 @@
-import re
-from typing import List
+from typing import List, Pattern
 
+from vulcan.search.inner_search_layer import prepare_regex_argument
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
+from vulcan.data_handling.visualization_type import VisualizationType
 
 
 class CellContentMatches(InnerTableCellsLayer):
@@ -9,8 +10,14 @@ class CellContentMatches(InnerTableCellsLayer):
     This checks if the cell content equals the given string (modulo casing and outer whitespace).
     """
 
-    def apply(self, obj: str, user_arguments: List[str]):
-        return obj is not None and re.compile(user_arguments[0]).match(obj)
+    def prepare_arguments(self, user_arguments: List[str]) -> Pattern:
+        return prepare_regex_argument(user_arguments)
+
+    def apply(self, obj: str, user_arguments: Pattern):
+        if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == VisualizationType.STRING:
+            # cells of object tables
+            obj = obj[1]
+        return isinstance(obj, str) and user_arguments.match(obj)
 
     def get_description(self) -> str:
         return "This checks if the cell content contains a match for the given regular expression."
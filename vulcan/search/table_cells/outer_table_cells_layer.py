@@ -3,7 +3,7 @@ from typing import List, Any, Tuple
 
 from vulcan.data_handling.linguistic_objects.table import cell_coordinates_to_cell_name
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer, apply_to_elements
 
 
 class OuterTableCellsLayer(OuterSearchLayer):
@@ -17,28 +17,11 @@ class OuterTableCellsLayer(OuterSearchLayer):
         return "OuterTableCellsLayer"
 
     def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: List[List[Tuple]]):
-        # print(obj)
-        # TODO make different versions of this class for strings and tables
-        ret = []
-        for j, column in enumerate(obj):
-            for i, cell in enumerate(column):  # in row:
-                result = True
-                for inner_search_layer, user_args in zip(inner_search_layers, user_arguments):
-                    if inner_search_layer.apply(cell, user_args):
-                        pass
-                    else:
-                        result = False
-                        break
-                        # print(cell, inner_search_layer.get_label(), user_args)
-                if result:
-                    print("len obj", len(obj))
-                    print("len row", len(column))
-                    print(f"i: {i}, j: {j}, cell: {str(cell)}")
-                    ret.append(cell_coordinates_to_cell_name(i, j))
-        if len(ret) > 0:
-            return ret
-        else:
-            return None
+        return apply_to_elements(self.get_elements(obj), inner_search_layers, user_arguments)
+
+    def get_elements(self, obj: List[List[Tuple]]):
+        return [(cell, cell_coordinates_to_cell_name(i, j)) for j, column in enumerate(obj)
+                for i, cell in enumerate(column)]
 
 
 class InnerTableCellsLayer(InnerSearchLayer, ABC):
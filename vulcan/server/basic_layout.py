@@ -1,3 +1,5 @@
+import itertools
+import uuid
 from typing import List, Any, Optional
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
@@ -8,10 +10,16 @@ from vulcan.data_handling.data_corpus import CorpusSlice
 from vulcan.data_handling.visualization_type import VisualizationType
 
 
+_layout_id_counter = itertools.count()
+
 
 class BasicLayout:
 
-    def __init__(self, slices, linkers, corpus_size):
+    def __init__(self, slices, linkers, corpus_size, corpus_version: str = None):
+        """
+        :param corpus_version: Identifies the content of the corpus, e.g. for HTTP caching: two layouts with the same
+            version must have the same instances. Per default, a new random version.
+        """
         self.layout: List[List[CorpusSlice]] = []
         last_active_row = []
         self.layout.append(last_active_row)
@@ -27,15 +35,19 @@ class BasicLayout:
                 last_active_row.append(slice)
         if [] in self.layout:
             self.layout.remove([])  # if last_active_row is still empty, we remove it
+        self.slices_by_name = {slc.name: slc for row in self.layout for slc in row}
         self.linkers = linkers
         self.corpus_size = corpus_size
+        # search indices are built on demand by the search and kept as long as this layout, see
+        #  vulcan.search.search_index
+        self.search_indices = {}
+        # unique for each layout object, e.g. to tell apart instances of different search results
+        self.layout_id = next(_layout_id_counter)
+        self.corpus_version = corpus_version if corpus_version is not None else uuid.uuid4().hex
 
     def get_visualization_type_for_slice_name(self, slice_name: str) -> Optional[VisualizationType]:
-        for row in self.layout:
-            for slc in row:
-                if slc.name == slice_name:
-                    return slc.visualization_type
-        return None
+        slc = self.slices_by_name.get(slice_name)
+        return slc.visualization_type if slc is not None else None
 
 
 def get_slice_screen_width(corpus_slice: CorpusSlice) -> float:
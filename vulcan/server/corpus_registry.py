@@ -0,0 +1,164 @@
+import html
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List
+from urllib.parse import quote
+
+from eventlet import tpool
+from eventlet.event import Event
+
+from vulcan.corpus_cache import CACHE_FILE_SUFFIX
+from vulcan.data_handling.indexed_corpus_store import is_indexed_corpus_file
+from vulcan.data_handling.instance_readers.instance_reader_registry import clear_label_conversion_cache
+from vulcan.server.basic_layout import BasicLayout
+
+# Files in a corpus directory with these extensions are served as corpora, as are indexed corpus files (see
+#  vulcan.data_handling.indexed_corpus_store) with any name.
+CORPUS_FILE_EXTENSIONS = (".pickle", ".pkl", ".json")
+
+DEFAULT_MAX_LOADED_SIZE = 1024 * 1024 * 1024  # 1 GB
+
+CORPUS_PATH_PREFIX = "/corpus/"
+
+# The key under which CorpusPathMiddleware stores the name of the requested corpus in the WSGI environ.
+CORPUS_NAME_ENVIRON_KEY = "vulcan.corpus_name"
+
+
+class CorpusRegistry:
+    """
+    The corpora in a directory, each one loaded when the first client opens it. Corpora that no client has open are
+    unloaded again (least recently used first) when the loaded corpora take up too much memory. The memory use of a
+    corpus is estimated by the size of its input file.
+
+    Corpora are loaded in a separate thread, so that the server keeps serving the other corpora meanwhile. Only the
+    green thread that asked for the corpus waits (see acquire).
+    """
+
+    def __init__(self, directory: str, load_layout: Callable[[str], BasicLayout],
+                 max_loaded_size: int = DEFAULT_MAX_LOADED_SIZE):
+        """
+        :param directory: The directory with the corpus files. Corpora are named after their file names (e.g.
+            'amr.pickle'). Files added later are found as well.
+        :param load_layout: Function that loads the layout from the path of a corpus file.
+        :param max_loaded_size: The maximum total size of the input files of the loaded corpora, in bytes. Corpora
+            that clients have open are never unloaded, so this can be exceeded when they are many.
+        """
+        self.directory = directory
+        self.load_layout = load_layout
+        self.max_loaded_size = max_loaded_size
+        # name -> layout, least recently used first
+        self.loaded_layouts: Dict[str, BasicLayout] = OrderedDict()
+        self.loaded_sizes: Dict[str, int] = {}
+        self.user_counts: Dict[str, int] = {}
+        # name -> event that is sent when the corpus is loaded (or failed to load), for the corpora being loaded
+        self.loading_events: Dict[str, Event] = {}
+
+    def get_corpus_names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.directory) if self.has_corpus(name))
+
+    def has_corpus(self, name: str) -> bool:
+        if name.startswith(".") or os.sep in name or name.endswith(CACHE_FILE_SUFFIX):
+            return False
+        path = os.path.join(self.directory, name)
+        if not os.path.isfile(path):
+            return False
+        return name.endswith(CORPUS_FILE_EXTENSIONS) or is_indexed_corpus_file(path)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.loaded_layouts
+
+    def acquire(self, name: str) -> BasicLayout:
+        """
+        :return: The layout of the corpus, which is loaded if necessary. It stays loaded until release is called
+            (as often as acquire). While the corpus is loading, this waits (letting other green threads run); several
+            green threads that acquire the same corpus wait for the same load.
+        :raises KeyError: If there is no corpus with this name.
+        :raises Exception: Whatever loading the corpus raised.
+        """
+        # a loop, since the corpus could be unloaded again before a waiting green thread continues
+        while name not in self.loaded_layouts:
+            if name in self.loading_events:
+                self.loading_events[name].wait()  # raises the exception of the load, if it failed
+            else:
+                if not self.has_corpus(name):
+                    raise KeyError(name)
+                self._load(name)
+        self.loaded_layouts.move_to_end(name)
+        self.user_counts[name] = self.user_counts.get(name, 0) + 1
+        self._unload_unused_corpora()
+        return self.loaded_layouts[name]
+
+    def _load(self, name: str):
+        path = os.path.join(self.directory, name)
+        print(f"Loading corpus {name}")
+        loading_event = self.loading_events[name] = Event()
+        try:
+            layout = tpool.execute(self.load_layout, path)
+        except Exception as e:
+            del self.loading_events[name]
+            loading_event.send_exception(e)
+            raise
+        self.loaded_layouts[name] = layout
+        self.loaded_sizes[name] = os.path.getsize(path)
+        del self.loading_events[name]
+        loading_event.send(layout)
+
+    def release(self, name: str):
+        self.user_counts[name] -= 1
+        if self.user_counts[name] == 0:
+            del self.user_counts[name]
+        self._unload_unused_corpora()
+
+    def get_loaded_size(self) -> int:
+        return sum(self.loaded_sizes.values())
+
+    def _unload_unused_corpora(self):
+        unloaded = False
+        for name in list(self.loaded_layouts):
+            if self.get_loaded_size() <= self.max_loaded_size:
+                break
+            if name not in self.user_counts:
+                print(f"Unloading corpus {name}")
+                del self.loaded_layouts[name]
+                del self.loaded_sizes[name]
+                unloaded = True
+        if unloaded:
+            # the cache would otherwise keep labels of the unloaded corpora in memory
+            clear_label_conversion_cache()
+
+
+class CorpusPathMiddleware:
+    """
+    WSGI middleware that serves the client for each corpus of a CorpusRegistry under /corpus/<name>/, and a list of
+    all corpora under /. The client then opens the corpus by passing its name in the 'corpus' query parameter when
+    connecting.
+    """
+
+    def __init__(self, app, registry: CorpusRegistry):
+        self.app = app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path in ["", "/"]:
+            return self._send_corpus_list(start_response)
+        if path.startswith(CORPUS_PATH_PREFIX):
+            # PATH_INFO is already URL-decoded
+            name, slash, rest = path[len(CORPUS_PATH_PREFIX):].partition("/")
+            if not self.registry.has_corpus(name):
+                start_response("404 Not Found", [("Content-Type", "text/plain")])
+                return [f"Unknown corpus {name}".encode("utf-8")]
+            if not slash:
+                # the client loads its scripts with relative paths, which need the trailing slash
+                start_response("301 Moved Permanently", [("Location", CORPUS_PATH_PREFIX + quote(name) + "/")])
+                return [b""]
+            environ = dict(environ, PATH_INFO="/" + rest, **{CORPUS_NAME_ENVIRON_KEY: name})
+        return self.app(environ, start_response)
+
+    def _send_corpus_list(self, start_response):
+        links = "".join(f'<li><a href="{CORPUS_PATH_PREFIX}{quote(name)}/">{html.escape(name)}</a></li>'
+                        for name in self.registry.get_corpus_names())
+        page = f"<!DOCTYPE html><html><head><title>VULCAN corpora</title></head>" \
+               f"<body><h1>Corpora</h1><ul>{links}</ul></body></html>"
+        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+        return [page.encode("utf-8")]
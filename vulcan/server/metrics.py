@@ -0,0 +1,242 @@
+"""
+Metrics about the server, in the Prometheus text format (see
+https://prometheus.io/docs/instrumenting/exposition_formats/), served under /metrics by MetricsMiddleware.
+
+The metrics in DEFAULT_REGISTRY (event latencies, errors, corpus loading times) are recorded wherever the work
+happens; metrics about the current state of a server (connected clients, cache sizes, ...) are computed when they are
+requested (see CollectedMetric). With several server processes (see vulcan.server.worker_processes), each process has
+its own metrics, and each request to /metrics is answered by one of them; every sample then has a worker label with
+the process ID of that process, so that the series of different processes are kept apart (sum them over the worker
+label to get the values for the whole server).
+"""
+
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+METRICS_PATH = "/metrics"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the histogram buckets, in seconds (the defaults of the Prometheus client libraries).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Loading a corpus can take minutes.
+CORPUS_LOAD_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class Counter:
+    """
+    A value that only goes up, e.g. the number of errors, for each combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, constant_labels: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        lines = _render_header(self.name, self.documentation, "counter")
+        for label_values, value in self.values.items():
+            lines.append(_render_sample(self.name, self.label_names, label_values, value, constant_labels))
+        return lines
+
+
+class Histogram:
+    """
+    The distribution of observed values, e.g. durations, for each combination of label values: how many values were
+    at most as large as each bucket bound, and the number and sum of all values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (count of the values in each bucket (not cumulative, the last one is +Inf), sum of values)
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        bucket_counts, total = self.values.get(label_values, (None, 0.0))
+        if bucket_counts is None:
+            bucket_counts = [0] * (len(self.buckets) + 1)
+        bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values[label_values] = (bucket_counts, total + value)
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """
+        Observes the time in seconds that the with block takes (also if it raises an exception).
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, *label_values)
+
+    def render(self, constant_labels: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        lines = _render_header(self.name, self.documentation, "histogram")
+        label_names = self.label_names + ("le",)
+        for label_values, (bucket_counts, total) in self.values.items():
+            cumulative_count = 0
+            for bound, count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative_count += count
+                lines.append(_render_sample(self.name + "_bucket", label_names,
+                                            label_values + (_format_value(bound),), cumulative_count,
+                                            constant_labels))
+            lines.append(_render_sample(self.name + "_sum", self.label_names, label_values, total, constant_labels))
+            lines.append(_render_sample(self.name + "_count", self.label_names, label_values, cumulative_count,
+                                        constant_labels))
+        return lines
+
+
+class CollectedMetric:
+    """
+    A metric whose values are computed by a function whenever the metrics are requested, e.g. from the state of the
+    server.
+    """
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Dict[Tuple[str, ...], float]],
+                 label_names: Sequence[str] = (), metric_type: str = "gauge"):
+        """
+        :param collect: Returns the current value for each combination of label values (use the key () if there
+            are no labels).
+        :param metric_type: "gauge" or "counter" (e.g. for counts that another object keeps).
+        """
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.label_names = tuple(label_names)
+        self.metric_type = metric_type
+
+    def render(self, constant_labels: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        lines = _render_header(self.name, self.documentation, self.metric_type)
+        for label_values, value in self.collect().items():
+            lines.append(_render_sample(self.name, self.label_names, label_values, value, constant_labels))
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        :return: metric, so that registering can be combined with creating it.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, constant_labels: Sequence[Tuple[str, str]] = ()) -> str:
+        """
+        :param constant_labels: (label name, label value) pairs to add to every sample.
+        """
+        return "".join(line + "\n" for metric in self.metrics for line in metric.render(constant_labels))
+
+
+class Stopwatch:
+    """
+    Adds up the time spent in several with blocks, e.g. for work that is interleaved with other work.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed += time.perf_counter() - self._start_time
+
+    def time_iteration(self, iterable: Iterable) -> Iterator:
+        """
+        :return: The items of iterable; the time spent producing them is added to this stopwatch.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+DEFAULT_REGISTRY = MetricsRegistry()
+
+EVENT_DURATION = DEFAULT_REGISTRY.register(Histogram(
+    "vulcan_event_duration_seconds",
+    "Time spent handling client events, by event and phase of the handling.",
+    ["event", "phase"]))
+EVENT_ERRORS = DEFAULT_REGISTRY.register(Counter(
+    "vulcan_event_errors_total",
+    "Client events whose handling failed with an unexpected error.",
+    ["event"]))
+CORPUS_LOAD_DURATION = DEFAULT_REGISTRY.register(Histogram(
+    "vulcan_corpus_load_duration_seconds",
+    "Time spent loading corpora, by how they were loaded (from the input file, from the corpus cache, or by"
+    " reloading only the changed instances).",
+    ["source"], buckets=CORPUS_LOAD_BUCKETS))
+
+
+class MetricsMiddleware:
+    """
+    WSGI middleware that serves the metrics of the given registries under /metrics, and passes all other requests
+    on to app.
+    """
+
+    def __init__(self, app, registries: List[MetricsRegistry], worker_label: bool = False):
+        """
+        :param worker_label: Whether to add the label worker="<process ID>" to every sample, for servers with several
+            processes.
+        """
+        self.app = app
+        self.registries = registries
+        self.worker_label = worker_label
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "") != METRICS_PATH:
+            return self.app(environ, start_response)
+        # the process ID is looked up here, since the worker processes are forked after the middleware is created
+        constant_labels = (("worker", str(os.getpid())),) if self.worker_label else ()
+        data = "".join(registry.render(constant_labels) for registry in self.registries).encode("utf-8")
+        start_response("200 OK", [("Content-Type", METRICS_CONTENT_TYPE), ("Content-Length", str(len(data)))])
+        return [data]
+
+
+def _render_header(name: str, documentation: str, metric_type: str) -> List[str]:
+    return [f"# HELP {name} {_escape(documentation)}", f"# TYPE {name} {metric_type}"]
+
+
+def _render_sample(name: str, label_names: Sequence[str], label_values: Sequence[str], value: float,
+                   constant_labels: Sequence[Tuple[str, str]] = ()) -> str:
+    label_pairs = list(zip(label_names, label_values)) + list(constant_labels)
+    if len(label_pairs) == 0:
+        return f"{name} {_format_value(value)}"
+    labels = ",".join(f'{label_name}="{_escape_label_value(str(label_value))}"'
+                      for label_name, label_value in label_pairs)
+    return f"{name}{{{labels}}} {_format_value(value)}"
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label_value(text: str) -> str:
+    return _escape(text).replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
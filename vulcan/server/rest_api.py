@@ -0,0 +1,175 @@
+"""
+A read-only HTTP/JSON API next to the socket.io interface, e.g. for scripts, load tests, and HTTP caches:
+
+GET  /api/layout         The layout (as in the set_layout message), the corpus length and the possible search filters.
+GET  /api/instance/<i>   Instance i of the corpus, as in the set_instance message, but without its layout_id.
+POST /api/search         Searches the corpus. The body is a list of search filters, as in the perform_search message.
+                         Returns the number of matches, their instance ids and, for each match and filter, the names
+                         of the nodes that the filter found.
+
+GET responses have an ETag based on the corpus version (see BasicLayout.corpus_version), so browsers and reverse
+proxies can cache them and revalidate them cheaply. The responses must therefore only depend on the corpus version
+(and not, e.g., on the layout_id, which differs between server runs and processes). Bytes (e.g. the data of dense
+linker scores) are base64-encoded. With a corpus registry, the API of each corpus is under /corpus/<name>/api/.
+"""
+
+import base64
+import json
+import logging
+from typing import Any, Optional, Tuple
+
+from vulcan.search.inner_search_layer import SearchArgumentError
+from vulcan.search.search import get_search_cache_key, create_list_of_possible_search_filters, \
+    search_layout_in_batches, create_search_result_layout
+from vulcan.server.basic_layout import BasicLayout
+from vulcan.server.corpus_registry import CORPUS_NAME_ENVIRON_KEY
+
+logger = logging.getLogger(__name__)
+
+API_PATH_PREFIX = "/api/"
+
+# Responses may be stored, but must be revalidated (which is cheap with the ETag), since the corpus can change
+#  (see vulcan.corpus_reload).
+API_CACHE_CONTROL = "public, no-cache"
+
+
+class HttpError(Exception):
+
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RestApiMiddleware:
+    """
+    WSGI middleware that answers the requests under /api/ (see above), using the corpus and caches of a Server, and
+    passes all other requests on to app.
+    """
+
+    def __init__(self, app, server):
+        """
+        :param server: The vulcan.server.server.Server whose corpus is served.
+        """
+        self.app = app
+        self.server = server
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if not path.startswith(API_PATH_PREFIX):
+            return self.app(environ, start_response)
+        corpus_name = environ.get(CORPUS_NAME_ENVIRON_KEY)
+        try:
+            layout = self._acquire_layout(corpus_name)
+            try:
+                status, body, etag = self._handle(environ, path[len(API_PATH_PREFIX):], layout)
+            finally:
+                self._release_layout(corpus_name)
+        except HttpError as e:
+            status, body, etag = e.status, {"error": str(e)}, None
+        except Exception as e:
+            logger.exception(e)
+            status, body, etag = "500 Internal Server Error", {"error": "Internal server error"}, None
+        headers = [("Content-Type", "application/json")]
+        if etag is not None:
+            headers += [("ETag", etag), ("Cache-Control", API_CACHE_CONTROL)]
+            if etag in _parse_if_none_match(environ.get("HTTP_IF_NONE_MATCH")):
+                start_response("304 Not Modified", headers[1:])
+                return [b""]
+        data = json.dumps(body, default=_encode_json_default).encode("utf-8")
+        start_response(status, headers + [("Content-Length", str(len(data)))])
+        return [data]
+
+    def _handle(self, environ, route: str, layout: BasicLayout) -> Tuple[str, Any, Optional[str]]:
+        """
+        :return: The status, the response body (to be encoded as JSON), and the ETag (or None if the response must
+            not be cached).
+        """
+        method = environ.get("REQUEST_METHOD", "GET")
+        if route == "layout":
+            _check_method(method, "GET")
+            from vulcan.server.server import make_layout_sendable  # here, since vulcan.server.server imports us
+            body = {"layout": make_layout_sendable(layout), "corpus_length": layout.corpus_size,
+                    "search_filters": create_list_of_possible_search_filters(layout)}
+            return "200 OK", body, _make_etag(layout, "layout")
+        if route.startswith("instance/"):
+            _check_method(method, "GET")
+            try:
+                instance_id = int(route[len("instance/"):])
+            except ValueError:
+                raise HttpError("404 Not Found", f"Invalid instance id {route[len('instance/'):]}")
+            if not 0 <= instance_id < layout.corpus_size:
+                raise HttpError("404 Not Found", f"Instance {instance_id} does not exist")
+            # a copy, since the payload is cached
+            body = {key: value for key, value in self.server.get_instance_payload(layout, instance_id).items()
+                    if key != "layout_id"}
+            return "200 OK", body, _make_etag(layout, f"instance{instance_id}")
+        if route == "search":
+            _check_method(method, "POST")
+            return "200 OK", self._search(layout, _read_json_body(environ)), None
+        raise HttpError("404 Not Found", f"Unknown API path {route}")
+
+    def _search(self, layout: BasicLayout, data: Any) -> Any:
+        from vulcan.server.server import get_search_filters_from_data  # here, since vulcan.server.server imports us
+        try:
+            filters_key, filters = get_search_cache_key(get_search_filters_from_data(data))
+        except (KeyError, TypeError) as e:
+            raise HttpError("400 Bad Request", f"Invalid search filters: {e}")
+        except SearchArgumentError as e:
+            raise HttpError("400 Bad Request", str(e))
+        cache_key = (layout.layout_id, filters_key)
+        matches = self.server.search_result_cache.get(cache_key)
+        if matches is None:
+            try:
+                search_batches = search_layout_in_batches(layout, filters, workers=self.server.search_workers)
+            except SearchArgumentError as e:
+                raise HttpError("400 Bad Request", str(e))
+            search_result = create_search_result_layout(layout, filters)
+            for matching_indices, node_names in search_batches:
+                search_result.add_matches(matching_indices, node_names)
+                self.server.sio.sleep(0)  # let the server handle other requests in between
+            matches = search_result.matches
+            self.server.search_result_cache.put(cache_key, matches)
+        return {"match_count": len(matches),
+                "instance_ids": list(matches.indices),
+                "node_names": [matches.node_names_by_position.get(position, [[] for _ in filters])
+                               for position in range(len(matches))]}
+
+    def _acquire_layout(self, corpus_name: Optional[str]) -> BasicLayout:
+        if corpus_name is None:
+            if self.server.basic_layout is None:
+                raise HttpError("404 Not Found", "This server shows several corpora, use /corpus/<name>/api/")
+            return self.server.basic_layout
+        return self.server.corpus_registry.acquire(corpus_name)
+
+    def _release_layout(self, corpus_name: Optional[str]):
+        if corpus_name is not None:
+            self.server.corpus_registry.release(corpus_name)
+
+
+def _check_method(method: str, expected: str):
+    if method != expected:
+        raise HttpError("405 Method Not Allowed", f"Use {expected} for this API path")
+
+
+def _read_json_body(environ) -> Any:
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        return json.loads(environ["wsgi.input"].read(length))
+    except ValueError as e:
+        raise HttpError("400 Bad Request", f"Invalid JSON body: {e}")
+
+
+def _make_etag(layout: BasicLayout, resource: str) -> str:
+    return f'"{layout.corpus_version}-{resource}"'
+
+
+def _parse_if_none_match(header: Optional[str]) -> list:
+    if header is None:
+        return []
+    return [tag.strip() for tag in header.split(",")]
+
+
+def _encode_json_default(obj: Any) -> Any:
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(obj).decode("ascii")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
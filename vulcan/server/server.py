@@ -1,18 +1,35 @@
-from typing import List, Dict, Set, Tuple, Any, Union
+import bisect
+import itertools
+import time
+from collections import OrderedDict
+from typing import List, Dict, Set, Tuple, Any, Union, Iterator, Optional
+from urllib.parse import parse_qs
 
 import socketio
-from eventlet import wsgi
+from eventlet import tpool, wsgi
 
 import vulcan.search
+from vulcan.corpus_reload import CorpusReloader
 from vulcan.file_loader import create_layout_from_filepath
-from vulcan.search.search import SearchFilter, perform_search_on_layout, create_list_of_possible_search_filters
+from vulcan.search.inner_search_layer import SearchArgumentError
+from vulcan.search.search import SearchFilter, create_list_of_possible_search_filters, search_layout_in_batches, \
+    create_search_result_layout, get_search_cache_key
+from vulcan.search.search_result import SearchResultLayout, update_search_matches
+from vulcan.parallel import can_fork
+from vulcan.search.search_result_cache import SearchResultCache, DEFAULT_SEARCH_CACHE_MEMORY
 from vulcan.data_handling.data_corpus import CorpusSlice
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import make_sendable
 from vulcan.data_handling.linguistic_objects.graphs.penman_converter import from_penman_graph
 from vulcan.data_handling.linguistic_objects.table import cell_coordinates_to_cell_name
 import eventlet
 
 from vulcan.data_handling.visualization_type import VisualizationType
 from vulcan.server.basic_layout import BasicLayout
+from vulcan.server.corpus_registry import CorpusRegistry, CorpusPathMiddleware
+from vulcan.server.metrics import MetricsMiddleware, MetricsRegistry, CollectedMetric, Stopwatch, DEFAULT_REGISTRY, \
+    EVENT_DURATION, EVENT_ERRORS
+from vulcan.server.rest_api import RestApiMiddleware
+from vulcan.server.worker_processes import run_worker_processes
 import logging
 
 eventlet.monkey_patch()
@@ -20,6 +37,17 @@ eventlet.monkey_patch()
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+# Minimum time in seconds between two search_progress messages for the same search.
+SEARCH_PROGRESS_INTERVAL = 0.25
+
+# Number of prepared instance payloads (see make_instance_payload) that the server keeps.
+INSTANCE_PAYLOAD_CACHE_SIZE = 256
+# Maximum number of instances a client can prefetch with one message.
+MAX_PREFETCH_COUNT = 20
+
+# With a corpus reloader, the time in seconds between two checks whether the input file changed.
+WATCH_INTERVAL = 2.0
+
 
 def transform_string_maps_to_table_maps(highlights: Dict[int, Union[str, List[str]]],
                                         label_alternatives_by_node_name: Dict[int, Dict[str, Any]]):
@@ -32,162 +60,600 @@ def transform_string_maps_to_table_maps(highlights: Dict[int, Union[str, List[st
 
 class Server:
 
-    def __init__(self, layout: BasicLayout, port=5050, address="localhost", show_node_names=False):
+    def __init__(self, layout: Optional[BasicLayout], port=5050, address="localhost", show_node_names=False,
+                 search_workers=1, search_cache_memory=DEFAULT_SEARCH_CACHE_MEMORY, processes=1,
+                 corpus_registry: CorpusRegistry = None, corpus_reloader: CorpusReloader = None):
+        """
+        :param layout: The corpus to show. Must be None if corpus_registry is given.
+        :param processes: Number of server processes (see start). With more than one, clients must connect via
+            websockets, since the HTTP long-polling requests of one client could reach different processes. Not
+            supported with corpus_registry or corpus_reloader, since each process would load its own copy of the
+            corpora.
+        :param corpus_registry: If given, the server shows all corpora of the registry, each under
+            /corpus/<name>/ (see CorpusPathMiddleware), instead of a single corpus.
+        :param corpus_reloader: If given, the server watches the input file of layout (which must be the one loaded
+            by corpus_reloader), and updates the corpus whenever the file changes (see watch_input_file).
+        """
 
+        if processes > 1 and not can_fork():
+            print("WARNING: multiple server processes are not supported on this system, using a single process.")
+            processes = 1
+        if processes > 1 and (corpus_registry is not None or corpus_reloader is not None):
+            print("WARNING: multiple server processes are not supported when serving a directory of corpora or"
+                  " watching the input file, using a single process.")
+            processes = 1
         self.port = port
+        self.processes = processes
         self.address = address
+        self.search_workers = search_workers
         self.current_layouts_by_sid = {}
+        # the corpus that each client has open, without any search applied
+        self.basic_layouts_by_sid = {}
+        # with a corpus registry, the name of the corpus that each client has open, and of the corpus that each client
+        #  is still waiting for (while it is loading, see open_registry_corpus)
+        self.corpus_names_by_sid = {}
+        self.pending_corpus_names_by_sid = {}
+        # the instance that each client currently shows, and the (filters_key, filters) of its search (if any), see
+        #  replace_basic_layout
+        self.positions_by_sid = {}
+        self.search_filters_by_sid = {}
+        # the id of the search that is currently running for each client (if any). Searches check this to notice that
+        #  they were cancelled.
+        self.search_job_ids_by_sid = {}
+        self._search_job_id_counter = itertools.count()
+        # matches of completed searches, by layout id and search filters, shared by all clients
+        self.search_result_cache = SearchResultCache(search_cache_memory)
+        # (layout id, instance id) -> payload for set_instance. An LRU cache, see get_instance_payload
+        self.instance_payload_cache = OrderedDict()
         self.basic_layout = layout
+        self.corpus_registry = corpus_registry
+        self.corpus_reloader = corpus_reloader
 
         def on_connect(sid, environ):
+            corpus_name = None
+            if self.corpus_registry is not None:
+                corpus_name = parse_qs(environ.get("QUERY_STRING", "")).get("corpus", [None])[0]
+                if corpus_name is None or not self.corpus_registry.has_corpus(corpus_name):
+                    raise socketio.exceptions.ConnectionRefusedError(f"Unknown corpus {corpus_name}")
+            print(sid, 'connected')
+            if corpus_name is not None:
+                self.pending_corpus_names_by_sid[sid] = corpus_name
+                if not self.corpus_registry.is_loaded(corpus_name):
+                    self.sio.emit('corpus_loading', {"corpus": corpus_name}, to=sid)
+                # loading the corpus can take minutes, so it must not block the handling of other events
+                self.sio.start_background_task(open_registry_corpus, sid, corpus_name, time.perf_counter())
+                return
+            with EVENT_DURATION.time("connect", "total"):
+                try:
+                    show_corpus(sid, self.basic_layout)
+                except Exception as e:
+                    EVENT_ERRORS.inc("connect")
+                    logger.exception(e)
+                    self.sio.emit("server_error", to=sid)
+
+        def open_registry_corpus(sid, corpus_name, start_time):
+            """
+            Loads the registry corpus that the client connected for (if necessary), and then shows it to the client.
+            """
             try:
-                print(sid, 'connected')
-                self.current_layouts_by_sid[sid] = self.basic_layout
-                self.sio.emit('set_layout', make_layout_sendable(self.basic_layout), to=sid)
-                self.sio.emit('set_corpus_length', self.basic_layout.corpus_size, to=sid)
-                self.sio.emit('set_show_node_names', {"show_node_names": show_node_names}, to=sid)
-                # print("sending search filters", create_list_of_possible_search_filters(self.basic_layout))
-                self.sio.emit('set_search_filters', create_list_of_possible_search_filters(self.basic_layout), to=sid)
-                instance_requested(sid, 0)
+                with EVENT_DURATION.time("connect", "load_corpus"):
+                    basic_layout = self.corpus_registry.acquire(corpus_name)
+                if self.pending_corpus_names_by_sid.pop(sid, None) is None:
+                    # the client disconnected while the corpus was loading
+                    self.corpus_registry.release(corpus_name)
+                    return
+                self.corpus_names_by_sid[sid] = corpus_name
+                show_corpus(sid, basic_layout)
+                EVENT_DURATION.observe(time.perf_counter() - start_time, "connect", "total")
             except Exception as e:
+                EVENT_ERRORS.inc("connect")
                 logger.exception(e)
-                self.sio.emit("server_error", to=sid)
+                if self.pending_corpus_names_by_sid.pop(sid, None) is not None or sid in self.corpus_names_by_sid:
+                    self.sio.emit("server_error", to=sid)
+
+        def show_corpus(sid, basic_layout: BasicLayout):
+            self.basic_layouts_by_sid[sid] = basic_layout
+            self.current_layouts_by_sid[sid] = basic_layout
+            self.sio.emit('set_layout', make_layout_sendable(basic_layout), to=sid)
+            self.sio.emit('set_corpus_length', basic_layout.corpus_size, to=sid)
+            self.sio.emit('set_show_node_names', {"show_node_names": show_node_names}, to=sid)
+            # print("sending search filters", create_list_of_possible_search_filters(basic_layout))
+            self.sio.emit('set_search_filters', create_list_of_possible_search_filters(basic_layout), to=sid)
+            instance_requested(sid, 0)
 
         def on_disconnect(sid):
             print(sid, 'disconnected')
-            self.current_layouts_by_sid.pop(sid)  # avoiding a memory leak
+            # avoiding a memory leak (the entries are missing if the corpus could not be loaded)
+            self.current_layouts_by_sid.pop(sid, None)
+            self.basic_layouts_by_sid.pop(sid, None)
+            self.search_job_ids_by_sid.pop(sid, None)  # cancels a running search
+            self.positions_by_sid.pop(sid, None)
+            self.search_filters_by_sid.pop(sid, None)
+            self.pending_corpus_names_by_sid.pop(sid, None)  # see open_registry_corpus
+            corpus_name = self.corpus_names_by_sid.pop(sid, None)
+            if corpus_name is not None:
+                self.corpus_registry.release(corpus_name)
 
-        self.sio = socketio.Server(async_mode='eventlet')
+        # Large messages are compressed: with HTTP long-polling by engine.io (http_compression), and over websockets by
+        #  eventlet's permessage-deflate support, which browsers negotiate automatically.
+        self.sio = socketio.Server(async_mode='eventlet', http_compression=True,
+                                   transports=['websocket'] if processes > 1 else None)
         self.sio.on("connect", on_connect)
         self.sio.on("disconnect", on_disconnect)
         self.app = socketio.WSGIApp(self.sio, static_files={
             '/': './vulcan/client/'
         })
+        self.app = RestApiMiddleware(self.app, self)
+        # metrics about the current state of this server, in addition to the ones recorded while handling events
+        self.metrics_registry = MetricsRegistry()
+        self._register_metrics()
+        self.app = MetricsMiddleware(self.app, [DEFAULT_REGISTRY, self.metrics_registry],
+                                     worker_label=processes > 1)
+        if self.corpus_registry is not None:
+            self.app = CorpusPathMiddleware(self.app, self.corpus_registry)
 
         @self.sio.event
         def instance_requested(sid, data):
             try:
-                if self.current_layouts_by_sid[sid].corpus_size > 0:
+                with EVENT_DURATION.time("instance_requested", "lookup"):
+                    layout = self.current_layouts_by_sid[sid]
+                if layout.corpus_size > 0:
                     instance_id = data
-                    for row in self.current_layouts_by_sid[sid].layout:
-                        for corpus_slice in row:
-                            if corpus_slice.label_alternatives is not None:
-                                label_alternatives_by_node_name = corpus_slice.label_alternatives[instance_id]
-                            else:
-                                label_alternatives_by_node_name = None
-                            if corpus_slice.highlights is not None:
-                                highlights = corpus_slice.highlights[instance_id]
-                            else:
-                                highlights = None
-                            if corpus_slice.mouseover_texts is not None:
-                                mouseover_texts = corpus_slice.mouseover_texts[instance_id]
-                            else:
-                                mouseover_texts = None
-                            if corpus_slice.dependency_trees is not None:
-                                dependency_tree = corpus_slice.dependency_trees[instance_id]
-                            else:
-                                dependency_tree = None
-                            if corpus_slice.visualization_type == VisualizationType.STRING:
-                                self.send_string(corpus_slice.name,
-                                                 corpus_slice.instances[instance_id],
-                                                 sid,
-                                                 label_alternatives_by_node_name,
-                                                 highlights,
-                                                 dependency_tree)
-                            elif corpus_slice.visualization_type == VisualizationType.TABLE:
-                                self.send_string_table(corpus_slice.name,
-                                                       corpus_slice.instances[instance_id],
-                                                       sid,
-                                                       label_alternatives_by_node_name,
-                                                       highlights,
-                                                       dependency_tree)
-                            elif corpus_slice.visualization_type == VisualizationType.TREE:
-                                # trees are just graphs without reentrancies
-                                self.send_graph(corpus_slice.name, corpus_slice.instances[instance_id],
-                                                sid,
-                                                label_alternatives_by_node_name,
-                                                highlights)
-                            elif corpus_slice.visualization_type == VisualizationType.GRAPH:
-                                self.send_graph(corpus_slice.name, corpus_slice.instances[instance_id],
-                                                sid,
-                                                label_alternatives_by_node_name,
-                                                highlights, mouseover_texts)
-                    for linker in self.current_layouts_by_sid[sid].linkers:
-                        self.send_linker(linker["name1"], linker["name2"], linker["scores"][instance_id], sid)
+                    if not 0 <= instance_id < layout.corpus_size:
+                        # can happen when the request was sent before the client learned about a new search
+                        return
+                    self.positions_by_sid[sid] = instance_id
+                    with EVENT_DURATION.time("instance_requested", "payload"):
+                        payload = self.get_instance_payload(layout, instance_id)
+                    with EVENT_DURATION.time("instance_requested", "emit"):
+                        self.sio.emit('set_instance', payload, to=sid)
                 else:
                     print("No instances in corpus")
             except Exception as e:
+                EVENT_ERRORS.inc("instance_requested")
                 logger.exception(e)
                 self.sio.emit("server_error", to=sid)
 
+        @self.sio.event
+        def instance_prefetch_requested(sid, data):
+            """
+            data is a list of instance ids that the client wants to have ready before the user navigates there.
+            """
+            try:
+                layout = self.current_layouts_by_sid[sid]
+                payloads = []
+                for instance_id in data[:MAX_PREFETCH_COUNT]:
+                    if 0 <= instance_id < layout.corpus_size:
+                        with EVENT_DURATION.time("instance_prefetch_requested", "payload"):
+                            payloads.append(self.get_instance_payload(layout, instance_id))
+                        self.sio.sleep(0)  # preparing an instance can take a while, e.g. with lazy conversion
+                if len(payloads) > 0:
+                    with EVENT_DURATION.time("instance_prefetch_requested", "emit"):
+                        self.sio.emit('instances_prefetched', payloads, to=sid)
+            except Exception as e:
+                EVENT_ERRORS.inc("instance_prefetch_requested")
+                # prefetching is optional, the client will request the instance again when needed
+                logger.exception(e)
+
+        @self.sio.event
+        def instance_shown(sid, data):
+            """
+            The client shows the instance with id data, which it had prefetched (so it did not request it).
+            """
+            self.positions_by_sid[sid] = data
+
         @self.sio.event
         def perform_search(sid, data):
             try:
-                self.current_layouts_by_sid[sid] = perform_search_on_layout(self.basic_layout,
-                                                                            get_search_filters_from_data(data))
-                self.sio.emit('set_corpus_length', self.current_layouts_by_sid[sid].corpus_size, to=sid)
-                self.sio.emit('search_completed', None, to=sid)
+                with EVENT_DURATION.time("perform_search", "parse"):
+                    filters_key, filters = get_search_cache_key(get_search_filters_from_data(data))
+                self.start_search(sid, filters_key, filters)
+            except SearchArgumentError as e:
+                # the previous search result stays in place
+                self.sio.emit("search_error", str(e), to=sid)
             except Exception as e:
+                EVENT_ERRORS.inc("perform_search")
                 logger.exception(e)
                 self.sio.emit("server_error", to=sid)
 
         @self.sio.event
         def clear_search(sid):
             try:
-                self.current_layouts_by_sid[sid] = self.basic_layout
-                self.sio.emit('set_corpus_length', self.basic_layout.corpus_size, to=sid)
+                self.search_job_ids_by_sid.pop(sid, None)  # cancels a running search
+                self.search_filters_by_sid.pop(sid, None)
+                self.current_layouts_by_sid[sid] = self.basic_layouts_by_sid[sid]
+                self.sio.emit('set_corpus_length', self.basic_layouts_by_sid[sid].corpus_size, to=sid)
                 self.sio.emit('search_completed', None, to=sid)
             except Exception as e:
+                EVENT_ERRORS.inc("clear_search")
                 logger.exception(e)
                 self.sio.emit("server_error", to=sid)
 
+    def start_search(self, sid, filters_key, filters: List[SearchFilter]):
+        """
+        Starts searching the client's corpus (see run_search_job), or takes the matches from the search result cache.
+        The time spent on the search is recorded in the "scan" (finding the matches) and "build" (making the search
+        result layout) phases of the perform_search event (see vulcan.server.metrics); searches that are cancelled
+        before they complete are not recorded.
+        :param filters_key: The search filters, and their key, as returned by get_search_cache_key.
+        :raises SearchArgumentError: if a filter has invalid user arguments.
+        """
+        basic_layout = self.basic_layouts_by_sid[sid]
+        cache_key = (basic_layout.layout_id, filters_key)
+        job_id = next(self._search_job_id_counter)
+        cached_matches = self.search_result_cache.get(cache_key)
+        if cached_matches is not None:
+            self.search_job_ids_by_sid.pop(sid, None)  # cancels the previous search of this client
+            with EVENT_DURATION.time("perform_search", "build"):
+                search_result = create_search_result_layout(basic_layout, filters, cached_matches)
+            self.current_layouts_by_sid[sid] = search_result
+            self.search_filters_by_sid[sid] = (filters_key, filters)
+            self.sio.emit('search_started', {"job_id": job_id}, to=sid)
+            self.sio.emit('search_completed', {"job_id": job_id, "match_count": search_result.corpus_size},
+                          to=sid)
+            return
+        scan_stopwatch, build_stopwatch = Stopwatch(), Stopwatch()
+        with scan_stopwatch:
+            # this only validates the arguments, the search (including building search indices) runs in the
+            #  background
+            search_batches = search_layout_in_batches(basic_layout, filters, workers=self.search_workers)
+        self.search_job_ids_by_sid[sid] = job_id  # cancels the previous search of this client
+        with build_stopwatch:
+            search_result = create_search_result_layout(basic_layout, filters)
+        self.current_layouts_by_sid[sid] = search_result
+        self.search_filters_by_sid[sid] = (filters_key, filters)
+        self.sio.emit('search_started', {"job_id": job_id}, to=sid)
+        self.sio.start_background_task(self.run_search_job, sid, job_id, search_batches, search_result,
+                                       cache_key, scan_stopwatch, build_stopwatch)
+
+    def get_instance_payload(self, layout: BasicLayout, instance_id: int) -> Dict[str, Any]:
+        """
+        :return: make_instance_payload(layout, instance_id), from the payload cache if possible.
+        """
+        key = (layout.layout_id, instance_id)
+        payload = self.instance_payload_cache.get(key)
+        if payload is not None:
+            self.instance_payload_cache.move_to_end(key)
+            return payload
+        payload = make_instance_payload(layout, instance_id)
+        self.instance_payload_cache[key] = payload
+        while len(self.instance_payload_cache) > INSTANCE_PAYLOAD_CACHE_SIZE:
+            self.instance_payload_cache.popitem(last=False)
+        return payload
+
+    def run_search_job(self, sid, job_id: int, search_batches: Iterator[Tuple[List[int], List[List]]],
+                       search_result: SearchResultLayout, cache_key, scan_stopwatch: Stopwatch = None,
+                       build_stopwatch: Stopwatch = None):
+        """
+        Runs a search in the background (see perform_search). The matches are added to search_result (which the
+        client can already browse) batch by batch, and the client is informed about the progress. Stops as soon as
+        the client starts another search, clears the search or disconnects. The matches of completed searches are
+        stored in the search result cache under cache_key.
+        :param scan_stopwatch, build_stopwatch: The time spent on the search so far (see start_search).
+        """
+        def is_cancelled():
+            return self.search_job_ids_by_sid.get(sid) != job_id
+
+        scan_stopwatch = scan_stopwatch or Stopwatch()
+        build_stopwatch = build_stopwatch or Stopwatch()
+        try:
+            last_progress_time = time.time()
+            for matching_indices, node_names in scan_stopwatch.time_iteration(search_batches):
+                if is_cancelled():
+                    return
+                had_matches = search_result.corpus_size > 0
+                with build_stopwatch:
+                    search_result.add_matches(matching_indices, node_names)
+                # report the first matches right away, so that the client can show them
+                if (search_result.corpus_size > 0 and not had_matches) \
+                        or time.time() - last_progress_time >= SEARCH_PROGRESS_INTERVAL:
+                    self.sio.emit('search_progress', {"job_id": job_id, "match_count": search_result.corpus_size},
+                                  to=sid)
+                    last_progress_time = time.time()
+                self.sio.sleep(0)  # let the server handle other requests in between
+            if not is_cancelled():
+                self.search_job_ids_by_sid.pop(sid)
+                self.search_result_cache.put(cache_key, search_result.matches)
+                self.sio.emit('search_completed', {"job_id": job_id, "match_count": search_result.corpus_size},
+                              to=sid)
+                EVENT_DURATION.observe(scan_stopwatch.elapsed, "perform_search", "scan")
+                EVENT_DURATION.observe(build_stopwatch.elapsed, "perform_search", "build")
+        except Exception as e:
+            EVENT_ERRORS.inc("perform_search")
+            logger.exception(e)
+            if not is_cancelled():
+                self.search_job_ids_by_sid.pop(sid)
+                self.sio.emit("server_error", to=sid)
+
     def start(self):
-        wsgi.server(eventlet.listen((self.address, self.port)), self.app)
+        """
+        Runs the server until it is stopped. With several processes, they are forked from this one and all accept
+        connections on the same socket. Each client stays with the process it connected to, and all messages to a
+        client are sent by that process, so the processes need not communicate. They share the corpus, but each one
+        has its own caches (search results, instance payloads).
+        """
+        sock = eventlet.listen((self.address, self.port))
+        if self.processes > 1:
+            run_worker_processes(lambda: self._serve(sock), self.processes)
+        else:
+            self._serve(sock)
+
+    def _serve(self, sock):
+        if self.corpus_reloader is not None:
+            self.sio.start_background_task(self.watch_input_file)
+        wsgi.server(sock, self.app)
+
+    def watch_input_file(self):
+        """
+        Checks every WATCH_INTERVAL seconds whether the input file changed, and if so, reloads the corpus (see
+        CorpusReloader) in a separate thread and updates all clients (see replace_basic_layout). Runs forever.
+        """
+        while True:
+            self.sio.sleep(WATCH_INTERVAL)
+            try:
+                if not self.corpus_reloader.has_changed():
+                    continue
+                # wait until the file is completely written
+                file_stat = self.corpus_reloader.get_file_stat()
+                self.sio.sleep(WATCH_INTERVAL)
+                while self.corpus_reloader.get_file_stat() != file_stat:
+                    file_stat = self.corpus_reloader.get_file_stat()
+                    self.sio.sleep(WATCH_INTERVAL)
+                print(f"Input file {self.corpus_reloader.input_path} changed, reloading.")
+                # reading and converting the corpus runs in a thread of its own, so that the server keeps answering
+                #  requests meanwhile; only the new layout is swapped in here
+                new_layout, changed_indices = tpool.execute(self.corpus_reloader.reload)
+                self.replace_basic_layout(new_layout, changed_indices)
+            except Exception as e:
+                # clients keep seeing the previous version of the corpus
+                EVENT_ERRORS.inc("reload_corpus")
+                logger.exception(e)
+
+    def replace_basic_layout(self, new_layout: BasicLayout, changed_indices: List[int] = None):
+        """
+        Shows new_layout, a new version of the corpus, to all clients instead of the current one.
+        :param changed_indices: The instances that differ between the two versions (see CorpusReloader.reload). If
+            given, clients stay at their current instance, and their searches are updated by searching only the
+            changed instances. Otherwise, all clients start over at the first instance without a search.
+        """
+        self.basic_layout = new_layout
+        self.instance_payload_cache.clear()
+        if changed_indices is None:
+            self.search_job_ids_by_sid.clear()  # cancels all running searches
+            self.search_filters_by_sid.clear()
+            self.search_result_cache.clear()
+            for sid in self.current_layouts_by_sid:
+                print("refreshing ", sid)
+                self.basic_layouts_by_sid[sid] = new_layout
+                self.current_layouts_by_sid[sid] = new_layout
+                self.sio.emit('set_layout', make_layout_sendable(new_layout), to=sid)
+                self.sio.emit('set_corpus_length', new_layout.corpus_size, to=sid)
+                self.sio.emit('refresh_to_position_zero', new_layout.corpus_size, to=sid)
+            return
+
+        for sid in list(self.current_layouts_by_sid):
+            self.basic_layouts_by_sid[sid] = new_layout
+            position = self.positions_by_sid.get(sid, 0)
+            if sid not in self.search_filters_by_sid:
+                self.current_layouts_by_sid[sid] = new_layout
+            elif sid in self.search_job_ids_by_sid:
+                # the search is still running, so we simply start it over on the new version
+                self.start_search(sid, *self.search_filters_by_sid[sid])
+                continue
+            else:
+                old_result = self.current_layouts_by_sid[sid]
+                new_result = self._update_search_result(old_result, new_layout, changed_indices,
+                                                        *self.search_filters_by_sid[sid])
+                self.current_layouts_by_sid[sid] = new_result
+                if position < old_result.corpus_size:
+                    # stay at the same corpus instance, or the next match after it if it no longer matches
+                    position = bisect.bisect_left(new_result.matches.indices, old_result.matches.indices[position])
+            position = max(0, min(position, self.current_layouts_by_sid[sid].corpus_size - 1))
+            self.positions_by_sid[sid] = position
+            self.sio.emit('corpus_reloaded', {"corpus_length": self.current_layouts_by_sid[sid].corpus_size,
+                                              "position": position}, to=sid)
+            self.sio.sleep(0)
+
+    def _update_search_result(self, old_result: SearchResultLayout, new_layout: BasicLayout,
+                              changed_indices: List[int], filters_key, filters: List[SearchFilter]) \
+            -> SearchResultLayout:
+        cache_key = (new_layout.layout_id, filters_key)
+        matches = self.search_result_cache.get(cache_key)  # e.g. updated for another client with the same search
+        if matches is None:
+            matching_indices, node_names = next(search_layout_in_batches(new_layout, filters,
+                                                                         workers=self.search_workers,
+                                                                         batch_size=None,
+                                                                         only_indices=changed_indices),
+                                                ([], []))
+            matches = update_search_matches(old_result.matches, changed_indices, new_layout.corpus_size,
+                                            matching_indices, node_names)
+            self.search_result_cache.put(cache_key, matches)
+        return create_search_result_layout(new_layout, filters, matches)
+
+    def _register_metrics(self):
+        """
+        Adds the metrics about the current state of this server (clients, searches, caches) to metrics_registry.
+        """
+        register = self.metrics_registry.register
+        register(CollectedMetric("vulcan_connected_clients", "Number of connected clients.",
+                                 lambda: {(): len(self.current_layouts_by_sid)}))
+        register(CollectedMetric("vulcan_client_layout_memory_bytes",
+                                 "Estimated memory used by the layouts of all clients apart from the corpus, i.e. by"
+                                 " the matches of their searches (which they may share with the search result cache).",
+                                 lambda: {(): sum(self._get_client_layout_memories())}))
+        register(CollectedMetric("vulcan_client_layout_memory_max_bytes",
+                                 "Estimated memory used by the largest layout of a client apart from the corpus.",
+                                 lambda: {(): max(self._get_client_layout_memories(), default=0)}))
+        register(CollectedMetric("vulcan_running_searches", "Number of searches running in the background.",
+                                 lambda: {(): len(self.search_job_ids_by_sid)}))
+        register(CollectedMetric("vulcan_search_cache_hits_total", "Searches answered from the search result cache.",
+                                 lambda: {(): self.search_result_cache.hits}, metric_type="counter"))
+        register(CollectedMetric("vulcan_search_cache_misses_total", "Searches not found in the search result cache.",
+                                 lambda: {(): self.search_result_cache.misses}, metric_type="counter"))
+        register(CollectedMetric("vulcan_search_cache_memory_bytes",
+                                 "Estimated memory used by the matches in the search result cache.",
+                                 lambda: {(): self.search_result_cache.memory}))
+        register(CollectedMetric("vulcan_search_index_memory_bytes",
+                                 "Estimated memory used by the search indices of the current corpora (not limited by"
+                                 " the size of the search result cache).",
+                                 lambda: {(): self._get_search_index_memory()}))
+        register(CollectedMetric("vulcan_instance_payload_cache_entries",
+                                 "Number of prepared instance payloads in the payload cache.",
+                                 lambda: {(): len(self.instance_payload_cache)}))
+        if self.corpus_registry is not None:
+            register(CollectedMetric("vulcan_loaded_corpora", "Number of loaded corpora.",
+                                     lambda: {(): len(self.corpus_registry.loaded_layouts)}))
+            register(CollectedMetric("vulcan_loaded_corpora_size_bytes",
+                                     "Total size of the input files of the loaded corpora.",
+                                     lambda: {(): self.corpus_registry.get_loaded_size()}))
+
+    def _get_search_index_memory(self) -> int:
+        layouts = self.corpus_registry.loaded_layouts.values() if self.corpus_registry is not None \
+            else [self.basic_layout]
+        return sum(search_index.estimate_memory() for layout in layouts
+                   for search_index in layout.search_indices.values())
+
+    def _get_client_layout_memories(self) -> List[int]:
+        return [layout.matches.estimate_memory() for layout in self.current_layouts_by_sid.values()
+                if isinstance(layout, SearchResultLayout)]
 
     def send_string(self, slice_name: str, tokens: List[str], sid,
                     label_alternatives_by_node_name: Dict = None,
                     highlights: Dict[int, Union[str, List[str]]] = None,
                     dependency_tree: List[Tuple[int, int, str]] = None):
-        highlights,\
-        label_alternatives_by_node_name = transform_string_maps_to_table_maps(highlights,
-                                                                              label_alternatives_by_node_name)
-        self.send_string_table(slice_name, [[t] for t in tokens], sid,
-                               label_alternatives_by_node_name, highlights,
-                               dependency_tree)
+        self.sio.emit('set_table', make_string_payload(slice_name, tokens, label_alternatives_by_node_name,
+                                                       highlights, dependency_tree), to=sid)
 
     def send_string_table(self, slice_name: str, table: List[List[str]], sid,
                           label_alternatives_by_node_name: Dict[Tuple[int, int], Any] = None,
                           highlights: Dict[Tuple[int, int], Union[str, List[str]]] = None,
                           dependency_tree: List[Tuple[int, int, str]] = None):
-        dict_to_sent = {"canvas_name": slice_name, "table": table}
-        if label_alternatives_by_node_name is not None:
-            dict_to_sent["label_alternatives_by_node_name"] = label_alternatives_by_node_name
-        if highlights is not None:
-            dict_to_sent["highlights"] = highlights
-        if dependency_tree is not None:
-            dict_to_sent["dependency_tree"] = dependency_tree
-        self.sio.emit('set_table', dict_to_sent, to=sid)
+        self.sio.emit('set_table', make_table_payload(slice_name, table, label_alternatives_by_node_name,
+                                                      highlights, dependency_tree), to=sid)
 
     def send_graph(self, slice_name: str, graph: Dict, sid, label_alternatives_by_node_name: Dict = None,
                    highlights: Dict[str, Union[str, List[str]]] = None, mouseover_texts: Dict[str, str] = None):
         """
         graph must be of the graph_as_dict type.
         """
-        dict_to_sent = {"canvas_name": slice_name, "graph": graph}
-        if label_alternatives_by_node_name is not None:
-            dict_to_sent["label_alternatives_by_node_name"] = label_alternatives_by_node_name
-        if highlights is not None:
-            dict_to_sent["highlights"] = highlights
-        if mouseover_texts is not None:
-            dict_to_sent["mouseover_texts"] = mouseover_texts
-        self.sio.emit('set_graph', dict_to_sent, to=sid)
+        self.sio.emit('set_graph', make_graph_payload(slice_name, graph, label_alternatives_by_node_name,
+                                                      highlights, mouseover_texts), to=sid)
+
+    def send_linker(self, name1: str, name2: str, wire_scores: Dict[str, Any], sid):
+        """
+        wire_scores must be the stored form of the linker scores (see make_wire_linker_scores).
+        """
+        self.sio.emit('set_linker', make_linker_payload(name1, name2, wire_scores), to=sid)
+
+
+def make_instance_payload(layout: BasicLayout, instance_id: int) -> Dict[str, Any]:
+    """
+    Everything the client needs to show one instance, for the set_instance message: the content of each slice (with
+    "type" "table" or "graph", in layout order, as in the set_table and set_graph messages), and the linkers (as in
+    the set_linker message). The layout id lets the client tell instances of different (search result) layouts apart.
+    """
+    slice_payloads = []
+    for row in layout.layout:
+        for corpus_slice in row:
+            if corpus_slice.label_alternatives is not None:
+                label_alternatives_by_node_name = corpus_slice.label_alternatives[instance_id]
+            else:
+                label_alternatives_by_node_name = None
+            if corpus_slice.highlights is not None:
+                highlights = corpus_slice.highlights[instance_id]
+            else:
+                highlights = None
+            if corpus_slice.mouseover_texts is not None:
+                mouseover_texts = corpus_slice.mouseover_texts[instance_id]
+            else:
+                mouseover_texts = None
+            if corpus_slice.dependency_trees is not None:
+                dependency_tree = corpus_slice.dependency_trees[instance_id]
+            else:
+                dependency_tree = None
+            if corpus_slice.visualization_type == VisualizationType.STRING:
+                payload = make_string_payload(corpus_slice.name,
+                                              corpus_slice.instances[instance_id],
+                                              label_alternatives_by_node_name,
+                                              highlights,
+                                              dependency_tree)
+                payload["type"] = "table"
+            elif corpus_slice.visualization_type == VisualizationType.TABLE:
+                payload = make_table_payload(corpus_slice.name,
+                                             corpus_slice.instances[instance_id],
+                                             label_alternatives_by_node_name,
+                                             highlights,
+                                             dependency_tree)
+                payload["type"] = "table"
+            elif corpus_slice.visualization_type == VisualizationType.TREE:
+                # trees are just graphs without reentrancies
+                payload = make_graph_payload(corpus_slice.name, corpus_slice.instances[instance_id],
+                                             label_alternatives_by_node_name,
+                                             highlights)
+                payload["type"] = "graph"
+            elif corpus_slice.visualization_type == VisualizationType.GRAPH:
+                payload = make_graph_payload(corpus_slice.name, corpus_slice.instances[instance_id],
+                                             label_alternatives_by_node_name,
+                                             highlights, mouseover_texts)
+                payload["type"] = "graph"
+            else:
+                continue
+            slice_payloads.append(payload)
+    linker_payloads = [make_linker_payload(linker["name1"], linker["name2"], linker["scores"][instance_id])
+                       for linker in layout.linkers]
+    return {"layout_id": layout.layout_id, "instance_id": instance_id, "slices": slice_payloads,
+            "linkers": linker_payloads}
+
+
+def make_string_payload(slice_name: str, tokens: List[str],
+                        label_alternatives_by_node_name: Dict = None,
+                        highlights: Dict[int, Union[str, List[str]]] = None,
+                        dependency_tree: List[Tuple[int, int, str]] = None) -> Dict[str, Any]:
+    highlights,\
+    label_alternatives_by_node_name = transform_string_maps_to_table_maps(highlights,
+                                                                          label_alternatives_by_node_name)
+    return make_table_payload(slice_name, [[t] for t in tokens],
+                              label_alternatives_by_node_name, highlights,
+                              dependency_tree)
+
+
+def make_table_payload(slice_name: str, table: List[List[str]],
+                       label_alternatives_by_node_name: Dict[Tuple[int, int], Any] = None,
+                       highlights: Dict[Tuple[int, int], Union[str, List[str]]] = None,
+                       dependency_tree: List[Tuple[int, int, str]] = None) -> Dict[str, Any]:
+    # the cells of object tables and the label alternatives can contain graphs
+    dict_to_sent = {"canvas_name": slice_name, "table": make_sendable(table)}
+    if label_alternatives_by_node_name is not None:
+        dict_to_sent["label_alternatives_by_node_name"] = make_sendable(label_alternatives_by_node_name)
+    if highlights is not None:
+        dict_to_sent["highlights"] = highlights
+    if dependency_tree is not None:
+        dict_to_sent["dependency_tree"] = dependency_tree
+    return dict_to_sent
+
+
+def make_graph_payload(slice_name: str, graph: Dict, label_alternatives_by_node_name: Dict = None,
+                       highlights: Dict[str, Union[str, List[str]]] = None,
+                       mouseover_texts: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    graph must be of the graph_as_dict type. It is sent as dicts (see graph_as_dict.make_sendable).
+    """
+    dict_to_sent = {"canvas_name": slice_name, "graph": make_sendable(graph)}
+    if label_alternatives_by_node_name is not None:
+        dict_to_sent["label_alternatives_by_node_name"] = make_sendable(label_alternatives_by_node_name)
+    if highlights is not None:
+        dict_to_sent["highlights"] = highlights
+    if mouseover_texts is not None:
+        dict_to_sent["mouseover_texts"] = mouseover_texts
+    return dict_to_sent
+
 
-    def send_linker(self, name1: str, name2: str, scores: Dict[str, Dict[str, float]], sid):
-        if self.basic_layout.get_visualization_type_for_slice_name(name1) == VisualizationType.STRING:
-            scores = {str((0, k)).replace("'", ""): v for k, v in scores.items()}
-        if self.basic_layout.get_visualization_type_for_slice_name(name2) == VisualizationType.STRING:
-            scores = {k: {str((0, k2)).replace("'", ""): v for k2, v in d.items()} for k, d in scores.items()}
-        self.sio.emit('set_linker', {"name1": name1, "name2": name2, "scores": scores}, to=sid)
+def make_linker_payload(name1: str, name2: str, wire_scores: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    wire_scores are the linker scores as stored in the layout, which are already in the form the client expects
+    (see vulcan.data_handling.linker_encoding.make_wire_linker_scores).
+    """
+    return {"name1": name1, "name2": name2, **wire_scores}
 
 
 def make_layout_sendable(layout: BasicLayout):
@@ -216,11 +682,4 @@ def get_search_filters_from_data(data):
 
 
 def load_new_pickle_for_server_and_refresh_clients(server: Server, new_pickle_path: str):
-    new_layout = create_layout_from_filepath(new_pickle_path)
-    server.basic_layout = new_layout
-    for sid in server.current_layouts_by_sid:
-        print("refreshing ", sid)
-        server.current_layouts_by_sid[sid] = new_layout
-        server.sio.emit('set_layout', make_layout_sendable(new_layout), to=sid)
-        server.sio.emit('set_corpus_length', new_layout.corpus_size, to=sid)
-        server.sio.emit('refresh_to_position_zero', new_layout.corpus_size, to=sid)
+    server.replace_basic_layout(create_layout_from_filepath(new_pickle_path))
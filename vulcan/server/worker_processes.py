@@ -0,0 +1,83 @@
+import gc
+import os
+import signal
+import time
+import traceback
+from typing import Callable, Dict, Tuple
+
+# Workers that stop within this many seconds after starting are not replaced, since the replacements would most
+#  likely fail the same way.
+MIN_WORKER_LIFETIME = 5.0
+
+
+def run_worker_processes(serve: Callable[[], None], processes: int):
+    """
+    Runs serve in the given number of forked worker processes, and waits until all of them have stopped. Workers that
+    stop unexpectedly (e.g. because they crashed) are replaced by new ones, unless they stop right after
+    starting. SIGINT and SIGTERM stop all workers.
+
+    The workers share the memory of this process at the time of forking copy-on-write, so the corpus is only loaded
+    once. serve should serve a listening socket that was opened before calling this; the operating system then
+    distributes the incoming connections among the workers.
+    :param serve: Function that runs the server in a worker, until the worker is stopped.
+    """
+    # keeps the garbage collector from touching (and thereby copying) the objects shared with the workers
+    gc.freeze()
+    workers: Dict[int, Tuple[int, float]] = {}  # pid -> (worker number, start time)
+    stopping = False
+
+    def start_worker(number: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(serve)  # never returns
+        workers[pid] = (number, time.monotonic())
+
+    def stop_workers(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous_handlers = {sig: signal.signal(sig, stop_workers) for sig in [signal.SIGINT, signal.SIGTERM]}
+    try:
+        for number in range(processes):
+            start_worker(number)
+        print(f"Started {processes} server worker processes.")
+        while len(workers) > 0:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in workers:
+                continue
+            number, start_time = workers.pop(pid)
+            if stopping:
+                continue
+            if time.monotonic() - start_time < MIN_WORKER_LIFETIME:
+                print(f"ERROR: server worker {number} stopped right after starting (exit status {status}),"
+                      f" stopping all workers.")
+                stop_workers(None, None)
+            else:
+                print(f"WARNING: server worker {number} stopped unexpectedly (exit status {status}),"
+                      f" starting a new one.")
+                start_worker(number)
+    finally:
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+
+
+def _run_worker(serve: Callable[[], None]):
+    exit_code = 0
+    try:
+        for sig in [signal.SIGINT, signal.SIGTERM]:
+            signal.signal(sig, signal.SIG_DFL)
+        serve()
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        # the parent's state (atexit handlers etc.) belongs to the parent
+        os._exit(exit_code)
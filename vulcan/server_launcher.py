@@ -1,19 +1,70 @@
 import json
+import os
 import pickle
 
+from vulcan.corpus_reload import CorpusReloader
 from vulcan.file_loader import create_layout_from_filepath
 from vulcan.data_handling.data_corpus import from_dict_list
+from vulcan.data_handling.lazy_instance_list import DEFAULT_CONVERSION_CACHE_SIZE
+from vulcan.search.search_result_cache import DEFAULT_SEARCH_CACHE_MEMORY
 from vulcan.server.basic_layout import BasicLayout
+from vulcan.server.corpus_registry import CorpusRegistry, DEFAULT_MAX_LOADED_SIZE
 from vulcan.server.server import Server, make_layout_sendable
+from vulcan.startup_profile import start_startup_profile, finish_startup_profile
 
 
 def launch_server_from_file(input_path: str, port: int = 5050, address: str = "localhost", is_json_file: bool = False,
                             show_node_names: bool = False, propbank_path: str = None,
-                            show_wikipedia_articles: bool = False):
+                            show_wikipedia_articles: bool = False, lazy_conversion: bool = False,
+                            conversion_cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE, warm_up: bool = False,
+                            workers: int = 1, use_cache: bool = False, search_workers: int = 1,
+                            search_cache_memory: int = DEFAULT_SEARCH_CACHE_MEMORY, processes: int = 1,
+                            max_loaded_size: int = DEFAULT_MAX_LOADED_SIZE, watch: bool = False,
+                            profile_startup: bool = False, profile_stats_path: str = None):
+    """
+    :param input_path: The corpus file, or a directory of corpus files. With a directory, each corpus is loaded when
+        it is first opened (see CorpusRegistry), and JSON files are recognized by their extension.
+    :param max_loaded_size: With a directory, the maximum total size (in bytes) of the input files of the corpora that
+        are kept loaded while no client has them open.
+    :param watch: If true, the corpus is reloaded whenever the input file changes (see CorpusReloader). Not
+        supported for directories.
+    :param profile_startup: If true, a report on the phases of loading the corpus is printed before the server starts
+        (see vulcan.startup_profile). Not supported for directories, since their corpora are loaded later.
+    :param profile_stats_path: With profile_startup, loading the corpus is also profiled with cProfile, and the
+        statistics are written to this file.
+    """
 
-    layout = create_layout_from_filepath(input_path, is_json_file, propbank_path, show_wikipedia_articles)
+    def load_layout(path, is_json):
+        return create_layout_from_filepath(path, is_json, propbank_path, show_wikipedia_articles,
+                                           lazy_conversion=lazy_conversion,
+                                           conversion_cache_size=conversion_cache_size, warm_up=warm_up,
+                                           workers=workers, use_cache=use_cache)
 
-    server = Server(layout, port=port, address=address, show_node_names=show_node_names)
+    corpus_registry = None
+    corpus_reloader = None
+    if profile_startup and not os.path.isdir(input_path):
+        start_startup_profile(profile_stats_path)
+    if os.path.isdir(input_path):
+        if watch:
+            print("WARNING: watching for changes is not supported when visualizing a directory.")
+        if profile_startup:
+            print("WARNING: profiling the startup is not supported when visualizing a directory.")
+        layout = None
+        corpus_registry = CorpusRegistry(input_path, lambda path: load_layout(path, path.endswith(".json")),
+                                         max_loaded_size)
+    elif watch:
+        corpus_reloader = CorpusReloader(input_path, is_json_file, propbank_path, show_wikipedia_articles,
+                                         lazy_conversion=lazy_conversion,
+                                         conversion_cache_size=conversion_cache_size, warm_up=warm_up,
+                                         workers=workers, use_cache=use_cache)
+        layout = corpus_reloader.load()
+    else:
+        layout = load_layout(input_path, is_json_file)
+    finish_startup_profile()
+
+    server = Server(layout, port=port, address=address, show_node_names=show_node_names,
+                    search_workers=search_workers, search_cache_memory=search_cache_memory, processes=processes,
+                    corpus_registry=corpus_registry, corpus_reloader=corpus_reloader)
 
     server.start()  # at this point, the server is running on this thread, and nothing below will be executed
 
@@ -0,0 +1,183 @@
+"""
+A report on where the time and memory go when loading a corpus at startup (see --profile-startup in
+launch_vulcan.py).
+
+While a profile is running (between start_startup_profile and finish_startup_profile), the loading code records its
+phases with profile_phase: reading the input file, converting the instances, label alternatives and linker scores of
+each slice, looking up mouseover texts, building the layout, etc. For each phase, the report shows the wall time, the
+number of instances, the instances per second, by how much the peak memory use (RSS) of the process grew, and the
+slowest individual instances. Without a running profile, profile_phase does nothing.
+"""
+
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Number of slowest instances that are shown for each phase.
+SLOWEST_INSTANCE_COUNT = 5
+# Number of functions that are shown from the cProfile statistics.
+PROFILE_FUNCTION_COUNT = 20
+
+_active_profile: Optional["StartupProfile"] = None
+
+
+class ProfilePhase:
+    """
+    One phase of loading a corpus, e.g. converting the instances of one slice.
+    """
+
+    def __init__(self, name: str, slice_name: str = None, instance_count: int = None):
+        self.name = name
+        self.slice_name = slice_name
+        self.instance_count = instance_count
+        self.wall_time = 0.0
+        self.peak_rss_growth = None  # in bytes, None if unknown
+        # (duration, instance index) of the slowest instances, as a min-heap
+        self.slowest_instances: List[Tuple[float, int]] = []
+
+    def time_each(self, convert: Callable) -> Callable:
+        """
+        :return: A function that does the same as convert, and records how long it takes for each instance. The
+            instances must be converted in order, each one once.
+        """
+        next_index = itertools.count()
+
+        def timed_convert(instance):
+            start_time = time.perf_counter()
+            ret = convert(instance)
+            self._record_instance(time.perf_counter() - start_time, next(next_index))
+            return ret
+
+        return timed_convert
+
+    def _record_instance(self, duration: float, index: int):
+        if len(self.slowest_instances) < SLOWEST_INSTANCE_COUNT:
+            heapq.heappush(self.slowest_instances, (duration, index))
+        else:
+            heapq.heappushpop(self.slowest_instances, (duration, index))
+
+
+class _InactivePhase:
+    """
+    Stands in for a ProfilePhase while no profile is running.
+    """
+
+    def time_each(self, convert: Callable) -> Callable:
+        return convert
+
+
+class StartupProfile:
+
+    def __init__(self, stats_path: str = None):
+        """
+        :param stats_path: If given, the loading code is also profiled with cProfile, and the statistics are written
+            to this file (for use with pstats, e.g. python -m pstats <file>).
+        """
+        self.stats_path = stats_path
+        self.phases: List[ProfilePhase] = []
+        self.start_time = time.perf_counter()
+        self.start_peak_rss = get_peak_rss()
+        self.profiler = cProfile.Profile() if stats_path is not None else None
+
+    def print_report(self):
+        total_time = time.perf_counter() - self.start_time
+        peak_rss = get_peak_rss()
+        print(f"Startup profile: {total_time:.2f} s in total, peak RSS {_format_bytes(peak_rss)}"
+              f" (+{_format_bytes(_difference(peak_rss, self.start_peak_rss))}).")
+        rows = [("phase", "slice", "time (s)", "instances", "instances/s", "peak RSS +MB")]
+        for phase in self.phases:
+            rows.append((phase.name, phase.slice_name or "-", f"{phase.wall_time:.3f}",
+                         str(phase.instance_count) if phase.instance_count is not None else "-",
+                         f"{phase.instance_count / phase.wall_time:.0f}"
+                         if phase.instance_count and phase.wall_time > 0 else "-",
+                         _format_bytes(phase.peak_rss_growth, unit="")))
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        for row in rows:
+            print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+        for phase in self.phases:
+            if len(phase.slowest_instances) > 0:
+                slowest = ", ".join(f"#{index} ({duration * 1000:.2f} ms)"
+                                    for duration, index in sorted(phase.slowest_instances, reverse=True))
+                print(f"Slowest instances for {phase.name} of {phase.slice_name}: {slowest}")
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.stats_path)
+            output = io.StringIO()
+            pstats.Stats(self.profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_FUNCTION_COUNT)
+            print(output.getvalue())
+            print(f"Wrote profiling statistics to {self.stats_path}.")
+
+
+def start_startup_profile(stats_path: str = None):
+    """
+    Starts recording the phases of loading a corpus (see profile_phase).
+    :param stats_path: See StartupProfile.
+    """
+    global _active_profile
+    _active_profile = StartupProfile(stats_path)
+    if _active_profile.profiler is not None:
+        _active_profile.profiler.enable()
+
+
+def finish_startup_profile():
+    """
+    Stops recording, and prints the report.
+    """
+    global _active_profile
+    profile = _active_profile
+    _active_profile = None
+    if profile is None:
+        return
+    if profile.profiler is not None:
+        profile.profiler.disable()
+    profile.print_report()
+
+
+@contextmanager
+def profile_phase(name: str, slice_name: str = None, instance_count: int = None):
+    """
+    Records the with block as a phase of the running startup profile, if any. Yields the phase, whose time_each can
+    record the time of the individual instances.
+    """
+    profile = _active_profile
+    if profile is None:
+        yield _InactivePhase()
+        return
+    phase = ProfilePhase(name, slice_name, instance_count)
+    start_peak_rss = get_peak_rss()
+    start_time = time.perf_counter()
+    try:
+        yield phase
+    finally:
+        phase.wall_time = time.perf_counter() - start_time
+        phase.peak_rss_growth = _difference(get_peak_rss(), start_peak_rss)
+        profile.phases.append(phase)
+
+
+def get_peak_rss() -> Optional[int]:
+    """
+    :return: The peak resident set size of this process so far, in bytes (None if unknown, e.g. on Windows).
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _difference(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return a - b if a is not None and b is not None else None
+
+
+def _format_bytes(size: Optional[int], unit: str = " MB") -> str:
+    return f"{size / (1024 * 1024):.1f}{unit}" if size is not None else "-"